@@ -0,0 +1,2 @@
+from . import test_partner_balance_wizard
+from . import test_query_counts
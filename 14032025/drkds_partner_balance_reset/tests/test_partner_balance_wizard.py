@@ -0,0 +1,84 @@
+import base64
+
+from odoo import Command
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.tests import tagged
+
+
+@tagged('post_install', '-at_install')
+class TestPartnerBalanceWizard(AccountTestInvoicingCommon):
+    """Preview of a balance reset from a CSV file"""
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.customer, cls.vendor, cls.other = cls.env['res.partner'].create([
+            {'name': 'Reset Customer', 'ref': 'RC'},
+            {'name': 'Reset Vendor', 'ref': 'RV'},
+            {'name': 'Reset Other', 'ref': 'RO'},
+        ])
+        move = cls.env['account.move'].create({
+            'move_type': 'entry',
+            'date': '2024-01-01',
+            'journal_id': cls.company_data['default_journal_misc'].id,
+            'line_ids': [
+                Command.create({
+                    'account_id': cls.company_data['default_account_receivable'].id,
+                    'partner_id': cls.customer.id,
+                    'debit': 100.0,
+                }),
+                Command.create({
+                    'account_id': cls.company_data['default_account_payable'].id,
+                    'partner_id': cls.vendor.id,
+                    'credit': 40.0,
+                }),
+                Command.create({
+                    'account_id': cls.company_data['default_account_revenue'].id,
+                    'credit': 60.0,
+                }),
+            ],
+        })
+        move.action_post()
+
+    def _preview(self, rows, partner_field='id'):
+        content = '\n'.join(['partner,new_balance,account_type'] + rows)
+        wizard = self.env['partner.balance.wizard'].create({
+            'journal_id': self.company_data['default_journal_misc'].id,
+            'adjustment_account_id': self.company_data['default_account_revenue'].id,
+            'csv_file': base64.b64encode(content.encode()),
+            'partner_field': partner_field,
+        })
+        wizard.action_preview()
+        self.assertEqual(wizard.state, 'preview')
+        return [
+            (line.partner_id, line.account_type, line.current_balance, line.new_balance)
+            for line in wizard.preview_line_ids.sorted('id')
+        ]
+
+    def test_preview_by_id(self):
+        lines = self._preview([
+            f'{self.customer.id},0,receivable',
+            f'{self.vendor.id},10,vendor',
+            f'{self.other.id},5,',
+            # Unknown partners and invalid rows are skipped
+            '0,1,receivable',
+            'not an id,1,receivable',
+            f'{self.customer.id},not a balance,receivable',
+        ])
+        self.assertEqual(lines, [
+            (self.customer, 'receivable', 100.0, 0.0),
+            (self.vendor, 'payable', 40.0, 10.0),
+            (self.other, 'receivable', 0.0, 5.0),
+        ])
+
+    def test_preview_by_ref(self):
+        lines = self._preview(['RV,0,payable', 'unknown,0,payable', 'RC,20,receivable', 'RC,0,payable'], 'ref')
+        self.assertEqual(lines, [
+            (self.vendor, 'payable', 40.0, 0.0),
+            (self.customer, 'receivable', 100.0, 20.0),
+            (self.customer, 'payable', 0.0, 0.0),
+        ])
+
+    def test_preview_by_name(self):
+        lines = self._preview(['Reset Customer,0,receivable', 'Reset,0,receivable'], 'name')
+        self.assertEqual(lines, [(self.customer, 'receivable', 100.0, 0.0)])
@@ -0,0 +1,51 @@
+import base64
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.tests import tagged
+
+
+@tagged('post_install', '-at_install')
+class TestQueryCounts(AccountTestInvoicingCommon):
+    """The preview of a balance reset may not issue more queries for more CSV rows"""
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.partners = cls.env['res.partner'].create([
+            {'name': 'Balance Partner %s' % index, 'ref': 'BP%03d' % index}
+            for index in range(30)
+        ])
+
+    def _create_wizard(self, partners, partner_field='id'):
+        rows = ['partner,new_balance,account_type']
+        for index, partner in enumerate(partners):
+            identifier = partner.id if partner_field == 'id' else partner[partner_field]
+            rows.append('%s,%s,%s' % (identifier, 100.0 * index, 'payable' if index % 2 else 'receivable'))
+        return self.env['partner.balance.wizard'].create({
+            'journal_id': self.company_data['default_journal_misc'].id,
+            'adjustment_account_id': self.company_data['default_account_revenue'].id,
+            'csv_file': base64.b64encode('\n'.join(rows).encode()),
+            'partner_field': partner_field,
+        })
+
+    def _assert_preview_query_count(self, partner_field):
+        small = self._create_wizard(self.partners[:3], partner_field)
+        large = self._create_wizard(self.partners, partner_field)
+
+        self.env.flush_all()
+        self.env.invalidate_all()
+        query_count = self.cr.sql_log_count
+        small.action_preview()
+        self.env.flush_all()
+        query_count = self.cr.sql_log_count - query_count
+
+        self.env.invalidate_all()
+        with self.assertQueryCount(query_count):
+            large.action_preview()
+        self.assertEqual(len(large.preview_line_ids), 30)
+
+    def test_preview_by_id(self):
+        self._assert_preview_query_count('id')
+
+    def test_preview_by_ref(self):
+        self._assert_preview_query_count('ref')
@@ -83,8 +83,8 @@ class PartnerBalanceWizard(models.TransientModel):
         except ValueError:
             raise UserError(_('The CSV file must contain "partner" and "new_balance" columns.'))
             
-        # Process data rows
-        preview_lines = []
+        # Parse data rows, partners and balances are then read for all rows at once
+        rows = []
         for row in reader:
             if len(row) <= max(partner_col, new_balance_col):
                 continue  # Skip invalid rows
@@ -104,29 +104,32 @@ class PartnerBalanceWizard(models.TransientModel):
                 account_type_val = row[account_type_col].strip().lower()
                 if account_type_val in ['payable', 'vendor', 'supplier', 'purchase']:
                     account_type = 'payable'
-                
-            # Find partner
-            partner = self._find_partner(partner_identifier)
+
+            rows.append((partner_identifier, new_balance, account_type))
+
+        # Find partners
+        partners = self._find_partners({identifier for identifier, new_balance, account_type in rows})
+
+        # Calculate current balances
+        balances = {}
+        for account_type in {account_type for identifier, new_balance, account_type in rows}:
+            balances[account_type] = self._get_partner_balances(
+                self.env['res.partner'].union(*partners.values()), account_type)
+
+        # Create preview lines
+        preview_lines = []
+        for identifier, new_balance, account_type in rows:
+            partner = partners.get(identifier)
             if not partner:
                 continue
-                
-            # Calculate current balance
-            current_balance = self._get_partner_balance(partner, account_type)
-                
-            # Create preview line
             preview_lines.append({
+                'wizard_id': self.id,
                 'partner_id': partner.id,
                 'account_type': account_type,
-                'current_balance': current_balance,
+                'current_balance': balances[account_type].get(partner.id, 0.0),
                 'new_balance': new_balance,
             })
-            
-        # Create preview lines
-        for line_data in preview_lines:
-            self.env['partner.balance.wizard.line'].create(dict(
-                wizard_id=self.id,
-                **line_data
-            ))
+        self.env['partner.balance.wizard.line'].create(preview_lines)
             
         self.state = 'preview'
         
@@ -139,40 +142,46 @@ class PartnerBalanceWizard(models.TransientModel):
             'target': 'new',
         }
     
-    def _find_partner(self, identifier):
+    def _find_partners(self, identifiers):
+        """Return {identifier: partner} for the identifiers matching a partner, in one query"""
+        Partner = self.env['res.partner']
+        partners = {}
         if self.partner_field == 'id':
-            try:
-                partner_id = int(identifier)
-                return self.env['res.partner'].browse(partner_id).exists()
-            except ValueError:
-                return False
-        elif self.partner_field == 'ref':
-            return self.env['res.partner'].search([('ref', '=', identifier)], limit=1)
-        elif self.partner_field == 'name':
-            return self.env['res.partner'].search([('name', '=', identifier)], limit=1)
-        return False
+            ids = {}
+            for identifier in identifiers:
+                try:
+                    ids[int(identifier)] = identifier
+                except ValueError:
+                    continue
+            for partner in Partner.browse(list(ids)).exists():
+                partners[ids[partner.id]] = partner
+        elif self.partner_field in ('ref', 'name'):
+            # First match in the default order, like a search with limit=1
+            for partner in Partner.search([(self.partner_field, 'in', list(identifiers))]):
+                partners.setdefault(partner[self.partner_field], partner)
+        return partners
     
-    def _get_partner_balance(self, partner, account_type='receivable'):
-        if not partner:
-            return 0.0
+    def _get_partner_balances(self, partners, account_type='receivable'):
+        """Return {partner_id: balance} of the partners up to the reset date, in one query"""
+        if not partners:
+            return {}
             
         # Get the balance up to the reset date
         # In Odoo 17, the internal_type field has been changed to account_type
         domain = [
-            ('partner_id', '=', partner.id),
+            ('partner_id', 'in', partners.ids),
             ('account_id.account_type', 'in', ['asset_receivable' if account_type == 'receivable' else 'liability_payable']),
             ('move_id.state', '=', 'posted'),
             ('date', '<=', self.date)
         ]
         
-        lines = self.env['account.move.line'].search(domain)
-        balance = sum(lines.mapped('balance'))
-        
         # For payable accounts, we invert the sign to follow accounting convention
-        if account_type == 'payable':
-            balance = -balance
-            
-        return balance
+        sign = -1 if account_type == 'payable' else 1
+        return {
+            partner.id: sign * balance
+            for partner, balance in self.env['account.move.line']._read_group(
+                domain, ['partner_id'], ['balance:sum'])
+        }
     
     def action_reset_balances(self):
         self.ensure_one()
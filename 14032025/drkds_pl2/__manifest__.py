@@ -1,6 +1,6 @@
 {
     'name': 'Advanced BOM Cost Calculator',
-    'version': '17.0.1.0.0',
+    'version': '17.0.1.1.0',
     'category': 'Manufacturing',
     'summary': 'Advanced cost calculation for Bill of Materials including nested BOMs and operations',
     'description': """
@@ -12,6 +12,14 @@
         * Cost tracking at each BOM level
         * Safe handling of recursive BOMs
         * Review and apply costs
+
+        Optional dependencies
+        ---------------------
+        The Whole Catalogue (Matrix) calculation mode and the raw material
+        requirements solve the BOM graph as one sparse linear system when the
+        numpy and scipy Python packages are installed (pip install numpy scipy).
+        Without them the same results are computed by a children-first sweep of
+        the graph. The solver used is logged by each calculation.
     """,
     'author': 'Your Company',
     'website': 'https://www.yourcompany.com',
@@ -31,7 +39,11 @@
         'wizard/product_selection_wizard_view.xml',
         'wizard/product_additional_cost_wizard_view.xml',
         'wizard/raw_materials_editor_view.xml',
+        'wizard/bom_cost_breakdown_view.xml',
+        'wizard/bom_cost_compare_wizard_views.xml',
+        'wizard/bom_cost_sensitivity_wizard_views.xml',
         'views/bom_cost_calculator_views.xml',
+        'views/bom_cost_run_views.xml',
         'report/report_actions.xml',
         'report/report_templates.xml',
         'views/report_log_views.xml',
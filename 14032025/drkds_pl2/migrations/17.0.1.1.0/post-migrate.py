@@ -0,0 +1,66 @@
+import logging
+
+import psycopg2
+
+from odoo import api, SUPERUSER_ID
+from odoo.addons.drkds_pl2.models.bom_cost_breakdown import BREAKDOWN_FIELDS, encode_breakdown
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    _compact_breakdown_lines(cr)
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    _publish_latest_unit_costs(env)
+
+
+def _publish_latest_unit_costs(env):
+    """
+    Fill the latest unit costs, created by this version, from the calculators
+    already calculated. They are published oldest first, like
+    mrp.bom.cost.latest._refresh_products, in the company of the user who
+    created each calculator, so the most recent one wins.
+    """
+    Latest = env['mrp.bom.cost.latest']
+    calculators = env['mrp.bom.cost.calculator'].search(
+        [('state', '=', 'calculated')], order='calculation_date asc, date asc, id asc')
+    for calculator in calculators:
+        company = calculator.create_uid.company_id or env.company
+        Latest.with_company(company)._update_from_calculators(calculator.with_company(company))
+    env.flush_all()
+    _logger.info("Published the latest unit costs of %s calculated calculators", len(calculators))
+
+
+def _compact_breakdown_lines(cr):
+    """
+    Compact the historic mrp.bom.cost.calculator.line rows of each calculator
+    into its breakdown snapshot, then delete them.
+    """
+    cr.execute("SELECT DISTINCT calculator_id FROM mrp_bom_cost_calculator_line WHERE calculator_id IS NOT NULL")
+    calculator_ids = [row[0] for row in cr.fetchall()]
+    columns = ', '.join('"%s"' % fname for fname in BREAKDOWN_FIELDS)
+
+    line_count = 0
+    for calculator_id in calculator_ids:
+        cr.execute(
+            "SELECT %s FROM mrp_bom_cost_calculator_line WHERE calculator_id = %%s ORDER BY id" % columns,
+            [calculator_id])
+        rows = []
+        for values in cr.fetchall():
+            row = {}
+            for (fname, default), value in zip(BREAKDOWN_FIELDS.items(), values):
+                if value is None:
+                    value = default
+                elif isinstance(default, float):
+                    # numeric columns are read as Decimal
+                    value = float(value)
+                row[fname] = value
+            rows.append(row)
+
+        cr.execute("UPDATE mrp_bom_cost_calculator SET breakdown_snapshot = %s WHERE id = %s",
+                   [psycopg2.Binary(encode_breakdown(rows)), calculator_id])
+        cr.execute("DELETE FROM mrp_bom_cost_calculator_line WHERE calculator_id = %s", [calculator_id])
+        line_count += len(rows)
+
+    _logger.info("Compacted %s cost breakdown lines of %s calculators into breakdown snapshots",
+                 line_count, len(calculator_ids))
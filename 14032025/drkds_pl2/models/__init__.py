@@ -1,3 +1,13 @@
 from . import bom_cost_calculator
 from . import bom_cost_calculator_product_line
 from . import report_log
+from . import mrp_bom
+from . import bom_cost_cache
+from . import bom_cost_latest
+from . import bom_cost_matrix
+from . import bom_cost_sharding
+from . import mrp_routing
+from . import uom_uom
+from . import bom_cost_run
+from . import bom_cost_context
+from . import product_product
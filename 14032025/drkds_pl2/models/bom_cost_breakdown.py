@@ -0,0 +1,77 @@
+import base64
+import hashlib
+import json
+import zlib
+
+# Version of the breakdown snapshot format, increased when its layout changes.
+# Version 1: {'version', 'fields', 'rows'} with one list of values per row, in
+# the order of 'fields'.
+BREAKDOWN_VERSION = 1
+
+# Fields of a breakdown row and their value when missing from a snapshot
+BREAKDOWN_FIELDS = {
+    'name': '',
+    'cost_type': 'material',
+    'product_id': False,
+    'operation_id': False,
+    'quantity': 0.0,
+    'duration': 0.0,
+    'unit_cost': 0.0,
+    'cost': 0.0,
+    'bom_level': 0,
+    'bom_qty': 0.0,
+}
+
+# Upgrades of older snapshots: BREAKDOWN_UPGRADES[n](payload) returns the
+# payload of version n in the layout of version n + 1. An upgrade is only
+# needed when the meaning of existing values changes: fields missing from an
+# older snapshot get their BREAKDOWN_FIELDS value, removed fields are dropped.
+BREAKDOWN_UPGRADES = {}
+
+
+def encode_breakdown(rows):
+    """
+    Return the compact snapshot of breakdown rows (dicts like the values of
+    mrp.bom.cost.calculator.line) as base64 of zlib compressed JSON, the
+    value of a Binary field.
+    """
+    fnames = list(BREAKDOWN_FIELDS)
+    payload = {
+        'version': BREAKDOWN_VERSION,
+        'fields': fnames,
+        'rows': [[row.get(fname, BREAKDOWN_FIELDS[fname]) for fname in fnames] for row in rows],
+    }
+    data = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.b64encode(zlib.compress(data, 6))
+
+
+def decode_breakdown(snapshot):
+    """
+    Return the breakdown rows of a snapshot made by encode_breakdown, in the
+    current layout whatever the version the snapshot was encoded with
+    """
+    if not snapshot:
+        return []
+    payload = json.loads(zlib.decompress(base64.b64decode(snapshot)))
+    version = payload.get('version')
+    if not isinstance(version, int) or not 1 <= version <= BREAKDOWN_VERSION:
+        raise ValueError("Unsupported cost breakdown snapshot version: %s" % version)
+    while version < BREAKDOWN_VERSION:
+        if version in BREAKDOWN_UPGRADES:
+            payload = BREAKDOWN_UPGRADES[version](payload)
+        version += 1
+
+    fnames = payload['fields']
+    rows = []
+    for values in payload['rows']:
+        row = dict(BREAKDOWN_FIELDS)
+        row.update((fname, value) for fname, value in zip(fnames, values) if fname in BREAKDOWN_FIELDS)
+        rows.append(row)
+    return rows
+
+
+def breakdown_checksum(snapshot):
+    """Return a checksum of a snapshot made by encode_breakdown, to detect changes"""
+    if isinstance(snapshot, str):
+        snapshot = snapshot.encode()
+    return hashlib.sha1(snapshot or b'').hexdigest()
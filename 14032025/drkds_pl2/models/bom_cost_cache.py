@@ -0,0 +1,344 @@
+from odoo import models, fields, api, _
+from odoo.service.model import PG_CONCURRENCY_ERRORS_TO_RETRY
+from psycopg2 import OperationalError
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class BOMCostCache(models.Model):
+    """
+    Persistent cache of rolled-up sub-assembly costs.
+
+    Each entry holds the material, operation and duration totals of one BOM
+    (for its production quantity) as computed for one product variant, together
+    with everything the result was derived from. Entries are removed as soon as
+    one of these dependencies changes, so an existing entry is always valid.
+    """
+    _name = 'mrp.bom.cost.cache'
+    _description = 'BOM Sub-assembly Cost Cache'
+    _order = 'id desc'
+
+    bom_id = fields.Many2one('mrp.bom', 'Bill of Materials', required=True, index=True, ondelete='cascade')
+    product_id = fields.Many2one('product.product', 'Product', required=True, index=True, ondelete='cascade')
+    company_id = fields.Many2one('res.company', 'Company', required=True, index=True, ondelete='cascade')
+    include_operations = fields.Boolean('Include Operations Cost')
+
+    material_cost = fields.Float('Material Cost', digits='Product Price')
+    operation_cost = fields.Float('Operation Cost', digits='Product Price')
+    duration = fields.Float('Duration (minutes)')
+
+    # Inputs the cached totals were computed from
+    dependency_product_ids = fields.Many2many(
+        'product.product', 'mrp_bom_cost_cache_product_rel', 'cache_id', 'product_id',
+        string='Component Dependencies')
+    dependency_bom_ids = fields.Many2many(
+        'mrp.bom', 'mrp_bom_cost_cache_bom_rel', 'cache_id', 'bom_id',
+        string='BOM Dependencies')
+    dependency_workcenter_ids = fields.Many2many(
+        'mrp.workcenter', 'mrp_bom_cost_cache_workcenter_rel', 'cache_id', 'workcenter_id',
+        string='Workcenter Dependencies')
+
+    _sql_constraints = [
+        ('bom_product_company_uniq', 'unique (bom_id, product_id, company_id, include_operations)',
+         'A BOM can only be cached once per product, company and operations mode!'),
+    ]
+
+    @api.model
+    def _get_cached_totals(self, keys, include_operations):
+        """
+        Return {(bom_id, product_id): ((material, operation, duration), dependencies)}
+        for the given keys that have a valid entry in the current company.
+        dependencies is a tuple of (product ids, bom ids, workcenter ids) sets.
+        """
+        if not keys:
+            return {}
+
+        bom_ids = {bom_id for bom_id, product_id in keys}
+        product_ids = {product_id for bom_id, product_id in keys}
+        entries = self.sudo().search([
+            ('bom_id', 'in', list(bom_ids)),
+            ('product_id', 'in', list(product_ids)),
+            ('company_id', '=', self.env.company.id),
+            ('include_operations', '=', include_operations),
+        ])
+
+        result = {}
+        for entry in entries:
+            key = (entry.bom_id.id, entry.product_id.id)
+            if key not in keys:
+                continue
+            result[key] = (
+                (entry.material_cost, entry.operation_cost, entry.duration),
+                (
+                    set(entry.dependency_product_ids.ids),
+                    set(entry.dependency_bom_ids.ids),
+                    set(entry.dependency_workcenter_ids.ids),
+                ),
+            )
+        return result
+
+    @api.model
+    def _store_totals(self, results, include_operations):
+        """
+        Store rolled-up totals.
+        results maps (bom_id, product_id) to (totals, dependencies) as returned
+        by _get_cached_totals. Keys that are already cached are left untouched.
+
+        Calculations of overlapping catalogues store the same keys: the entries
+        are inserted with ON CONFLICT DO NOTHING, and a conflict with entries
+        stored by a concurrent calculation since this transaction started
+        skips the storage instead of failing the calculation.
+        """
+        if not results:
+            return
+
+        existing = self._get_cached_totals(set(results), include_operations)
+        results = {key: value for key, value in results.items() if key not in existing}
+        if not results:
+            return
+
+        try:
+            with self.env.cr.savepoint():
+                self._insert_entries(results, include_operations)
+        except OperationalError as e:
+            if e.pgcode not in PG_CONCURRENCY_ERRORS_TO_RETRY:
+                raise
+            _logger.info("BOM cost cache entries already stored by a concurrent calculation")
+
+    @api.model
+    def _insert_entries(self, results, include_operations):
+        """Insert the entries of _store_totals and their dependencies, keys already stored are skipped"""
+        self.flush_model()
+        cr = self.env.cr
+        uid = self.env.uid
+        params = []
+        for (bom_id, product_id), (totals, dependencies) in results.items():
+            params.extend([bom_id, product_id, self.env.company.id, include_operations, *totals, uid, uid])
+        cr.execute("""
+            INSERT INTO {table} (bom_id, product_id, company_id, include_operations,
+                                 material_cost, operation_cost, duration,
+                                 create_uid, create_date, write_uid, write_date)
+            VALUES {rows}
+            ON CONFLICT DO NOTHING
+            RETURNING id, bom_id, product_id
+        """.format(
+            table=self._table,
+            rows=', '.join(["(%s, %s, %s, %s, %s, %s, %s, %s, now() at time zone 'UTC', "
+                            "%s, now() at time zone 'UTC')"] * len(results)),
+        ), params)
+        inserted = cr.fetchall()
+
+        for position, (relation, column) in enumerate([
+            ('mrp_bom_cost_cache_product_rel', 'product_id'),
+            ('mrp_bom_cost_cache_bom_rel', 'bom_id'),
+            ('mrp_bom_cost_cache_workcenter_rel', 'workcenter_id'),
+        ]):
+            pairs = [
+                (entry_id, record_id)
+                for entry_id, bom_id, product_id in inserted
+                for record_id in results[(bom_id, product_id)][1][position]
+            ]
+            if pairs:
+                cr.execute("INSERT INTO {} (cache_id, {}) VALUES {} ON CONFLICT DO NOTHING".format(
+                    relation, column, ', '.join(['(%s, %s)'] * len(pairs))),
+                    [value for pair in pairs for value in pair])
+        self.invalidate_model()
+
+    @api.model
+    def _invalidate(self, products=None, boms=None, workcenters=None):
+        """
+        Remove every entry depending on the given products, BOMs or workcenters.
+
+        Entries removed by a concurrent invalidation since this transaction
+        started raise a serialization failure: the entries are then removed one
+        by one, skipping those already gone.
+        """
+        domain = []
+        if products:
+            domain.append([('dependency_product_ids', 'in', products.ids)])
+        if boms:
+            domain.append([('dependency_bom_ids', 'in', boms.ids)])
+        if workcenters:
+            domain.append([('dependency_workcenter_ids', 'in', workcenters.ids)])
+        if not domain:
+            return
+
+        domain = ['|'] * (len(domain) - 1) + [leaf for clause in domain for leaf in clause]
+        entries = self.sudo().search(domain)
+        if not entries:
+            return
+        _logger.debug("Invalidating %s BOM cost cache entries", len(entries))
+        try:
+            with self.env.cr.savepoint():
+                entries.unlink()
+            return
+        except OperationalError as e:
+            if e.pgcode not in PG_CONCURRENCY_ERRORS_TO_RETRY:
+                raise
+        for entry in entries:
+            try:
+                with self.env.cr.savepoint():
+                    entry.unlink()
+            except OperationalError as e:
+                if e.pgcode not in PG_CONCURRENCY_ERRORS_TO_RETRY:
+                    raise
+                _logger.info("BOM cost cache entry %s already invalidated by a concurrent transaction", entry.id)
+
+    @api.model
+    def _touch_inputs(self, records):
+        """
+        Bump the write date of costing inputs changed without a write of
+        theirs, e.g. the BOM of an unlinked line: the incremental
+        recalculation detects changes from write dates only.
+        """
+        records = records.exists()
+        if not records:
+            return
+        records.flush_recordset()
+        self.env.cr.execute(
+            f"UPDATE {records._table} SET write_date = now() at time zone 'UTC' WHERE id IN %s",
+            [tuple(records.ids)])
+        records.invalidate_recordset(['write_date'])
+
+
+class ProductProduct(models.Model):
+    _inherit = 'product.product'
+
+    def write(self, vals):
+        res = super().write(vals)
+        # The unit of measure converts the BOM line quantities of the product
+        if 'standard_price' in vals or 'uom_id' in vals:
+            self.env['mrp.bom.cost.cache']._invalidate(products=self)
+        return res
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'uom_id' in vals:
+            self.env['mrp.bom.cost.cache']._invalidate(
+                products=self.with_context(active_test=False).product_variant_ids)
+        return res
+
+
+class UomUom(models.Model):
+    _inherit = 'uom.uom'
+
+    # Fields feeding the quantity and price conversions of the costing
+    _cost_cache_fields = {'factor', 'factor_inv', 'rounding', 'uom_type', 'category_id'}
+
+    def write(self, vals):
+        res = super().write(vals)
+        if self._cost_cache_fields.intersection(vals):
+            products = self.env['product.product'].with_context(active_test=False).search(
+                [('uom_id', 'in', self.ids)])
+            boms = self.env['mrp.bom'].with_context(active_test=False).search(
+                [('product_uom_id', 'in', self.ids)])
+            boms |= self.env['mrp.bom.line'].search([('product_uom_id', 'in', self.ids)]).bom_id
+            self.env['mrp.bom.cost.cache']._invalidate(products=products, boms=boms)
+            # Not a write of these records, but their costs change all the same
+            self.env['mrp.bom.cost.cache']._touch_inputs(products)
+            self.env['mrp.bom.cost.cache']._touch_inputs(boms)
+        return res
+
+
+class MrpBom(models.Model):
+    _inherit = 'mrp.bom'
+
+    # Changes to these fields alter the rolled-up cost or the BOM resolution
+    _cost_cache_fields = {
+        'active', 'product_tmpl_id', 'product_id', 'product_qty', 'product_uom_id',
+        'company_id', 'sequence', 'type', 'bom_line_ids', 'operation_ids',
+    }
+
+    def _invalidate_cost_cache(self):
+        # The products of these BOMs may be components of other cached BOMs
+        products = self.product_id | self.product_tmpl_id.with_context(active_test=False).product_variant_ids
+        self.env['mrp.bom.cost.cache']._invalidate(products=products, boms=self)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        boms = super().create(vals_list)
+        boms._invalidate_cost_cache()
+        return boms
+
+    def write(self, vals):
+        if self._cost_cache_fields.intersection(vals):
+            self._invalidate_cost_cache()
+        res = super().write(vals)
+        if self._cost_cache_fields.intersection(vals):
+            self._invalidate_cost_cache()
+        return res
+
+    def unlink(self):
+        self._invalidate_cost_cache()
+        # Parents resolving these BOMs change, through the products they make
+        self.env['mrp.bom.cost.cache']._touch_inputs(
+            self.product_id | self.product_tmpl_id.with_context(active_test=False).product_variant_ids)
+        return super().unlink()
+
+
+class MrpBomLine(models.Model):
+    _inherit = 'mrp.bom.line'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        self.env['mrp.bom.cost.cache']._invalidate(boms=lines.bom_id)
+        return lines
+
+    def write(self, vals):
+        boms = self.bom_id
+        res = super().write(vals)
+        self.env['mrp.bom.cost.cache']._invalidate(boms=boms | self.bom_id)
+        if 'bom_id' in vals:
+            self.env['mrp.bom.cost.cache']._touch_inputs(boms - self.bom_id)
+        return res
+
+    def unlink(self):
+        boms = self.bom_id
+        self.env['mrp.bom.cost.cache']._invalidate(boms=boms)
+        res = super().unlink()
+        self.env['mrp.bom.cost.cache']._touch_inputs(boms)
+        return res
+
+
+class MrpRoutingWorkcenter(models.Model):
+    _inherit = 'mrp.routing.workcenter'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        operations = super().create(vals_list)
+        self.env['mrp.bom.cost.cache']._invalidate(boms=operations.bom_id)
+        return operations
+
+    def write(self, vals):
+        boms = self.bom_id
+        res = super().write(vals)
+        self.env['mrp.bom.cost.cache']._invalidate(boms=boms | self.bom_id)
+        if 'bom_id' in vals:
+            self.env['mrp.bom.cost.cache']._touch_inputs(boms - self.bom_id)
+        return res
+
+    def unlink(self):
+        boms = self.bom_id
+        self.env['mrp.bom.cost.cache']._invalidate(boms=boms)
+        res = super().unlink()
+        self.env['mrp.bom.cost.cache']._touch_inputs(boms)
+        return res
+
+
+class MrpWorkcenter(models.Model):
+    _inherit = 'mrp.workcenter'
+
+    # Fields feeding mrp.routing.workcenter._total_cost_per_hour()
+    _cost_cache_fields = {'costs_hour', 'employee_costs_hour'}
+
+    def write(self, vals):
+        res = super().write(vals)
+        if self._cost_cache_fields.intersection(vals):
+            self.env['mrp.bom.cost.cache']._invalidate(workcenters=self)
+        return res
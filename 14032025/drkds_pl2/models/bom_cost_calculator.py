@@ -1,9 +1,29 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
+from contextlib import nullcontext
+from .bom_cost_breakdown import decode_breakdown, encode_breakdown
+from .bom_cost_context import CalculationContext
+from .bom_cost_kernel import CostKernel
+from .bom_cost_matrix import BomCostMatrix, BomCycleError
+from . import bom_cost_sharding
 import logging
+import time
 
 _logger = logging.getLogger(__name__)
 
+# Calculator totals and the product line field adding up to each of them
+LINE_TOTAL_FIELDS = {
+    'total_material_cost': 'material_cost',
+    'total_operation_cost': 'operation_cost',
+    'other_cost': 'other_cost',
+    'total_jobwork_cost': 'jobwork_cost',
+    'total_freight_cost': 'freight_cost',
+    'total_packing_cost': 'packing_cost',
+    'cushion': 'cushion',
+    'gross_profit_add': 'gross_profit_add',
+}
+
+
 class BOMCostCalculator(models.Model):
     _name = 'mrp.bom.cost.calculator'
     _description = 'BOM Cost Calculator'
@@ -21,6 +41,20 @@ class BOMCostCalculator(models.Model):
         required=False)
     
     include_operations = fields.Boolean('Include Operations Cost', default=True)
+    calculation_mode = fields.Selection([
+        ('standard', 'Standard'),
+        ('matrix', 'Whole Catalogue (Matrix)'),
+        ('sharded', 'Sharded (Multi-process)'),
+    ], string='Calculation Mode', default='standard', required=True,
+        help="Whole Catalogue solves every BOM reachable from the products at once as a "
+             "sparse linear system, which is faster for large catalogues with shared sub-assemblies. "
+             "It uses NumPy/SciPy when installed on the server, a sweep of the BOM graph otherwise.\n"
+             "Sharded splits the products of background calculations between several worker "
+             "processes, on servers running with multiple workers.")
+    worker_count = fields.Integer('Worker Processes',
+        default=lambda self: int(self.env['ir.config_parameter'].sudo().get_param(
+            'drkds_pl2.calculation_workers', 0) or 0),
+        help="Number of worker processes used by the sharded mode, 0 uses all cores of the server.")
     state = fields.Selection([
         ('draft', 'Draft'),
         ('calculated', 'Calculated'),
@@ -37,7 +71,10 @@ class BOMCostCalculator(models.Model):
     gross_profit_add = fields.Float('Gross Profit Addition', readonly=True)
     
     total_cost = fields.Float('Total Cost', readonly=True)
+    # Historic breakdown lines, breakdowns are now kept in breakdown_snapshot
     cost_details_ids = fields.One2many('mrp.bom.cost.calculator.line', 'calculator_id', 'Cost Details')
+    breakdown_snapshot = fields.Binary('Cost Breakdown Snapshot', attachment=False, readonly=True, copy=False,
+        help="Cost breakdown of the calculator, compressed (see bom_cost_breakdown.encode_breakdown).")
     
     # Multi-product mode is now the default
     is_multi_product = fields.Boolean('Multiple Products', default=True)
@@ -45,6 +82,27 @@ class BOMCostCalculator(models.Model):
     other_cost = fields.Float('Other Cost', readonly=True, store=True)
     unit_cost = fields.Float('Cost Per Unit', compute='_compute_unit_cost', store=True)
 
+    # Background calculation job, processed in committed chunks by a cron
+    job_state = fields.Selection([
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Background Calculation', readonly=True, copy=False)
+    job_user_id = fields.Many2one('res.users', 'Requested By', readonly=True, copy=False)
+    job_company_id = fields.Many2one('res.company', 'Job Company', readonly=True, copy=False)
+    job_date_start = fields.Datetime('Job Started', readonly=True, copy=False)
+    job_date_end = fields.Datetime('Job Finished', readonly=True, copy=False)
+    job_line_count = fields.Integer('Lines to Calculate', readonly=True, copy=False)
+    job_done_count = fields.Integer('Lines Processed', readonly=True, copy=False)
+    job_error_count = fields.Integer('Lines in Error', readonly=True, copy=False)
+    job_progress = fields.Float('Progress', compute='_compute_job_progress')
+    job_message = fields.Text('Job Message', readonly=True, copy=False)
+    calculation_date = fields.Datetime('Last Calculation', readonly=True, copy=False,
+        help="Time of the last full or incremental calculation, inputs changed later are recalculated "
+             "by the incremental recalculation.")
+    run_ids = fields.One2many('mrp.bom.cost.run', 'calculator_id', 'Calculation Runs', readonly=True, copy=False)
+
     def _clear_calculation_cache(self):
         """Clear the calculation cache to ensure fresh calculations"""
         if hasattr(self, '_cost_calculation_cache'):
@@ -58,6 +116,14 @@ class BOMCostCalculator(models.Model):
             else:
                 record.unit_cost = record.total_cost
     
+    @api.depends('job_line_count', 'job_done_count')
+    def _compute_job_progress(self):
+        for record in self:
+            record.job_progress = (
+                100.0 * record.job_done_count / record.job_line_count
+                if record.job_line_count else 0.0
+            )
+
     @api.constrains('is_multi_product', 'product_line_ids')
     def _check_required_fields(self):
         """Ensure the record has the necessary data based on its mode"""
@@ -124,44 +190,42 @@ class BOMCostCalculator(models.Model):
         }
 
     def add_product_lines(self, product_ids):
-        """Add multiple product lines"""
-        for product_id in product_ids:
+        """Add multiple product lines, products already in the calculator are skipped"""
+        self.ensure_one()
+        vals_list = self._get_product_line_values(product_ids)
+        for vals in vals_list:
+            vals['calculator_id'] = self.id
+        # All lines are inserted at once
+        return self.env['mrp.bom.cost.calculator.product.line'].create(vals_list)
+
+    def _get_product_line_values(self, product_ids):
+        """
+        Values of the product lines of products, without the calculator, the
+        products already in the calculator being skipped. Also usable on an
+        empty recordset to create a calculator with its lines.
+        """
+        bom_index = self.env['mrp.bom']._get_bom_resolution_index()
+        existing = set(self.product_line_ids.product_id.ids)
+        vals_list = []
+        # Skip products that don't exist anymore
+        for product in self.env['product.product'].browse(product_ids).exists():
+            if product.id in existing:
+                continue
+            existing.add(product.id)
             try:
                 # Use proper error handling for BOM finding
-                product = self.env['product.product'].browse(product_id)
-                if not product.exists():
-                    continue  # Skip if product doesn't exist
-                    
-                # Try to find BOM using the new method signature first
-                try:
-                    bom = self.env['mrp.bom']._bom_find(
-                        products=product,
-                        company_id=self.env.company.id,
-                        picking_type=False
-                    ).get(product)
-                except (TypeError, ValueError):
-                    # Fall back to the old method signature if the new one fails
-                    try:
-                        bom_result = self.env['mrp.bom']._bom_find(
-                            product_id=product_id,
-                            company_id=self.env.company.id
-                        )
-                        bom = bom_result.get(product_id)
-                    except Exception:
-                        bom = False
-                
-                # Create the product line with error handling
-                self.env['mrp.bom.cost.calculator.product.line'].create({
-                    'calculator_id': self.id,
-                    'product_id': product_id,
-                    'is_manufacture': bool(bom),
-                    'bom_id': bom.id if bom else False,
-                    'state': 'draft'
-                })
+                bom = bom_index.get(product, self.env.company.id)
             except Exception as e:
-                _logger.error("Error adding product %s: %s", product_id, str(e))
+                _logger.error("Error adding product %s: %s", product.id, str(e))
                 # Continue with next product instead of failing
                 continue
+            vals_list.append({
+                'product_id': product.id,
+                'is_manufacture': bool(bom),
+                'bom_id': bom.id if bom else False,
+                'state': 'draft'
+            })
+        return vals_list
     
     @api.onchange('product_id')
     def _onchange_product_id(self):
@@ -198,199 +262,196 @@ class BOMCostCalculator(models.Model):
                 vals['name'] = self.env['ir.sequence'].next_by_code('mrp.bom.cost.calculator') or 'New'
         return super().create(vals_list)
 
-    def _calculate_bom_cost(self, bom, processed_boms=None, create_lines=True, level=0, product=None):
+    def unlink(self):
+        # Fall back to older calculators for the unit costs published by these ones
+        LatestCost = self.env['mrp.bom.cost.latest']
+        products = LatestCost.sudo().search([('calculator_id', 'in', self.ids)]).product_id
+        res = super().unlink()
+        LatestCost._refresh_products(products)
+        return res
+
+    def _get_calculation_context(self, run_type=None, price_overrides=None, **tables):
+        """
+        Return a new CalculationContext for a calculation of the calculator.
+
+        With run_type, the run is measured by a CalculationRecorder of this type.
+        price_overrides, {product_id: price}, replaces standard prices for a
+        what-if calculation. tables may give the bom_index, rate_table and
+        uom_table to share.
         """
-        Calculate BOM cost with improved performance through caching
+        self.ensure_one()
+        recorder = self.env['mrp.bom.cost.run']._get_recorder(self, run_type) if run_type else None
+        return CalculationContext(
+            self.env,
+            include_operations=self.include_operations,
+            calculation_mode=self.calculation_mode,
+            worker_count=self.worker_count,
+            name=self.name,
+            recorder=recorder,
+            price_overrides=price_overrides,
+            background=run_type == 'background',
+            **tables
+        )
+
+    def _calculate_bom_cost(self, bom, create_lines=True, level=0, product=None, context=None):
+        """
+        Calculate the cost of a BOM for a product (the calculator product by default)
         - Material costs are only included for raw materials (no BOM)
         - Components from BOMs only consider quantity ratios
         - Handles unit costs from pre-calculated components
+        - With create_lines, the breakdown rows are added to the breakdown snapshot
         """
         if not bom:
             return 0, 0, 0
-        
-        # Initialize cache for this calculation if needed
-        if not hasattr(self, '_cost_calculation_cache'):
-            self._cost_calculation_cache = {}
-        
-        # Create cache key based on BOM ID and product ID (if any)
-        cache_key = (bom.id, product.id if product else 0, level, create_lines)
-        
-        # Return cached result if available and we're not creating lines
-        # (can't cache when creating lines as they'd be duplicated)
-        if not create_lines and cache_key in self._cost_calculation_cache:
-            return self._cost_calculation_cache[cache_key]
-            
-        # Use provided product or fall back to the one on the record
-        product_to_use = product or self.product_id
-                
-        if processed_boms is None:
-            processed_boms = set()
-                
-        if bom.id in processed_boms:
-            return 0, 0, 0
-        processed_boms.add(bom.id)
-            
-        material_total = 0
-        operation_total = 0
-        total_duration = 0
-
-        # Operation costs
-        if self.include_operations:
-            for operation in bom.operation_ids:
-                if hasattr(operation, '_skip_operation_line') and operation._skip_operation_line(product_to_use):
-                    continue
-                        
-                duration_expected = (
-                    operation.time_cycle or 
-                    operation.time_cycle_manual or 
-                    operation.duration_expected or 
-                    0.0
-                )
-                
-                total_duration += duration_expected
-                
-                cost_per_minute = operation._total_cost_per_hour() / 60
-                operation_cost = duration_expected * cost_per_minute
-                    
-                if create_lines:
-                    self.env['mrp.bom.cost.calculator.line'].create({
-                        'calculator_id': self.id,
-                        'name': f"{bom.product_tmpl_id.display_name} - {operation.workcenter_id.name} ({operation.name or 'Operation'})",
-                        'cost_type': 'operation',
-                        'operation_id': operation.id,
-                        'duration': duration_expected,
-                        'unit_cost': operation._total_cost_per_hour(),
-                        'cost': operation_cost,
-                        'bom_level': level,
-                        'bom_qty': bom.product_qty,
-                    })
 
-                operation_total += operation_cost
+        product = product or self.product_id
+        totals, rows = self._get_bom_cost_breakdown(bom, product, level=level, context=context)
+        if create_lines and rows:
+            self._add_breakdown_rows(rows)
+        return totals
 
-        # Material costs
-        for line in bom.bom_line_ids:
-            if hasattr(line, '_skip_bom_line') and line._skip_bom_line(product_to_use):
-                continue
+    def _get_breakdown_snapshot(self):
+        """Return the cost breakdown snapshot of the calculator, with its pending rows"""
+        self.ensure_one()
+        self._flush_breakdown_rows()
+        return self.with_context(bin_size=False).breakdown_snapshot
 
-            line_qty = line.product_uom_id._compute_quantity(
-                line.product_qty, line.product_id.uom_id)
-
-            child_bom = self.env['mrp.bom']._bom_find(
-                products=line.product_id,
-                company_id=bom.company_id.id,
-                picking_type=False
-            ).get(line.product_id)
-
-            if child_bom:
-                # Look for an existing calculator with unit cost for this component
-                child_calculator = self.env['mrp.bom.cost.calculator'].search([
-                    ('product_id', '=', line.product_id.id),
-                    ('state', '=', 'calculated')
-                ], limit=1, order='create_date desc')
-                
-                # Check if we can use the existing calculator
-                if child_calculator:
-                    # Calculate unit cost based on BOM quantity if available
-                    if child_calculator.bom_id and child_calculator.bom_id.product_qty > 0:
-                        unit_cost = child_calculator.total_cost / child_calculator.bom_id.product_qty
-                    else:
-                        unit_cost = child_calculator.total_cost
-                    
-                    # Handle UoM conversions if needed
-                    if child_calculator.bom_id and child_calculator.bom_id.product_uom_id.id != line.product_uom_id.id:
-                        # Convert the unit cost to the line's UoM
-                        converted_cost = child_calculator.bom_id.product_uom_id._compute_price(
-                            unit_cost, line.product_uom_id)
-                        component_cost = converted_cost * line.product_qty
-                    else:
-                        component_cost = unit_cost * line_qty
-                        
-                    material_total += component_cost
-                    
-                    if create_lines:
-                        self.env['mrp.bom.cost.calculator.line'].create({
-                            'calculator_id': self.id,
-                            'name': f"{line.product_id.display_name} (Component with Pre-calculated Cost)",
-                            'cost_type': 'material',
-                            'product_id': line.product_id.id,
-                            'quantity': line_qty,
-                            'unit_cost': unit_cost,
-                            'cost': component_cost,
-                            'bom_level': level,
-                            'bom_qty': bom.product_qty,
-                        })
-                else:
-                    # For components with BOMs, we only pass through their costs 
-                    # without adding new material costs
-                    child_material, child_operation, child_duration = self._calculate_bom_cost(
-                        child_bom, 
-                        processed_boms.copy(),
-                        create_lines=create_lines,
-                        level=level + 1,
-                        product=line.product_id
-                    )
-                    
-                    # Add child costs considering the quantity ratio
-                    # We need to ensure UoM compatibility
-                    if child_bom.product_uom_id.id != line.product_uom_id.id:
-                        # Convert child BOM quantity to line's UoM
-                        child_bom_qty_in_line_uom = child_bom.product_uom_id._compute_quantity(
-                            child_bom.product_qty, line.product_uom_id)
-                        qty_ratio = line.product_qty / (child_bom_qty_in_line_uom or 1.0)
-                    else:
-                        qty_ratio = line.product_qty / (child_bom.product_qty or 1.0)
-                    
-                    material_total += child_material * qty_ratio
-                    operation_total += child_operation * qty_ratio
-                    total_duration += child_duration * qty_ratio
-                    
-                    if create_lines:
-                        # Calculate unit cost based on BOM quantity
-                        unit_cost = child_material / (child_bom.product_qty or 1.0)
-                        
-                        # If UoMs differ, convert the unit cost
-                        if child_bom.product_uom_id.id != line.product_uom_id.id:
-                            unit_cost = child_bom.product_uom_id._compute_price(
-                                unit_cost, line.product_uom_id)
-                        
-                        self.env['mrp.bom.cost.calculator.line'].create({
-                            'calculator_id': self.id,
-                            'name': f"{line.product_id.display_name} (Component from BOM)",
-                            'cost_type': 'material',
-                            'product_id': line.product_id.id,
-                            'quantity': line_qty,
-                            'unit_cost': unit_cost,
-                            'cost': child_material * qty_ratio,
-                            'bom_level': level,
-                            'bom_qty': bom.product_qty,
-                        })
-                
-            else:
-                # Only add material cost for raw materials (no BOM)
-                component_cost = line.product_id.standard_price * line_qty
-                material_total += component_cost
-
-                if create_lines:
-                    self.env['mrp.bom.cost.calculator.line'].create({
-                        'calculator_id': self.id,
-                        'name': f"{line.product_id.display_name} (Raw Material)",
-                        'cost_type': 'material',
-                        'product_id': line.product_id.id,
-                        'quantity': line_qty,
-                        'unit_cost': line.product_id.standard_price,
-                        'cost': component_cost,
-                        'bom_level': level,
-                        'bom_qty': bom.product_qty,
-                    })
+    def _get_breakdown_rows(self):
+        """Return the rows of the cost breakdown snapshot of the calculator"""
+        return decode_breakdown(self._get_breakdown_snapshot())
 
-        # Cache the result before returning (only if not creating lines)
-        if not create_lines:
-            self._cost_calculation_cache[cache_key] = (material_total, operation_total, total_duration)
-            
-        return material_total, operation_total, total_duration
+    def _add_breakdown_rows(self, rows):
+        """
+        Append breakdown rows to the cost breakdown snapshot of the calculator.
+
+        Rows are collected until the transaction commits or the snapshot is
+        read, so the snapshot is decoded and encoded once per run instead of
+        once per BOM.
+        """
+        self.ensure_one()
+        pending = self.env.cr.precommit.data.setdefault('drkds_pl2.breakdown_rows', {})
+        if not pending:
+            self.env.cr.precommit.add(self._flush_breakdown_rows)
+        pending.setdefault(self.id, []).extend(rows)
+
+    def _flush_breakdown_rows(self):
+        """Encode the pending breakdown rows into the snapshots of their calculators"""
+        pending = self.env.cr.precommit.data.pop('drkds_pl2.breakdown_rows', None)
+        if not pending:
+            return
+        calculators = self.browse(pending).exists()
+        for calculator in calculators:
+            snapshot = calculator.with_context(bin_size=False).breakdown_snapshot
+            calculator.breakdown_snapshot = encode_breakdown(decode_breakdown(snapshot) + pending[calculator.id])
+        # Also run as a precommit hook, after the ORM flush
+        calculators.flush_recordset(['breakdown_snapshot'])
+
+    def action_view_cost_breakdown(self):
+        """Open the cost breakdown of the calculator, read from its snapshot"""
+        self.ensure_one()
+        lines = self.env['mrp.bom.cost.breakdown.line']._create_from_calculator(self)
+        return {
+            'name': _('Cost Breakdown of %s') % self.name,
+            'type': 'ir.actions.act_window',
+            'res_model': 'mrp.bom.cost.breakdown.line',
+            'view_mode': 'tree',
+            'domain': [('id', 'in', lines.ids)],
+            'target': 'current',
+        }
+
+    def _get_bom_cost_breakdown(self, bom, product, level=0, context=None):
+        """
+        Return ((material_total, operation_total, total_duration), rows) for a
+        BOM built for a product, rows being the values of its breakdown lines.
+        """
+        context = context or self._get_calculation_context()
+        kernel = context.get_kernel([(bom, product)], use_cache=False, load_names=True)
+        return kernel.breakdown((bom.id, product.id), level=level)
+
+    def _rollup_bom_costs(self, roots, context=None, use_cache=True, store_cache=True):
+        """
+        Bottom-up cost rollup for a set of (bom, product) roots.
+
+        The BOM graph of all roots is loaded once in a BomSnapshot and walked
+        children first by the CostKernel, so every sub-assembly shared between
+        finished products is computed once per run instead of once per parent.
+
+        Sub-assemblies with a valid mrp.bom.cost.cache entry are not expanded,
+        and newly computed results are stored there for later calculations,
+        unless store_cache is False.
+
+        context is the CalculationContext of the run, its kernel is reused when
+        it already covers the roots, e.g. after the validation pass.
+
+        Returns {(bom_id, product_id): (material_total, operation_total, total_duration)}
+        """
+        context = context or self._get_calculation_context()
+        kernel = context.get_kernel(roots, use_cache=use_cache)
+        totals, dependencies, uncacheable, order = kernel.rollup(
+            [(bom.id, product.id) for bom, product in roots])
+
+        # Totals under overridden prices are not the real costs of the BOMs
+        if use_cache and store_cache and not context.price_overrides:
+            self.env['mrp.bom.cost.cache']._store_totals({
+                key: (totals[key], dependencies[key])
+                for key in order if key not in uncacheable
+            }, context.include_operations)
+
+        return totals
+
+    def _solve_bom_costs(self, roots, context=None):
+        """
+        Return {(bom_id, product_id): (material_total, operation_total, total_duration)}
+        for the roots, using the calculation mode of the context.
+        """
+        context = context or self._get_calculation_context()
+        if context.price_overrides:
+            # What-if calculations are always rolled up from the snapshot
+            return self._rollup_bom_costs(roots, context=context)
+        if context.calculation_mode == 'matrix':
+            try:
+                return BomCostMatrix.load(
+                    self.env, roots, context.include_operations, bom_index=context.bom_index,
+                    rate_table=context.rate_table, uom_table=context.uom_table
+                ).solve()
+            except BomCycleError:
+                _logger.warning("Cyclic BOM graph in %s, falling back to the standard rollup", context.name)
+        elif context.calculation_mode == 'sharded':
+            # Workers are only forked for background jobs, see _get_shard_pool
+            if context.shard_pool is not None and len(roots) > 1:
+                return context.shard_pool.compute_totals(self, roots)
+            if not context.background:
+                _logger.info("%s is calculated in a single process, only background calculations "
+                             "are sharded", context.name)
+        return self._rollup_bom_costs(roots, context=context)
+
+    def _get_shard_pool(self, context):
+        """
+        Return a ShardPool for a sharded background run, None when the run is
+        calculated in a single process, logging why.
+
+        Workers are only forked for background jobs, whose chunks start on
+        committed data, and from a process that can be forked safely.
+        """
+        if context.calculation_mode != 'sharded' or not context.background:
+            return None
+        if not bom_cost_sharding.can_fork(self.env):
+            _logger.warning("%s is calculated in a single process, calculation workers can only be "
+                            "forked by the main thread of a multi-process server", context.name)
+            return None
+        worker_count = bom_cost_sharding.get_worker_count(self.env, context.worker_count)
+        if worker_count <= 1:
+            _logger.info("%s is calculated in a single process, with a single worker", context.name)
+            return None
+        return bom_cost_sharding.ShardPool(worker_count)
 
     def action_calculate_all_costs(self):
-        """Calculate costs for all selected products with comprehensive data validation"""
+        """
+        Calculate costs for all selected products with comprehensive data validation.
+
+        Sharded calculations only fork workers in background jobs, they are
+        queued as one instead.
+        """
         self.ensure_one()
         
         # Clear calculation cache for fresh results
@@ -399,222 +460,281 @@ class BOMCostCalculator(models.Model):
         # Check if there are products to calculate
         if not self.product_line_ids:
             raise UserError(_('Please select at least one product.'))
+        if self.job_state in ('queued', 'running'):
+            raise UserError(_('A background calculation is already in progress for this calculator.'))
+        if self.calculation_mode == 'sharded':
+            self.action_calculate_in_background()
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _('Sharded Calculation'),
+                    'message': _('Sharded calculations run in the background, the calculation has been queued.'),
+                    'sticky': False,
+                    'type': 'info',
+                    'next': {'type': 'ir.actions.client', 'tag': 'reload'},
+                }
+            }
+
+        context = self._get_calculation_context('full')
+        with context.phase('resolution'):
+            # BOM resolutions, workcenter rates and UoM conversions are shared by
+            # the validation and costing passes
+            context.load_tables()
+
+            # A single snapshot of the BOM graph serves validation and costing
+            manufactured_lines = self.product_line_ids.filtered(lambda l: l.is_manufacture and l.bom_id)
+            context.get_kernel([(l.bom_id, l.product_id) for l in manufactured_lines])
+        with context.phase('validation'):
+            self._check_calculation_data(context)
+        self._calculate_product_lines(self.product_line_ids, context)
+        with context.phase('aggregation'):
+            self._write_calculation_totals()
+        context.recorder.save()
+        return True
+
+    def _check_calculation_data(self, context=None, lines=None):
+        """Verify the products (of all lines by default) have the necessary data, raise a UserError otherwise"""
+        report = self._get_validation_report(context, lines)
+        if report:
+            raise UserError(self._format_validation_report(report))
+
+    def _get_validation_report(self, context=None, lines=None):
+        """
+        Check the data of the product lines, all of them by default, in a
+        single pass over the BOM graph.
+
+        The CostKernel of the manufactured lines is taken from the
+        CalculationContext, so the costing pass reuses the same snapshot.
+        Operation costs are read from its rate_table (see WorkcenterRateTable)
+        and UoM compatibility from its uom_table (see UomConversionTable).
+        Returns a dict without empty entries:
+        - missing_bom: products to manufacture without BOM
+        - empty_bom: products whose BOM has no component
+        - missing_cost: {product: raw materials without cost in its BOM structure}
+        - circular: circular BOM references
+        - operations: operations without duration or cost
+        - uom: unit of measure inconsistencies
+        """
+        report = {}
+        lines = self.product_line_ids if lines is None else lines
+        manufactured_lines = lines.filtered(lambda l: l.is_manufacture and l.bom_id)
 
-        # 1. Verify all products have the necessary data before starting calculation
-        invalid_products = []
-        for line in self.product_line_ids:
+        for line in lines:
             if line.is_manufacture and not line.bom_id:
-                invalid_products.append(line.product_id.display_name)
-                
-        if invalid_products:
-            raise UserError(_(
-                'The following products are marked for manufacturing but have no BOM assigned: %s. '
-                'Please assign BOMs or uncheck the manufacturing option.'
-            ) % ', '.join(invalid_products))
-        
-        # 2. Check if all manufacturing products have BOMs with components
-        empty_boms = []
-        for line in self.product_line_ids.filtered(lambda l: l.is_manufacture and l.bom_id):
+                report.setdefault('missing_bom', []).append(line.product_id.display_name)
+
+        context = context or self._get_calculation_context()
+        rate_table = context.rate_table
+        uom_table = context.uom_table
+        root_keys = [(l.bom_id.id, l.product_id.id) for l in manufactured_lines]
+        kernel = context.get_kernel([(l.bom_id, l.product_id) for l in manufactured_lines])
+        snapshot = kernel.snapshot
+        order, edges = kernel.walk(root_keys)
+
+        # Raw materials without cost and cycles below each node, children first.
+        # Components using a pre-calculated cost and cached sub-assemblies are
+        # not descended into, exactly like the costing pass.
+        missing_costs = {}
+        cycles = {}
+        for key in order:
+            child_keys = {line.id: child_key for child_key, line in edges[key]}
+            node_missing_costs = []
+            node_cycles = []
+            for bom_line in kernel.node_lines(key):
+                if not bom_line.child_bom_id:
+                    if snapshot.products[bom_line.product_id].standard_price <= 0:
+                        node_missing_costs.append(bom_line.product_id)
+                elif child_keys.get(bom_line.id) is False:
+                    node_cycles.append((key[0], bom_line.product_id))
+                elif bom_line.id in child_keys:
+                    node_missing_costs.extend(missing_costs.get(child_keys[bom_line.id], ()))
+                    node_cycles.extend(cycles.get(child_keys[bom_line.id], ()))
+            if node_missing_costs:
+                missing_costs[key] = list(dict.fromkeys(node_missing_costs))
+            if node_cycles:
+                cycles[key] = list(dict.fromkeys(node_cycles))
+
+        # Names are only read for the reported products
+        product_names = {
+            product.id: product.display_name
+            for product in self.env['product.product'].browse({
+                product_id for key in root_keys for product_id in missing_costs.get(key, ())
+            } | {
+                product_id for key in root_keys for bom_id, product_id in cycles.get(key, ())
+            })
+        }
+
+        for line in manufactured_lines:
+            key = (line.bom_id.id, line.product_id.id)
+            product_name = line.product_id.display_name
+
             if not line.bom_id.bom_line_ids:
-                empty_boms.append(f"{line.product_id.display_name} (BOM: {line.bom_id.display_name})")
-                
-        if empty_boms:
-            raise UserError(_(
-                'The following products have BOMs with no components: %s. '
-                'Please add components to these BOMs before calculating costs.'
-            ) % ', '.join(empty_boms))
-        
-        # 3. Check for raw materials without costs defined
-        missing_costs_by_bom = {}
-        for line in self.product_line_ids.filtered(lambda l: l.is_manufacture and l.bom_id):
-            missing_costs = []
-            
-            # Function to recursively check component costs
-            def check_component_costs(bom, processed=None):
-                if processed is None:
-                    processed = set()
-                    
-                if bom.id in processed:
-                    return []
-                    
-                processed.add(bom.id)
-                result = []
-                
-                for component in bom.bom_line_ids:
-                    # Skip if component will be skipped during calculation
-                    if hasattr(component, '_skip_bom_line') and component._skip_bom_line(line.product_id):
-                        continue
-                        
-                    child_bom = self.env['mrp.bom']._bom_find(
-                        products=component.product_id,
-                        company_id=bom.company_id.id,
-                        picking_type=False
-                    ).get(component.product_id)
-                    
-                    if child_bom:
-                        # Check subcomponents recursively
-                        result.extend(check_component_costs(child_bom, processed.copy()))
-                    else:
-                        # Check if raw material has cost defined
-                        if component.product_id.standard_price <= 0:
-                            result.append(component.product_id.display_name)
-                            
-                return result
-                
-            missing_costs = check_component_costs(line.bom_id)
-            if missing_costs:
-                missing_costs_by_bom[line.product_id.display_name] = missing_costs
-                
-        if missing_costs_by_bom:
-            error_message = _('The following BOMs contain components with no cost defined:\n\n')
-            for product, components in missing_costs_by_bom.items():
-                error_message += _("• %s: %s\n") % (product, ', '.join(components))
-            error_message += _('\nPlease set costs for these components before calculating.')
-            raise UserError(error_message)
-        
-        # 4. Check for potential circular BOM references
-        circular_references = []
-        
-        for line in self.product_line_ids.filtered(lambda l: l.is_manufacture and l.bom_id):
-            processed = set()
-            to_process = [(line.bom_id, [])]
-            
-            while to_process:
-                current_bom, path = to_process.pop(0)
-                
-                if current_bom.id in processed:
-                    continue
-                    
-                processed.add(current_bom.id)
-                current_path = path + [current_bom.product_tmpl_id.display_name]
-                
-                for component in current_bom.bom_line_ids:
-                    if component.product_id.product_tmpl_id.id == line.product_id.product_tmpl_id.id:
-                        # Found circular reference
-                        circular_references.append(
-                            _("%s: %s → %s") % (
-                                line.product_id.display_name, 
-                                ' → '.join(current_path), 
-                                line.product_id.display_name
-                            )
-                        )
-                        break
-                        
-                    child_bom = self.env['mrp.bom']._bom_find(
-                        products=component.product_id,
-                        company_id=current_bom.company_id.id,
-                        picking_type=False
-                    ).get(component.product_id)
-                    
-                    if child_bom:
-                        to_process.append((child_bom, current_path))
-        
-        if circular_references:
-            raise UserError(_(
-                'Detected circular references in the following BOMs:\n\n%s\n\n'
-                'Please correct these circular references before calculating costs.'
-            ) % '\n'.join(circular_references))
-        
-        # 5. Check if any operation doesn't have proper time or cost data
-        invalid_operations = []
-        
-        for line in self.product_line_ids.filtered(lambda l: l.is_manufacture and l.bom_id):
-            if self.include_operations:
+                report.setdefault('empty_bom', []).append(
+                    f"{product_name} (BOM: {line.bom_id.display_name})")
+            if key in missing_costs:
+                report.setdefault('missing_cost', {})[product_name] = [
+                    product_names[product_id] for product_id in missing_costs[key]]
+            for bom_id, component_id in cycles.get(key, ()):
+                cycle = _("%s → %s") % (snapshot.boms[bom_id].name, product_names[component_id])
+                report.setdefault('circular', []).append(_("%s: %s") % (product_name, cycle))
+
+            # Operations and UoMs of the product BOM itself
+            if context.include_operations:
                 for operation in line.bom_id.operation_ids:
                     if hasattr(operation, '_skip_operation_line') and operation._skip_operation_line(line.product_id):
                         continue
-                        
+
                     duration = (
                         operation.time_cycle or 
                         operation.time_cycle_manual or 
                         operation.duration_expected or 
                         0.0
                     )
-                    
                     if duration <= 0:
-                        invalid_operations.append(
+                        report.setdefault('operations', []).append(
                             _("%s: %s (Workcenter: %s) has no duration defined") % (
-                                line.product_id.display_name,
+                                product_name,
                                 operation.name or _('Unnamed operation'),
                                 operation.workcenter_id.name
                             )
                         )
-                        
-                    if operation._total_cost_per_hour() <= 0:
-                        invalid_operations.append(
+                    if rate_table.get(operation) <= 0:
+                        report.setdefault('operations', []).append(
                             _("%s: %s (Workcenter: %s) has no cost defined") % (
-                                line.product_id.display_name,
+                                product_name,
                                 operation.name or _('Unnamed operation'),
                                 operation.workcenter_id.name
                             )
                         )
-        
-        if invalid_operations:
-            raise UserError(_(
-                'The following operations have invalid time or cost data:\n\n%s\n\n'
-                'Please correct these issues before calculating costs.'
-            ) % '\n'.join(invalid_operations))
-        
-        # 6. Check for UoM consistency
-        uom_issues = []
-        
-        for line in self.product_line_ids.filtered(lambda l: l.is_manufacture and l.bom_id):
+
             if line.bom_id.product_uom_id.id != line.product_id.uom_id.id:
-                uom_issues.append(
+                report.setdefault('uom', []).append(
                     _("%s: BOM uses %s but product uses %s") % (
-                        line.product_id.display_name,
+                        product_name,
                         line.bom_id.product_uom_id.name,
                         line.product_id.uom_id.name
                     )
                 )
-                
             for component in line.bom_id.bom_line_ids:
-                try:
-                    # Try a test conversion to ensure compatibility
-                    component.product_uom_id._compute_quantity(1.0, component.product_id.uom_id)
-                except Exception:
-                    uom_issues.append(
+                if not uom_table.is_compatible(component.product_uom_id, component.product_id.uom_id):
+                    report.setdefault('uom', []).append(
                         _("%s: Component %s has incompatible UoMs (%s and %s)") % (
-                            line.product_id.display_name,
+                            product_name,
                             component.product_id.display_name,
                             component.product_uom_id.name,
                             component.product_id.uom_id.name
                         )
                     )
-        
-        if uom_issues:
-            raise UserError(_(
+
+        return report
+
+    @api.model
+    def _format_validation_report(self, report):
+        """Return the user message describing a validation report"""
+        sections = []
+        if report.get('missing_bom'):
+            sections.append(_(
+                'The following products are marked for manufacturing but have no BOM assigned: %s. '
+                'Please assign BOMs or uncheck the manufacturing option.'
+            ) % ', '.join(report['missing_bom']))
+        if report.get('empty_bom'):
+            sections.append(_(
+                'The following products have BOMs with no components: %s. '
+                'Please add components to these BOMs before calculating costs.'
+            ) % ', '.join(report['empty_bom']))
+        if report.get('missing_cost'):
+            error_message = _('The following BOMs contain components with no cost defined:\n\n')
+            for product, components in report['missing_cost'].items():
+                error_message += _("• %s: %s\n") % (product, ', '.join(components))
+            error_message += _('\nPlease set costs for these components before calculating.')
+            sections.append(error_message)
+        if report.get('circular'):
+            sections.append(_(
+                'Detected circular references in the following BOMs:\n\n%s\n\n'
+                'Please correct these circular references before calculating costs.'
+            ) % '\n'.join(report['circular']))
+        if report.get('operations'):
+            sections.append(_(
+                'The following operations have invalid time or cost data:\n\n%s\n\n'
+                'Please correct these issues before calculating costs.'
+            ) % '\n'.join(report['operations']))
+        if report.get('uom'):
+            sections.append(_(
                 'The following Unit of Measure issues were detected:\n\n%s\n\n'
                 'Please correct these UoM issues before calculating costs.'
-            ) % '\n'.join(uom_issues))
-        
-        # If all checks pass, proceed with calculation
-        # Initialize totals for the main calculator
-        total_material_cost = 0.0
-        total_operation_cost = 0.0
-        total_other_cost = 0.0  
+            ) % '\n'.join(report['uom']))
+        return '\n\n'.join(sections)
+
+    def _calculate_product_lines(self, lines, context, raise_errors=True):
+        """
+        Calculate and write the costs of some product lines of the calculator.
 
-        for line in self.product_line_ids:
+        With raise_errors=False, failing lines are marked in error with their
+        message instead of aborting the calculation. context is the
+        CalculationContext of the run, its phases are measured by its recorder.
+        Returns the lines in error.
+        """
+        error_lines = self.env['mrp.bom.cost.calculator.product.line']
+
+        # Roll up every BOM reachable from the selected lines in one bottom-up pass
+        manufactured_lines = lines.filtered(lambda l: l.is_manufacture and l.bom_id)
+        roots = [(l.bom_id, l.product_id) for l in manufactured_lines]
+        kernel = None
+        try:
+            if context.calculation_mode == 'standard':
+                with context.phase('resolution'):
+                    kernel = context.get_kernel(roots)
+            with context.phase('traversal'):
+                bom_totals = self._solve_bom_costs(roots, context)
+        except Exception as e:
+            _logger.error("Error calculating BOM costs for %s: %s", self.name, str(e))
+            if raise_errors:
+                raise UserError(_("Error calculating BOM costs: %s") % str(e))
+            if len(lines) == 1:
+                lines.write({'state': 'error', 'error_message': str(e)})
+                return lines
+            # Isolate the failing lines
+            for line in lines:
+                error_lines |= self._calculate_product_lines(line, context, raise_errors=False)
+            return error_lines
+
+        context.record_lines(len(lines), kernel, [(bom.id, product.id) for bom, product in roots])
+        with context.phase('line_writes'):
+            error_lines |= self._write_product_line_costs(lines, bom_totals, raise_errors)
+        return error_lines
+
+    def _write_product_line_costs(self, lines, bom_totals, raise_errors=True):
+        """
+        Write the costs of product lines from the rolled up BOM totals, all at
+        once (see _write_cost_results), returns the lines in error
+        """
+        results, error_lines = self._get_product_line_results(lines, bom_totals, raise_errors)
+        lines._write_cost_results(results)
+        return error_lines
+
+    def _get_product_line_results(self, lines, bom_totals, raise_errors=True, context=None):
+        """
+        Return ({line_id: values to write}, lines in error) for product lines
+        from the rolled up BOM totals. Standard prices are read through the
+        CalculationContext, if given, to honour its price overrides.
+        """
+        error_lines = self.env['mrp.bom.cost.calculator.product.line']
+        results = {}
+        for line in lines:
             if not line.is_manufacture or not line.bom_id:
-                line.write({
+                results[line.id] = {
                     'state': 'calculated',
-                    'material_cost': line.product_id.standard_price,
-                })
+                    'material_cost': (context.standard_price(line.product_id) if context
+                                      else line.product_id.standard_price),
+                    'error_message': False,
+                }
                 continue
                 
-            # Temporarily store the current product_id
-            original_product_id = self.product_id
-            
-            # Set the product_id to the line's product for the calculation
-            self.product_id = line.product_id
-            
             try:
-                material_cost, operation_cost, total_duration = self._calculate_bom_cost(
-                    line.bom_id, 
-                    level=0,
-                    create_lines=False,
-                    product=line.product_id 
-                )
+                material_cost, operation_cost, total_duration = bom_totals[
+                    (line.bom_id.id, line.product_id.id)
+                ]
                 
                 # Get additional costs from product
                 jobwork_cost = line.product_id.total_jobwork_cost or 0.0
@@ -623,21 +743,9 @@ class BOMCostCalculator(models.Model):
                 cushion_value = line.product_id.cushion or 0.0
                 gross_profit = line.product_id.gross_profit_add or 0.0
                 
-                # Calculate the per-unit other cost
-                per_unit_other_cost = (
-                    jobwork_cost + 
-                    freight_cost + 
-                    packing_cost + 
-                    cushion_value + 
-                    gross_profit
-                )
-                
-                # Scale by BOM quantity
+                # Scale by BOM quantity, the other cost is their sum
                 bom_qty = line.bom_id.product_qty or 1.0
-                other_cost = per_unit_other_cost * bom_qty
-                    
-                # Update product line
-                line.write({
+                results[line.id] = {
                     'material_cost': material_cost,
                     'operation_cost': operation_cost,
                     'jobwork_cost': jobwork_cost * bom_qty,
@@ -645,45 +753,471 @@ class BOMCostCalculator(models.Model):
                     'packing_cost': packing_cost * bom_qty,
                     'cushion': cushion_value * bom_qty,
                     'gross_profit_add': gross_profit * bom_qty,
-                    'other_cost': other_cost,
-                    'state': 'calculated'
-                })
-                
-                # Add to calculator totals
-                total_material_cost += material_cost
-                total_operation_cost += operation_cost
-                total_other_cost += other_cost
+                    'state': 'calculated',
+                    'error_message': False,
+                }
                 
             except Exception as e:
                 # Log and display error for this specific product
                 _logger.error("Error calculating costs for %s: %s", line.product_id.display_name, str(e))
-                raise UserError(_(
-                    "Error calculating costs for %s: %s"
-                ) % (line.product_id.display_name, str(e)))
-            finally:
-                # Restore the original product_id
-                self.product_id = original_product_id    
-            
+                if raise_errors:
+                    raise UserError(_(
+                        "Error calculating costs for %s: %s"
+                    ) % (line.product_id.display_name, str(e)))
+                results[line.id] = {'state': 'error', 'error_message': str(e)}
+                error_lines |= line
+
+        return results, error_lines
+
+    def _simulate_costs(self, price_overrides, lines=None):
+        """
+        What-if calculation of product lines (all by default) with some
+        standard prices replaced, {product_id: price}. Nothing is written, not
+        even the product master or the BOM cost cache.
+
+        Returns {line: values} with the material, operation and other costs the
+        line would get, and the resulting total_cost and unit_cost.
+        """
+        self.ensure_one()
+        lines = self.product_line_ids if lines is None else lines
+        context = self._get_calculation_context(price_overrides=price_overrides)
+        roots = [(l.bom_id, l.product_id) for l in lines if l.is_manufacture and l.bom_id]
+        bom_totals = self._solve_bom_costs(roots, context)
+        results, error_lines = self._get_product_line_results(lines, bom_totals, context=context)
+        simulation = {}
+        for line in lines:
+            values = results[line.id]
+            values.update(line._get_cost_chain_values(values))
+            simulation[line] = values
+        return simulation
+
+    @api.model
+    def _aggregate_line_costs(self, lines):
+        """
+        Return the amounts some product lines add to each calculator total, and
+        whether they are all calculated, from a single SQL aggregate
+        """
+        if not lines:
+            return dict.fromkeys(LINE_TOTAL_FIELDS, 0.0), True
+        Line = self.env['mrp.bom.cost.calculator.product.line']
+        Line.flush_model(list(LINE_TOTAL_FIELDS.values()) + ['is_manufacture', 'bom_id', 'state'])
+        # Material, operation and other costs only count for calculated manufactured lines
+        self.env.cr.execute("""
+            SELECT COALESCE(SUM(material_cost) FILTER (WHERE manufactured), 0),
+                   COALESCE(SUM(operation_cost) FILTER (WHERE manufactured), 0),
+                   COALESCE(SUM(other_cost) FILTER (WHERE manufactured), 0),
+                   COALESCE(SUM(jobwork_cost), 0),
+                   COALESCE(SUM(freight_cost), 0),
+                   COALESCE(SUM(packing_cost), 0),
+                   COALESCE(SUM(cushion), 0),
+                   COALESCE(SUM(gross_profit_add), 0),
+                   COALESCE(BOOL_AND(state = 'calculated'), TRUE)
+              FROM (
+                  SELECT *, (is_manufacture AND bom_id IS NOT NULL AND state = 'calculated') AS manufactured
+                    FROM mrp_bom_cost_calculator_product_line
+                   WHERE id = ANY(%s)
+              ) AS line
+        """, [lines.ids])
+        row = self.env.cr.fetchone()
+        return {fname: float(amount) for fname, amount in zip(LINE_TOTAL_FIELDS, row)}, row[-1]
+
+    def _write_calculation_totals(self):
+        """Update the calculator totals from all its calculated product lines"""
+        totals, all_calculated = self._aggregate_line_costs(self.product_line_ids)
+
         # Update calculator with totals
-        self.write({
-            'total_material_cost': total_material_cost,
-            'total_operation_cost': total_operation_cost,
-            'total_jobwork_cost': sum(line.jobwork_cost for line in self.product_line_ids),
-            'total_freight_cost': sum(line.freight_cost for line in self.product_line_ids),
-            'total_packing_cost': sum(line.packing_cost for line in self.product_line_ids),
-            'cushion': sum(line.cushion for line in self.product_line_ids),
-            'gross_profit_add': sum(line.gross_profit_add for line in self.product_line_ids),
-            'other_cost': total_other_cost,
-            'total_cost': (
-                total_material_cost +
-                total_operation_cost +
-                total_other_cost
+        self.write(dict(
+            totals,
+            total_cost=(
+                totals['total_material_cost'] +
+                totals['total_operation_cost'] +
+                totals['other_cost']
             ),
-            'state': 'calculated'
-        })
+            calculation_date=self.env.cr.now(),
+            state='calculated' if all_calculated else 'draft',
+        ))
+
+        # Publish the new unit costs, this also invalidates cached parents that
+        # used an older pre-calculated cost of these products
+        self.env['mrp.bom.cost.latest']._update_from_calculators(self)
         
+    def action_open_compare_wizard(self):
+        """Open the wizard comparing the calculator with another one"""
+        self.ensure_one()
+        return {
+            'name': _('Compare with...'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'mrp.bom.cost.compare.wizard',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_calculator_id': self.id},
+        }
+
+    def _compare_product_lines(self, base):
+        """
+        Diff the product lines of the calculator against those of a base
+        calculator, matched by product with one joined query.
+
+        Returns a list of dicts with the product_id, the base_* and current
+        material_cost, operation_cost, other_cost and unit_cost, None for
+        the side where the product is missing, and whether the product was
+        added or removed.
+        """
+        self.ensure_one()
+        self.env['mrp.bom.cost.calculator.product.line'].flush_model(
+            ['calculator_id', 'product_id', 'material_cost', 'operation_cost', 'other_cost', 'unit_cost'])
+        self.env.cr.execute("""
+            WITH current_line AS (
+                SELECT product_id, material_cost, operation_cost, other_cost, unit_cost
+                  FROM mrp_bom_cost_calculator_product_line
+                 WHERE calculator_id = %s
+            ), base_line AS (
+                SELECT product_id, material_cost, operation_cost, other_cost, unit_cost
+                  FROM mrp_bom_cost_calculator_product_line
+                 WHERE calculator_id = %s
+            )
+            SELECT COALESCE(current_line.product_id, base_line.product_id) AS product_id,
+                   base_line.material_cost AS base_material_cost, current_line.material_cost,
+                   base_line.operation_cost AS base_operation_cost, current_line.operation_cost,
+                   base_line.other_cost AS base_other_cost, current_line.other_cost,
+                   base_line.unit_cost AS base_unit_cost, current_line.unit_cost,
+                   base_line.product_id IS NULL AS added, current_line.product_id IS NULL AS removed
+              FROM current_line
+              FULL OUTER JOIN base_line ON base_line.product_id = current_line.product_id
+             ORDER BY 1
+        """, [self.id, base.id])
+        return self.env.cr.dictfetchall()
+
+    def _compare_components(self, base):
+        """
+        Diff the raw materials of the calculator and of a base calculator.
+
+        The BOMs of the manufactured product lines of both calculators are
+        exploded down to their raw materials in one kernel walk, each root
+        scaled to one unit of product, and the quantities are summed by raw
+        material over the lines of each calculator. Costs are valued at the
+        current standard prices, so the differences come from the product
+        lines and BOMs of the calculators; price changes show on the product
+        line differences.
+
+        Returns a list of dicts with the product_id, the base_* and current
+        quantity, cost and unit_cost (cost per unit of component), None for
+        the side where the component is missing.
+        """
+        self.ensure_one()
+        calculators = self | base
+        lines = calculators.product_line_ids.filtered(lambda l: l.is_manufacture and l.bom_id)
+        roots = list({(line.bom_id, line.product_id) for line in lines})
+        snapshot = self.env['mrp.bom']._get_bom_cost_snapshot(
+            roots, include_operations=False, use_precalculated=False)
+        requirements = CostKernel(snapshot).raw_material_requirements(
+            [(bom.id, product.id) for bom, product in roots])
+
+        def merge(calculator):
+            components = {}
+            for line in lines.filtered(lambda l: l.calculator_id == calculator):
+                bom_qty = line.bom_id.product_qty if line.bom_id.product_qty > 0 else 1.0
+                for product_id, qty in requirements.get((line.bom_id.id, line.product_id.id), {}).items():
+                    quantity = qty / bom_qty
+                    previous_quantity, cost = components.get(product_id, (0.0, 0.0))
+                    components[product_id] = (
+                        previous_quantity + quantity,
+                        cost + quantity * snapshot.products[product_id].standard_price,
+                    )
+            return components
+
+        current, previous = merge(self), merge(base)
+        result = []
+        for product_id in sorted(current.keys() | previous.keys()):
+            values = {'product_id': product_id}
+            for prefix, components in (('', current), ('base_', previous)):
+                if product_id in components:
+                    quantity, cost = components[product_id]
+                    values.update({
+                        prefix + 'quantity': quantity,
+                        prefix + 'cost': cost,
+                        prefix + 'unit_cost': cost / quantity if quantity else cost,
+                    })
+                else:
+                    values.update(dict.fromkeys([prefix + 'quantity', prefix + 'cost', prefix + 'unit_cost']))
+            result.append(values)
+        return result
+
+    def _get_price_sensitivity(self, lines=None):
+        """
+        Price sensitivity of the manufactured product lines (all by default).
+
+        Returns {line: {raw material product_id: coefficient}}, the coefficient
+        being the change of the line unit cost per unit change of the standard
+        price of the raw material, i.e. its flattened quantity per unit of
+        product. All lines are solved in one pass over the BOM graph (see
+        BomCostMatrix.requirement_coefficients). Pre-calculated unit costs
+        are not used, so components are flattened down to their raw materials.
+        """
+        self.ensure_one()
+        lines = (self.product_line_ids if lines is None else lines).filtered(
+            lambda l: l.is_manufacture and l.bom_id)
+        if not lines:
+            return {}
+        context = self._get_calculation_context()
+        roots = [(line.bom_id, line.product_id) for line in lines]
+        root_keys = [(bom.id, product.id) for bom, product in roots]
+        snapshot = self.env['mrp.bom']._get_bom_cost_snapshot(
+            roots, include_operations=False, bom_index=context.bom_index, rate_table=context.rate_table,
+            uom_table=context.uom_table, use_precalculated=False)
+        try:
+            requirements = BomCostMatrix.from_snapshot(snapshot, root_keys).requirement_coefficients(root_keys)
+        except BomCycleError:
+            # The kernel cuts cycles like the costing does
+            requirements = CostKernel(snapshot).raw_material_requirements(root_keys)
+
+        sensitivity = {}
+        for line, key in zip(lines, root_keys):
+            bom_qty = line.bom_id.product_qty if line.bom_id.product_qty > 0 else 1.0
+            sensitivity[line] = {
+                product_id: qty / bom_qty for product_id, qty in requirements.get(key, {}).items()
+            }
+        return sensitivity
+
+    def action_open_sensitivity_wizard(self):
+        """Open the raw material price sensitivity analysis of the calculator"""
+        self.ensure_one()
+        return {
+            'name': _('Price Sensitivity'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'mrp.bom.cost.sensitivity.wizard',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_calculator_id': self.id},
+        }
+
+    def _get_changed_inputs(self, since):
+        """
+        Return the products and BOMs whose costing inputs were written after since:
+        standard prices, product other costs, BOM headers, BOM lines, operations,
+        workcenters and pre-calculated unit costs. Removed BOM lines, operations
+        and BOMs bump the write date of their BOM or products, see
+        mrp.bom.cost.cache._touch_inputs.
+        """
+        domain = [('write_date', '>', since)]
+        products = self.env['product.product'].with_context(active_test=False).search(domain)
+        products |= self.env['product.template'].with_context(active_test=False).search(
+            domain).product_variant_ids
+        products |= self.env['mrp.bom.cost.latest'].sudo().search(domain).product_id.sudo(False)
+
+        Bom = self.env['mrp.bom'].with_context(active_test=False)
+        boms = Bom.search(domain)
+        boms |= self.env['mrp.bom.line'].search(domain).bom_id
+        operations = self.env['mrp.routing.workcenter'].with_context(active_test=False).search(
+            ['|', ('write_date', '>', since), ('workcenter_id.write_date', '>', since)])
+        boms |= operations.bom_id
+        return products, boms
+
+    def _get_affected_boms(self, products, boms):
+        """
+        Reverse-dependency walk: every BOM using, directly or through its
+        sub-assemblies, one of the products or BOMs.
+        """
+        Bom = self.env['mrp.bom'].with_context(active_test=False)
+        BomLine = self.env['mrp.bom.line']
+        affected = Bom.browse()
+        pending_boms = boms
+        pending_products = products
+        while pending_boms or pending_products:
+            affected |= pending_boms
+            # Products made by changed BOMs are changed components of their parents
+            pending_products |= pending_boms.product_id | pending_boms.filtered(
+                lambda b: not b.product_id).product_tmpl_id.product_variant_ids
+            parents = BomLine.search([('product_id', 'in', pending_products.ids)]).bom_id
+            pending_boms = parents - affected
+            pending_products = self.env['product.product']
+        return affected
+
+    def action_incremental_recalculate(self):
+        """
+        Recalculate only the product lines depending on inputs changed since the
+        last calculation, then update the calculator totals.
+        """
+        self.ensure_one()
+        if self.state != 'calculated' or not self.calculation_date:
+            raise UserError(_('Please run a full calculation first.'))
+        if self.job_state in ('queued', 'running'):
+            raise UserError(_('A background calculation is already in progress for this calculator.'))
+
+        context = self._get_calculation_context('incremental')
+        with context.phase('resolution'):
+            products, boms = self._get_changed_inputs(self.calculation_date)
+            affected_boms = self._get_affected_boms(products, boms)
+            lines = self.product_line_ids.filtered(
+                lambda l: l.product_id in products or (l.is_manufacture and l.bom_id in affected_boms)
+            )
+        if not lines:
+            self.calculation_date = self.env.cr.now()
+            context.recorder.save()
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _('Incremental Recalculation'),
+                    'message': _('No product depends on inputs changed since the last calculation.'),
+                    'sticky': False,
+                    'type': 'info'
+                }
+            }
+
+        self._clear_calculation_cache()
+        context.load_tables()
+        # A new raw material without cost or a new BOM cycle fails like in a full run
+        with context.phase('validation'):
+            self._check_calculation_data(context, lines)
+        self._calculate_product_lines(lines, context)
+
+        with context.phase('aggregation'):
+            self._write_calculation_totals()
+        context.recorder.save()
+        _logger.info("Incremental recalculation of %s: %s of %s lines", self.name,
+                     len(lines), len(self.product_line_ids))
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Incremental Recalculation'),
+                'message': _("%s products recalculated") % len(lines),
+                'sticky': False,
+                'type': 'success',
+                'next': {'type': 'ir.actions.client', 'tag': 'reload'},
+            }
+        }
+
+    def action_calculate_in_background(self):
+        """Queue the calculation, processed in committed chunks by a scheduled action"""
+        self.ensure_one()
+        if not self.product_line_ids:
+            raise UserError(_('Please select at least one product.'))
+        if self.job_state in ('queued', 'running'):
+            raise UserError(_('A background calculation is already in progress for this calculator.'))
+
+        self.product_line_ids.write({'state': 'draft', 'error_message': False})
+        self.write({
+            'job_state': 'queued',
+            'job_user_id': self.env.user.id,
+            'job_company_id': self.env.company.id,
+            'job_date_start': fields.Datetime.now(),
+            'job_date_end': False,
+            'job_line_count': len(self.product_line_ids),
+            'job_done_count': 0,
+            'job_error_count': 0,
+            'job_message': False,
+        })
+        self.env.ref('drkds_pl2.ir_cron_process_calculation_jobs')._trigger()
         return True
-        
+
+    def action_cancel_background_job(self):
+        """Stop a queued or running background calculation"""
+        self.filtered(lambda c: c.job_state in ('queued', 'running')).write({
+            'job_state': 'failed',
+            'job_date_end': fields.Datetime.now(),
+            'job_message': _('Cancelled by %s.') % self.env.user.name,
+        })
+        return True
+
+    @api.model
+    def _cron_process_calculation_jobs(self):
+        """
+        Process the queued and running background calculations.
+
+        Lines are calculated in chunks committed one by one, so a job interrupted
+        by a time limit or a restart resumes with its remaining draft lines. When
+        the time budget is exhausted, the cron re-triggers itself.
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        chunk_size = int(params.get_param('drkds_pl2.calculation_job_chunk_size', 200) or 200)
+        time_budget = int(params.get_param('drkds_pl2.calculation_job_time_budget', 240) or 240)
+        deadline = time.time() + time_budget
+
+        calculators = self.search([('job_state', 'in', ('queued', 'running'))], order='job_date_start, id')
+        for calculator in calculators:
+            calculator = calculator.with_user(calculator.job_user_id).with_company(calculator.job_company_id)
+            try:
+                finished = calculator._process_calculation_job(chunk_size, deadline)
+            except Exception as e:
+                self.env.cr.rollback()
+                _logger.exception("Background calculation of %s failed", calculator.name)
+                calculator.sudo().write({
+                    'job_state': 'failed',
+                    'job_date_end': fields.Datetime.now(),
+                    'job_message': str(e),
+                })
+                self.env.cr.commit()
+                continue
+            if not finished:
+                self.env.ref('drkds_pl2.ir_cron_process_calculation_jobs')._trigger()
+                return
+
+    def _process_calculation_job(self, chunk_size, deadline):
+        """Process chunks of a background calculation, return False when out of time"""
+        self.ensure_one()
+        self._clear_calculation_cache()
+        Run = self.env['mrp.bom.cost.run']
+        context = self._get_calculation_context('background')
+        with context.phase('resolution'):
+            context.load_tables()
+
+        if self.job_state == 'queued':
+            try:
+                with context.phase('validation'):
+                    self._check_calculation_data(context)
+            except UserError as e:
+                self.write({
+                    'job_state': 'failed',
+                    'job_date_end': fields.Datetime.now(),
+                    'job_message': str(e),
+                })
+                self.env.cr.commit()
+                return True
+            self.job_state = 'running'
+            self.env.cr.commit()
+
+        Line = self.env['mrp.bom.cost.calculator.product.line']
+        # The workers of a sharded job are forked once, right after a commit,
+        # and serve all its chunks
+        context.shard_pool = self._get_shard_pool(context)
+        with context.shard_pool or nullcontext():
+            while True:
+                lines = Line.search([
+                    ('calculator_id', '=', self.id),
+                    ('state', '=', 'draft'),
+                ], limit=chunk_size)
+                if not lines:
+                    break
+                error_lines = self._calculate_product_lines(lines, context, raise_errors=False)
+                self.write({
+                    'job_done_count': self.job_done_count + len(lines),
+                    'job_error_count': self.job_error_count + len(error_lines),
+                })
+                # One run is recorded per committed chunk
+                context.recorder.save()
+                self.env.cr.commit()
+                context.recorder = Run._get_recorder(self, 'background')
+                # The job may have been cancelled meanwhile
+                self.invalidate_recordset(['job_state'])
+                if self.job_state != 'running':
+                    return True
+                if time.time() > deadline:
+                    return False
+
+        with context.phase('aggregation'):
+            self._write_calculation_totals()
+        context.recorder.save()
+        self.write({
+            'job_state': 'done',
+            'job_date_end': fields.Datetime.now(),
+            'job_message': _('%s lines could not be calculated.') % self.job_error_count
+            if self.job_error_count else False,
+        })
+        self.env.cr.commit()
+        return True
+
     def add_product_line(self):
         """Add a new product line"""
         self.ensure_one()
@@ -789,23 +1323,7 @@ class ProductSelectionWizard(models.TransientModel):
         if not self.product_ids:
             raise UserError(_("Please select at least one product."))
             
-        for product in self.product_ids:
-            # Find default BOM using the new method signature
-            bom = self.env['mrp.bom']._bom_find(
-                products=product,
-                company_id=self.env.company.id,
-                picking_type=False
-            )
-            # Get the BOM for this specific product
-            product_bom = bom.get(product)
-            
-            self.env['mrp.bom.cost.calculator.product.line'].create({
-                'calculator_id': self.calculator_id.id,
-                'product_id': product.id,
-                'is_manufacture': bool(product_bom),
-                'bom_id': product_bom.id if product_bom else False,
-                'state': 'draft'
-            })
+        self.calculator_id.add_product_lines(self.product_ids.ids)
         return {'type': 'ir.actions.act_window_close'}
         
         
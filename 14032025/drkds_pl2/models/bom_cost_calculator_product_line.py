@@ -1,5 +1,6 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
+from collections import defaultdict
 import logging
 
 _logger = logging.getLogger(__name__)
@@ -13,7 +14,7 @@ class BOMCostCalculatorProductLine(models.Model):
     calculator_id = fields.Many2one('mrp.bom.cost.calculator', 'Calculator', required=True, ondelete='cascade')
     product_id = fields.Many2one('product.product', 'Product', required=True, index=True)
     product_tmpl_id = fields.Many2one('product.template', related='product_id.product_tmpl_id', 
-        string='Product Template', store=True, index=True)
+        string='Product Template', store=True, index=True, precompute=True)
     
     is_manufacture = fields.Boolean('Manufacturing Product', default=False)
     bom_id = fields.Many2one('mrp.bom', 'Bill of Materials', 
@@ -53,7 +54,9 @@ class BOMCostCalculatorProductLine(models.Model):
     state = fields.Selection([
         ('draft', 'Draft'),
         ('calculated', 'Calculated'),
+        ('error', 'Error'),
     ], string='Status', default='draft')
+    error_message = fields.Text('Calculation Error', readonly=True, copy=False)
     
     _sql_constraints = [
         ('product_calculator_uniq', 'unique (calculator_id, product_id)', 
@@ -103,6 +106,90 @@ class BOMCostCalculatorProductLine(models.Model):
                 # Non-manufactured items: use base cost instead of material+operation
                 record.total_cost = (record.base_cost or 0.0) + (record.other_cost or 0.0)
     
+    def _get_cost_chain_values(self, values):
+        """
+        Return the other_cost, total_cost and unit_cost of the line once values
+        are written, as computed by _compute_other_cost, _compute_total_cost and
+        _compute_unit_cost. Fields missing from values keep their current value.
+        """
+        self.ensure_one()
+
+        def value(fname):
+            return values[fname] if fname in values else self[fname]
+
+        other_cost = sum([
+            value('jobwork_cost') or 0.0,
+            value('freight_cost') or 0.0,
+            value('packing_cost') or 0.0,
+            value('cushion') or 0.0,
+            value('gross_profit_add') or 0.0,
+        ])
+        if value('is_manufacture'):
+            total_cost = (value('material_cost') or 0.0) + (value('operation_cost') or 0.0) + other_cost
+        else:
+            total_cost = (value('base_cost') or 0.0) + other_cost
+        bom = self.env['mrp.bom'].browse(values['bom_id']) if 'bom_id' in values else self.bom_id
+        if value('is_manufacture') and bom and bom.product_qty > 0:
+            unit_cost = total_cost / bom.product_qty
+        else:
+            unit_cost = total_cost
+        return {'other_cost': other_cost, 'total_cost': total_cost, 'unit_cost': unit_cost}
+
+    def _write_cost_results(self, results):
+        """
+        Write the calculation results of lines, {line_id: values}, at once.
+
+        The stored other_cost, total_cost and unit_cost chain is computed in one
+        pass over all the lines and written together with the results: lines
+        with the same fields are updated by a single UPDATE statement instead of
+        one write and one chain recomputation per line.
+
+        The SQL bypasses write(), so the access rights and record rules are
+        checked here, and the ORM cache and the dependents of the written
+        fields are updated afterwards.
+        """
+        if not results:
+            return
+        chain = ['other_cost', 'total_cost', 'unit_cost']
+        lines = self.browse(list(results))
+        lines.check_access_rights('write')
+        lines.check_access_rule('write')
+        lines.flush_recordset()
+
+        groups = defaultdict(list)
+        for line in lines:
+            values = dict(results[line.id])
+            values.update(line._get_cost_chain_values(values))
+            groups[tuple(sorted(values))].append((line, values))
+
+        for fnames, rows in groups.items():
+            fields_list = [self._fields[fname] for fname in fnames]
+            row_template = '(%s, {})'.format(', '.join(
+                '%s::{}'.format(field.column_type[1]) for field in fields_list))
+            params = []
+            for line, values in rows:
+                params.append(line.id)
+                params.extend(field.convert_to_column(values[field.name], line) for field in fields_list)
+            self.env.cr.execute("""
+                UPDATE {table} AS line
+                   SET {assignments}, write_uid = %s, write_date = (now() at time zone 'UTC')
+                  FROM (VALUES {rows}) AS result(id, {columns})
+                 WHERE line.id = result.id
+            """.format(
+                table=self._table,
+                assignments=', '.join('"{0}" = result."{0}"'.format(fname) for fname in fnames),
+                rows=', '.join([row_template] * len(rows)),
+                columns=', '.join('"{}"'.format(fname) for fname in fnames),
+            ), [self.env.uid] + params)
+
+        # The chain was written with the results, only its dependents elsewhere
+        # are left to recompute
+        fnames = sorted({fname for group in groups for fname in group}.union(chain))
+        lines.invalidate_recordset(fnames + ['write_uid', 'write_date'])
+        lines.modified(fnames)
+        for fname in chain:
+            self.env.remove_to_compute(self._fields[fname], lines)
+
     def action_reset_to_draft(self):
         """
         Reset the line to draft status to allow modifications.
@@ -184,19 +271,19 @@ class BOMCostCalculatorProductLine(models.Model):
             self.material_cost = 0.0
             self.operation_cost = 0.0
     
-    def _find_product_bom(self, product):
+    def _find_product_bom(self, product, bom_index=None):
         """
         Find the default BOM for a product.
         Returns the BOM record or False if not found.
+        A shared BOM resolution index can be passed when resolving several products,
+        a single product is resolved with mrp.bom._bom_find.
         """
         if not product:
             return False
-            
-        bom = self.env['mrp.bom']._bom_find(
-            products=product,
-            company_id=self.env.company.id,
-            picking_type=False
-        ).get(product)
+
+        if bom_index is None:
+            return self.env['mrp.bom']._bom_find(product, company_id=self.env.company.id)[product]
+        bom = bom_index.get(product, self.env.company.id)
         
         return bom
     
@@ -255,6 +342,14 @@ class BOMCostCalculatorProductLine(models.Model):
     
     @api.model
     def calculate_non_manufactured_costs(self, calculator_id):
+        """
+        Calculate the non-manufactured lines of a calculator, kept for the
+        external callers, the writes check the access rights of the user.
+        """
+        return self._calculate_non_manufactured_costs(calculator_id)
+
+    @api.model
+    def _calculate_non_manufactured_costs(self, calculator_id):
         """
         Handle cost calculation for non-manufactured items in bulk.
         Called from the main calculator to process all non-manufactured lines.
@@ -265,16 +360,19 @@ class BOMCostCalculatorProductLine(models.Model):
             ('state', '=', 'draft')
         ])
         
+        results = {}
         for line in lines:
+            values = {
+                # Ensure manufacturing costs are zero
+                'material_cost': 0.0,
+                'operation_cost': 0.0,
+                # Mark as calculated
+                'state': 'calculated',
+            }
             # Set the base cost from standard price if not already set
             if not line.base_cost and line.product_id:
-                line.base_cost = line.product_id.standard_price or 0.0
-            
-            # Ensure manufacturing costs are zero
-            line.material_cost = 0.0
-            line.operation_cost = 0.0
-            
-            # Mark as calculated
-            line.state = 'calculated'
+                values['base_cost'] = line.product_id.standard_price or 0.0
+            results[line.id] = values
+        lines._write_cost_results(results)
         
         return True
\ No newline at end of file
@@ -0,0 +1,120 @@
+from contextlib import nullcontext
+import logging
+
+from .bom_cost_kernel import CostKernel
+
+_logger = logging.getLogger(__name__)
+
+
+class CalculationContext:
+    """
+    State of one calculation run of a BOM cost calculator.
+
+    Holds the settings of the calculator, the BOM resolutions, workcenter
+    rates and UoM conversions shared by all passes of the run, the loaded
+    CostKernel and the CalculationRecorder measuring the run. The products
+    being costed are always passed explicitly with their BOM, so the
+    calculator record is never written during the traversal and concurrent
+    calculations of overlapping catalogues do not lock each other.
+
+    The resolution tables are loaded on first use when not given. background
+    is set for the runs of background jobs, the only ones allowed to fork
+    calculation workers: shard_pool holds the ShardPool of a sharded job
+    (see bom_cost_sharding).
+
+    price_overrides, {product_id: price}, replaces the standard price of some
+    products for a what-if calculation without writing them: the snapshot
+    then ignores cached sub-assemblies and pre-calculated unit costs, so the
+    overridden prices reach every BOM level, and nothing is stored in the
+    BOM cost cache.
+    """
+
+    def __init__(self, env, include_operations=True, calculation_mode='standard', worker_count=0,
+                 name='', bom_index=None, rate_table=None, uom_table=None, recorder=None,
+                 price_overrides=None, background=False):
+        self.env = env
+        self.background = background
+        self.shard_pool = None
+        self.price_overrides = dict(price_overrides or {})
+        self.include_operations = include_operations
+        self.calculation_mode = calculation_mode
+        self.worker_count = worker_count
+        self.name = name
+        self.recorder = recorder
+        self._bom_index = bom_index
+        self._rate_table = rate_table
+        self._uom_table = uom_table
+        self._kernel = None
+        self._kernel_roots = frozenset()
+        self._kernel_options = None
+
+    @property
+    def bom_index(self):
+        if self._bom_index is None:
+            self._bom_index = self.env['mrp.bom']._get_bom_resolution_index()
+        return self._bom_index
+
+    @property
+    def rate_table(self):
+        if self._rate_table is None:
+            self._rate_table = self.env['mrp.routing.workcenter']._get_workcenter_rate_table()
+        return self._rate_table
+
+    @property
+    def uom_table(self):
+        if self._uom_table is None:
+            self._uom_table = self.env['uom.uom']._get_uom_conversion_table()
+        return self._uom_table
+
+    def load_tables(self):
+        """Load the resolution tables now, e.g. inside a measured phase"""
+        return self.bom_index, self.rate_table, self.uom_table
+
+    def standard_price(self, product):
+        """Standard price of a product, as overridden for the run"""
+        return self.price_overrides.get(product.id, product.standard_price)
+
+    def phase(self, name):
+        """Measure a phase of the run with the recorder, if any"""
+        if self.recorder is None:
+            return nullcontext()
+        return self.recorder.phase(name)
+
+    def get_kernel(self, roots, use_cache=True, load_names=False):
+        """
+        Return a CostKernel over the snapshot of the (bom, product) roots.
+
+        The kernel loaded last is reused when it covers all the roots with the
+        same options, so the validation and costing passes of a run, or the
+        lines of a failing chunk calculated one by one, share one snapshot.
+        """
+        root_keys = frozenset((bom.id, product.id) for bom, product in roots)
+        if self.price_overrides:
+            use_cache = False
+        options = (use_cache, load_names)
+        if self._kernel is not None and self._kernel_options == options and root_keys <= self._kernel_roots:
+            return self._kernel
+
+        snapshot = self.env['mrp.bom']._get_bom_cost_snapshot(
+            roots,
+            include_operations=self.include_operations,
+            bom_index=self.bom_index,
+            rate_table=self.rate_table if self.include_operations else None,
+            uom_table=self.uom_table,
+            use_precalculated=not self.price_overrides,
+            use_cache=use_cache,
+            load_names=load_names,
+            price_overrides=self.price_overrides,
+        )
+        self._kernel = CostKernel(snapshot)
+        self._kernel_roots = root_keys
+        self._kernel_options = options
+        return self._kernel
+
+    def record_lines(self, line_count, kernel=None, root_keys=()):
+        """Count calculated lines and the nodes of their kernel in the recorder"""
+        if self.recorder is None:
+            return
+        self.recorder.line_count += line_count
+        if kernel is not None:
+            self.recorder.add_kernel(kernel, root_keys)
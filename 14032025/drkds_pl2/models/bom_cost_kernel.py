@@ -0,0 +1,521 @@
+"""
+ORM-free BOM costing kernel.
+
+The costing maths of the calculator work on a BomSnapshot: plain __slots__
+records for the BOMs, BOM lines, operations and products of a calculation,
+loaded with a handful of batched reads (see bom_cost_snapshot). Nothing here
+touches the ORM, so the kernel can be exercised without a database by filling
+a snapshot by hand.
+"""
+from collections import defaultdict
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class BomData:
+    __slots__ = ('id', 'product_qty', 'uom_id', 'company_id', 'name', 'line_ids', 'operation_ids')
+
+    def __init__(self, id, product_qty, uom_id, company_id=False, name='', line_ids=(), operation_ids=()):
+        self.id = id
+        self.product_qty = product_qty
+        self.uom_id = uom_id
+        self.company_id = company_id
+        self.name = name
+        self.line_ids = list(line_ids)
+        self.operation_ids = list(operation_ids)
+
+
+class BomLineData:
+    __slots__ = ('id', 'product_id', 'product_qty', 'uom_id', 'child_bom_id', 'variant_restricted')
+
+    def __init__(self, id, product_id, product_qty, uom_id, child_bom_id=False, variant_restricted=False):
+        self.id = id
+        self.product_id = product_id
+        self.product_qty = product_qty
+        self.uom_id = uom_id
+        # Effective BOM of the component, resolved for the company of the parent BOM
+        self.child_bom_id = child_bom_id
+        self.variant_restricted = variant_restricted
+
+
+class OperationData:
+    __slots__ = ('id', 'workcenter_id', 'duration', 'cost_per_hour', 'name', 'workcenter_name',
+                 'variant_restricted')
+
+    def __init__(self, id, workcenter_id, duration, cost_per_hour, name='', workcenter_name='',
+                 variant_restricted=False):
+        self.id = id
+        self.workcenter_id = workcenter_id
+        self.duration = duration
+        self.cost_per_hour = cost_per_hour
+        self.name = name
+        self.workcenter_name = workcenter_name
+        self.variant_restricted = variant_restricted
+
+
+class ProductData:
+    __slots__ = ('id', 'uom_id', 'standard_price', 'name')
+
+    def __init__(self, id, uom_id, standard_price, name=''):
+        self.id = id
+        self.uom_id = uom_id
+        self.standard_price = standard_price
+        self.name = name
+
+
+class BomSnapshot:
+    """
+    Costing inputs of one calculation.
+
+    - boms, lines, operations, products: records by id
+    - skipped: (model, record id, product id) of the variant-restricted lines and
+      operations that do not apply to a product
+    - precalculated: {product_id: (unit_cost, uom_id of the priced BOM or False)}
+      for components priced from their latest calculated unit cost
+    - cached: {(bom_id, product_id): (totals, dependencies)} for sub-assemblies
+      with a valid cache entry, which are not expanded
+    - uom_table: UoM converter with compute_quantity / compute_price / is_compatible
+    """
+
+    def __init__(self, include_operations, uom_table):
+        self.include_operations = include_operations
+        self.uom_table = uom_table
+        self.boms = {}
+        self.lines = {}
+        self.operations = {}
+        self.products = {}
+        self.skipped = set()
+        self.precalculated = {}
+        self.cached = {}
+
+
+class NodeCosts:
+    """Costs a (bom, product) node adds by itself, and its sub-assembly edges"""
+    __slots__ = ('material', 'operation', 'duration', 'children', 'raws', 'products', 'workcenters')
+
+    def __init__(self):
+        self.material = 0.0
+        self.operation = 0.0
+        self.duration = 0.0
+        # [(child key, bom line)] for the components expanded through their BOM
+        self.children = []
+        # [(product id, quantity in product UoM)] for raw and pre-calculated components
+        self.raws = []
+        self.products = set()
+        self.workcenters = set()
+
+
+class CostKernel:
+    """
+    Costing maths over a BomSnapshot, with the formulas of
+    BOMCostCalculator._calculate_bom_cost:
+    - raw materials cost their standard price in the product UoM
+    - components with a pre-calculated unit cost use it, converted to the line UoM
+    - other components pass through their BOM totals scaled by the quantity ratio
+    - operations cost duration * cost per hour / 60
+    Nodes are keyed by (bom_id, product_id) since variant filters depend on the product.
+    Variants whose filters keep the same lines and operations of a BOM share
+    their results, see signature().
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.uom = snapshot.uom_table
+        self._nodes = {}
+        self._signatures = {}
+        self._signature_nodes = {}
+        self._breakdowns = {}
+        self._walks = {}
+        self._explosions = {}
+
+    # ------------------------------------------------------------------
+    # Node level
+    # ------------------------------------------------------------------
+
+    def node_lines(self, key):
+        bom_id, product_id = key
+        snapshot = self.snapshot
+        return [
+            line for line in map(snapshot.lines.__getitem__, snapshot.boms[bom_id].line_ids)
+            if not (line.variant_restricted and ('mrp.bom.line', line.id, product_id) in snapshot.skipped)
+        ]
+
+    def node_operations(self, key):
+        bom_id, product_id = key
+        snapshot = self.snapshot
+        if not snapshot.include_operations:
+            return []
+        return [
+            operation for operation in map(snapshot.operations.__getitem__, snapshot.boms[bom_id].operation_ids)
+            if not (operation.variant_restricted
+                    and ('mrp.routing.workcenter', operation.id, product_id) in snapshot.skipped)
+        ]
+
+    def line_quantity(self, line):
+        """Quantity of a BOM line in the UoM of its product"""
+        return self.uom.compute_quantity(
+            line.product_qty, line.uom_id, self.snapshot.products[line.product_id].uom_id)
+
+    def precalculated_cost(self, line, line_qty):
+        """Cost of a line whose component has a pre-calculated unit cost"""
+        unit_cost, bom_uom_id = self.snapshot.precalculated[line.product_id]
+        if bom_uom_id and bom_uom_id != line.uom_id:
+            return self.uom.compute_price(unit_cost, bom_uom_id, line.uom_id) * line.product_qty
+        return unit_cost * line_qty
+
+    def child_ratio(self, line):
+        """Share of the child BOM totals used by a line"""
+        child_bom = self.snapshot.boms[line.child_bom_id]
+        if child_bom.uom_id != line.uom_id:
+            child_qty = self.uom.compute_quantity(child_bom.product_qty, child_bom.uom_id, line.uom_id)
+            return line.product_qty / (child_qty or 1.0)
+        return line.product_qty / (child_bom.product_qty or 1.0)
+
+    def is_expanded(self, line):
+        """Whether a component is costed through its own BOM"""
+        return bool(line.child_bom_id) and line.product_id not in self.snapshot.precalculated
+
+    def signature(self, key):
+        """
+        Effective content of a node: its BOM and the variant-restricted lines and
+        operations left out for the product. Everything below a node only
+        depends on its lines, so variants of a template with the same signature
+        have the same costs.
+        """
+        signature = self._signatures.get(key)
+        if signature is None:
+            bom_id, product_id = key
+            snapshot = self.snapshot
+            bom = snapshot.boms[bom_id]
+            signature = (
+                bom_id,
+                frozenset(
+                    line_id for line_id in bom.line_ids
+                    if ('mrp.bom.line', line_id, product_id) in snapshot.skipped
+                ),
+                frozenset(
+                    operation_id for operation_id in bom.operation_ids
+                    if ('mrp.routing.workcenter', operation_id, product_id) in snapshot.skipped
+                ) if snapshot.include_operations else frozenset(),
+            )
+            self._signatures[key] = signature
+        return signature
+
+    def node_costs(self, key):
+        """Return the NodeCosts of a node, computed once per signature"""
+        node = self._nodes.get(key)
+        if node is not None:
+            return node
+        signature = self.signature(key)
+        node = self._signature_nodes.get(signature)
+        if node is not None:
+            self._nodes[key] = node
+            return node
+
+        node = NodeCosts()
+        for operation in self.node_operations(key):
+            node.duration += operation.duration
+            node.operation += operation.duration * (operation.cost_per_hour / 60)
+            node.workcenters.add(operation.workcenter_id)
+
+        products = self.snapshot.products
+        for line in self.node_lines(key):
+            line_qty = self.line_quantity(line)
+            node.products.add(line.product_id)
+            if not line.child_bom_id:
+                node.material += products[line.product_id].standard_price * line_qty
+                node.raws.append((line.product_id, line_qty))
+            elif line.product_id in self.snapshot.precalculated:
+                node.material += self.precalculated_cost(line, line_qty)
+                node.raws.append((line.product_id, line_qty))
+            else:
+                node.children.append(((line.child_bom_id, line.product_id), line))
+
+        self._nodes[key] = self._signature_nodes[signature] = node
+        return node
+
+    # ------------------------------------------------------------------
+    # Graph level
+    # ------------------------------------------------------------------
+
+    def walk(self, roots):
+        """
+        Walk the graph of the (bom_id, product_id) roots once, children first.
+
+        Returns (order, edges): order lists the expanded node keys children
+        first, edges maps each of them to [(child key, line)] where child key is
+        False when the child BOM is already on the path (the cycle guard of the
+        recursive calculation, such a child contributes nothing). Cached nodes
+        are not expanded. The result is memoized for the given roots.
+        """
+        roots = tuple(roots)
+        if roots in self._walks:
+            return self._walks[roots]
+
+        cached = self.snapshot.cached
+        order = []
+        edges = {}
+        for root_key in roots:
+            if root_key in edges or root_key in cached:
+                continue
+            stack = [(root_key, False)]
+            path = []
+            while stack:
+                key, expanded = stack.pop()
+                if expanded:
+                    path.pop()
+                    order.append(key)
+                    continue
+                if key in edges:
+                    # Already expanded through another parent
+                    continue
+
+                path.append(key[0])
+                stack.append((key, True))
+                node_edges = []
+                for child_key, line in self.node_costs(key).children:
+                    if child_key[0] in path:
+                        node_edges.append((False, line))
+                        continue
+                    node_edges.append((child_key, line))
+                    if child_key not in edges and child_key not in cached:
+                        stack.append((child_key, False))
+                edges[key] = node_edges
+
+        self._walks[roots] = order, edges
+        return order, edges
+
+    def rollup(self, roots):
+        """
+        Bottom-up totals of the roots and of every sub-assembly below them.
+
+        Returns (totals, dependencies, uncacheable, order):
+        - totals: {key: (material_total, operation_total, total_duration)} for one BOM batch
+        - dependencies: {key: (product ids, bom ids, workcenter ids)} the totals derive from
+        - uncacheable: keys whose totals depend on a cut cycle, hence on the path
+        - order: the keys computed by this call, children first
+
+        Nodes with the same signature and the same edges, typically variants of
+        one template, are computed once.
+        """
+        order, edges = self.walk(roots)
+        totals = {key: entry[0] for key, entry in self.snapshot.cached.items()}
+        dependencies = {key: entry[1] for key, entry in self.snapshot.cached.items()}
+        uncacheable = set()
+        computed = {}
+
+        for key in order:
+            shared_key = (self.signature(key), tuple(child_key for child_key, line in edges[key]))
+            source = computed.get(shared_key)
+            if source is not None:
+                totals[key] = totals[source]
+                dependencies[key] = dependencies[source]
+                if source in uncacheable:
+                    uncacheable.add(key)
+                continue
+            computed[shared_key] = key
+
+            node = self.node_costs(key)
+            material_total, operation_total, total_duration = node.material, node.operation, node.duration
+            dependency_products = set(node.products)
+            dependency_boms = {key[0]}
+            dependency_workcenters = set(node.workcenters)
+
+            for child_key, line in edges[key]:
+                if not child_key:
+                    uncacheable.add(key)
+                    continue
+                if child_key in uncacheable:
+                    uncacheable.add(key)
+                child_products, child_boms, child_workcenters = dependencies[child_key]
+                dependency_products |= child_products
+                dependency_boms |= child_boms
+                dependency_workcenters |= child_workcenters
+
+                child_material, child_operation, child_duration = totals[child_key]
+                ratio = self.child_ratio(line)
+                material_total += child_material * ratio
+                operation_total += child_operation * ratio
+                total_duration += child_duration * ratio
+
+            totals[key] = (material_total, operation_total, total_duration)
+            dependencies[key] = (dependency_products, dependency_boms, dependency_workcenters)
+
+        return totals, dependencies, uncacheable, order
+
+    # ------------------------------------------------------------------
+    # Detailed views
+    # ------------------------------------------------------------------
+
+    def breakdown(self, key, level=0, processed_boms=None):
+        """
+        Cost breakdown of a node as a tree, like _calculate_bom_cost with create_lines.
+        Returns ((material_total, operation_total, total_duration), rows) where rows
+        are dicts with the values of the breakdown lines, children before their parent line.
+        Breakdowns of top-level nodes are memoized by signature.
+        """
+        if processed_boms is None:
+            memo_key = (self.signature(key), level)
+            if memo_key not in self._breakdowns:
+                self._breakdowns[memo_key] = self.breakdown(key, level, ())
+            totals, rows = self._breakdowns[memo_key]
+            return totals, [dict(row) for row in rows]
+
+        bom_id, product_id = key
+        processed_boms = set(processed_boms or ())
+        if bom_id in processed_boms:
+            return (0, 0, 0), []
+        processed_boms.add(bom_id)
+
+        snapshot = self.snapshot
+        bom = snapshot.boms[bom_id]
+        material_total = operation_total = total_duration = 0
+        rows = []
+
+        for operation in self.node_operations(key):
+            operation_cost = operation.duration * operation.cost_per_hour / 60
+            total_duration += operation.duration
+            operation_total += operation_cost
+            rows.append({
+                'name': f"{bom.name} - {operation.workcenter_name} ({operation.name or 'Operation'})",
+                'cost_type': 'operation',
+                'operation_id': operation.id,
+                'duration': operation.duration,
+                'unit_cost': operation.cost_per_hour,
+                'cost': operation_cost,
+                'bom_level': level,
+                'bom_qty': bom.product_qty,
+            })
+
+        for line in self.node_lines(key):
+            product = snapshot.products[line.product_id]
+            line_qty = self.line_quantity(line)
+            row = {
+                'cost_type': 'material',
+                'product_id': product.id,
+                'quantity': line_qty,
+                'bom_level': level,
+                'bom_qty': bom.product_qty,
+            }
+
+            if not line.child_bom_id:
+                component_cost = product.standard_price * line_qty
+                material_total += component_cost
+                row.update(name=f"{product.name} (Raw Material)", unit_cost=product.standard_price,
+                           cost=component_cost)
+            elif line.product_id in snapshot.precalculated:
+                component_cost = self.precalculated_cost(line, line_qty)
+                material_total += component_cost
+                row.update(name=f"{product.name} (Component with Pre-calculated Cost)",
+                           unit_cost=snapshot.precalculated[line.product_id][0], cost=component_cost)
+            else:
+                child_bom = snapshot.boms[line.child_bom_id]
+                (child_material, child_operation, child_duration), child_rows = self.breakdown(
+                    (child_bom.id, line.product_id), level + 1, processed_boms)
+                rows.extend(child_rows)
+
+                ratio = self.child_ratio(line)
+                material_total += child_material * ratio
+                operation_total += child_operation * ratio
+                total_duration += child_duration * ratio
+
+                unit_cost = child_material / (child_bom.product_qty or 1.0)
+                if child_bom.uom_id != line.uom_id:
+                    unit_cost = self.uom.compute_price(unit_cost, child_bom.uom_id, line.uom_id)
+                row.update(name=f"{product.name} (Component from BOM)", unit_cost=unit_cost,
+                           cost=child_material * ratio)
+            rows.append(row)
+
+        return (material_total, operation_total, total_duration), rows
+
+    def explode(self, key):
+        """
+        Raw material explosion of a node for one BOM batch, over all its levels.
+        Returns {product_id: {'quantity', 'bom_levels', 'is_raw_material'}}, the
+        quantities being in the product UoM and bom_levels the 1-based BOM depths
+        the product is used at. Components with a pre-calculated cost are
+        treated as raw materials.
+
+        Each sub-assembly is exploded once, children first, and its result is
+        reused for all its parents. A component whose BOM is already on the
+        path closes a cycle and is left out, as in the costing.
+        """
+        explosions = self._explosions
+        cut_lines = {}
+        path = []
+        stack = [(key, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                path.pop()
+                explosions[node] = self._merge_explosion(node, cut_lines.pop(node))
+                continue
+            if node in explosions or node in cut_lines:
+                continue
+
+            path.append(node[0])
+            stack.append((node, True))
+            cut = cut_lines[node] = set()
+            for line in self.node_lines(node):
+                if not self.is_expanded(line):
+                    continue
+                if line.child_bom_id in path:
+                    _logger.warning("BOM cycle: BOM %s is a component of itself through BOM %s, line %s",
+                                    line.child_bom_id, node[0], line.id)
+                    cut.add(line.id)
+                    continue
+                child_key = (line.child_bom_id, line.product_id)
+                if child_key not in explosions:
+                    stack.append((child_key, False))
+
+        return {
+            product_id: {'quantity': qty, 'bom_levels': sorted(levels), 'is_raw_material': True}
+            for product_id, (qty, levels) in explosions[key].items()
+        }
+
+    def _merge_explosion(self, key, cut_lines):
+        """
+        Explosion of a node from the explosions of its children, as
+        {product_id: [quantity, set of BOM levels relative to the node]}
+        """
+        explosions = self._explosions
+        materials = {}
+        for line in self.node_lines(key):
+            if not self.is_expanded(line):
+                entry = materials.get(line.product_id)
+                if entry is None:
+                    entry = materials[line.product_id] = [0.0, set()]
+                entry[0] += self.line_quantity(line)
+                entry[1].add(1)
+                continue
+            if line.id in cut_lines:
+                continue
+            ratio = self.child_ratio(line)
+            for product_id, (qty, levels) in explosions[(line.child_bom_id, line.product_id)].items():
+                entry = materials.get(product_id)
+                if entry is None:
+                    entry = materials[product_id] = [0.0, set()]
+                entry[0] += qty * ratio
+                entry[1].update(level + 1 for level in levels)
+        return materials
+
+    def raw_material_requirements(self, roots):
+        """
+        Return {key: {product_id: quantity}} with the total raw material
+        quantities (in product UoM) needed for one batch of each walked node.
+        """
+        order, edges = self.walk(roots)
+        requirements = {}
+        for key in order:
+            required = defaultdict(float)
+            for product_id, qty in self.node_costs(key).raws:
+                required[product_id] += qty
+            for child_key, line in edges[key]:
+                if not child_key or child_key not in requirements:
+                    continue
+                ratio = self.child_ratio(line)
+                for product_id, qty in requirements[child_key].items():
+                    required[product_id] += qty * ratio
+            requirements[key] = dict(required)
+        return requirements
@@ -0,0 +1,248 @@
+from odoo import models, fields, api, _
+from odoo.service.model import PG_CONCURRENCY_ERRORS_TO_RETRY
+from psycopg2 import OperationalError
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Attempts of a publication deferred after the commit of a calculation
+PUBLISH_ATTEMPTS = 3
+
+
+class BOMCostLatest(models.Model):
+    """
+    Latest calculated unit cost per product and company.
+
+    Maintained when a calculator finishes, from its product lines (multi-product
+    mode) or its own product (single-product mode), so consumers can resolve the
+    unit costs of many products with one indexed read instead of searching
+    calculators per product.
+
+    unit_cost is the full cost of the product line, other costs and margins
+    included, as used by the price levels. manufacturing_cost only holds the
+    material and operation costs per unit: it prices the product as a
+    pre-calculated component, so margins do not compound through the BOM
+    levels and a calculation does not depend on the additions of earlier runs.
+    """
+    _name = 'mrp.bom.cost.latest'
+    _description = 'Latest Calculated Unit Cost'
+    _order = 'date desc, id desc'
+
+    product_id = fields.Many2one('product.product', 'Product', required=True, index=True, ondelete='cascade')
+    company_id = fields.Many2one('res.company', 'Company', required=True, index=True, ondelete='cascade')
+    unit_cost = fields.Float('Cost Per Unit', digits='Product Price')
+    manufacturing_cost = fields.Float('Manufacturing Cost Per Unit', digits='Product Price',
+                                      help="Material and operation cost per unit, without other costs")
+    bom_id = fields.Many2one('mrp.bom', 'Bill of Materials', ondelete='set null',
+                             help="BOM the unit cost refers to, its unit of measure applies to the cost")
+    calculator_id = fields.Many2one('mrp.bom.cost.calculator', 'Calculator', required=True,
+                                    index=True, ondelete='cascade')
+    date = fields.Datetime('Calculation Date')
+
+    _sql_constraints = [
+        ('product_company_uniq', 'unique (product_id, company_id)',
+         'Only one latest unit cost can be stored per product and company!'),
+    ]
+
+    @api.model
+    def _get_unit_costs(self, product_ids, manufacturing=False):
+        """
+        Return {product_id: (unit_cost, bom)} for the products with a calculated
+        cost in the current company, in one read. With manufacturing, the
+        manufacturing cost of the products calculated from their BOM is
+        returned instead, to price them as components.
+        """
+        if not product_ids:
+            return {}
+
+        domain = [
+            ('product_id', 'in', list(product_ids)),
+            ('company_id', '=', self.env.company.id),
+        ]
+        if manufacturing:
+            domain.append(('bom_id', '!=', False))
+        entries = self.sudo().search(domain)
+        return {
+            entry.product_id.id: (
+                entry.manufacturing_cost if manufacturing else entry.unit_cost,
+                entry.bom_id.sudo(False),
+            )
+            for entry in entries
+        }
+
+    @api.model
+    def _get_calculator_values(self, calculator):
+        """Return {product_id: values} for the unit costs produced by a calculator"""
+        values = {}
+        if calculator.state != 'calculated':
+            return values
+
+        if calculator.product_id and calculator.bom_id:
+            bom_qty = calculator.bom_id.product_qty if calculator.bom_id.product_qty > 0 else 1.0
+            values[calculator.product_id.id] = {
+                'unit_cost': calculator.unit_cost,
+                'manufacturing_cost': (calculator.total_material_cost + calculator.total_operation_cost) / bom_qty,
+                'bom_id': calculator.bom_id.id,
+            }
+
+        for line in calculator.product_line_ids.filtered(lambda l: l.state == 'calculated'):
+            manufacturing_cost = 0.0
+            if line.is_manufacture and line.bom_id:
+                bom_qty = line.bom_id.product_qty if line.bom_id.product_qty > 0 else 1.0
+                manufacturing_cost = (line.material_cost + line.operation_cost) / bom_qty
+            values[line.product_id.id] = {
+                'unit_cost': line.unit_cost,
+                'manufacturing_cost': manufacturing_cost,
+                'bom_id': line.bom_id.id if line.is_manufacture else False,
+            }
+        return values
+
+    @api.model
+    def _update_from_calculators(self, calculators, products=None):
+        """
+        Record the unit costs of finished calculators as the latest ones,
+        optionally restricted to some products.
+        Returns the products whose latest unit cost changed.
+        """
+        changed = self.env['product.product']
+        company = self.env.company
+        for calculator in calculators:
+            values = self._get_calculator_values(calculator)
+            if products is not None:
+                values = {k: v for k, v in values.items() if k in set(products.ids)}
+            if not values:
+                continue
+
+            existing = {
+                entry.product_id.id: entry
+                for entry in self.sudo().search([
+                    ('product_id', 'in', list(values)),
+                    ('company_id', '=', company.id),
+                ])
+            }
+            rows = []
+            calculator_changed = self.env['product.product']
+            for product_id, vals in values.items():
+                entry = existing.get(product_id)
+                if (not entry or entry.unit_cost != vals['unit_cost'] or entry.bom_id.id != vals['bom_id']
+                        or entry.manufacturing_cost != vals['manufacturing_cost']):
+                    calculator_changed |= changed.browse(product_id)
+                rows.append(dict(
+                    vals,
+                    product_id=product_id,
+                    company_id=company.id,
+                    calculator_id=calculator.id,
+                    date=calculator.calculation_date or calculator.date,
+                ))
+            if self._publish_entries(rows):
+                changed |= calculator_changed
+
+        if changed:
+            self._notify_unit_cost_changed(changed)
+        return changed
+
+    @api.model
+    def _publish_entries(self, rows):
+        """
+        Insert or update latest unit costs, rows being dicts of entry values.
+
+        Calculations of overlapping catalogues publish the same products: an
+        entry only takes the values of a calculation dated at or after its own,
+        so the most recent calculation wins whatever the commit order. When a
+        concurrent calculation published some of the products since this
+        transaction started, the rows are published again after the commit,
+        in a short transaction of their own that also notifies the changes,
+        instead of failing the calculation.
+
+        Returns whether the rows were published in the current transaction.
+        """
+        try:
+            with self.env.cr.savepoint():
+                self._upsert_entries(rows)
+        except OperationalError as e:
+            if e.pgcode not in PG_CONCURRENCY_ERRORS_TO_RETRY:
+                raise
+            _logger.info("Latest unit costs published concurrently, publishing %s entries after commit", len(rows))
+            registry, uid, context = self.env.registry, self.env.uid, self.env.context
+
+            @self.env.cr.postcommit.add
+            def publish_after_commit():
+                for attempt in range(1, PUBLISH_ATTEMPTS + 1):
+                    try:
+                        with registry.cursor() as cr:
+                            env = api.Environment(cr, uid, context)
+                            env['mrp.bom.cost.latest']._upsert_entries(rows)
+                            env['mrp.bom.cost.latest']._notify_unit_cost_changed(
+                                env['product.product'].browse({row['product_id'] for row in rows}))
+                        return
+                    except OperationalError as e:
+                        if e.pgcode not in PG_CONCURRENCY_ERRORS_TO_RETRY or attempt == PUBLISH_ATTEMPTS:
+                            _logger.warning("Could not publish %s latest unit costs: %s", len(rows), e)
+                            return
+            return False
+        self.invalidate_model()
+        return True
+
+    @api.model
+    def _upsert_entries(self, rows):
+        """Insert or update entries with one statement, keeping the most recent calculation"""
+        if not rows:
+            return
+        self.flush_model()
+        fnames = ['product_id', 'company_id', 'unit_cost', 'manufacturing_cost', 'bom_id', 'calculator_id', 'date']
+        params = []
+        for row in rows:
+            # False many2one and dates are NULL
+            params.extend(row[fname] if row[fname] is not False else None for fname in fnames)
+            params.extend([self.env.uid, self.env.uid])
+        row_template = "({}, %s, now() at time zone 'UTC', %s, now() at time zone 'UTC')".format(
+            ', '.join(['%s'] * len(fnames)))
+        self.env.cr.execute("""
+            INSERT INTO {table} AS latest
+                   ({columns}, create_uid, create_date, write_uid, write_date)
+            VALUES {rows}
+            ON CONFLICT (product_id, company_id) DO UPDATE
+               SET {assignments}, write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date
+             WHERE latest.date IS NULL OR latest.date <= EXCLUDED.date
+        """.format(
+            table=self._table,
+            columns=', '.join(fnames),
+            rows=', '.join([row_template] * len(rows)),
+            assignments=', '.join('{0} = EXCLUDED.{0}'.format(fname) for fname in fnames[2:]),
+        ), params)
+
+    @api.model
+    def _refresh_products(self, products):
+        """
+        Rebuild the latest unit cost of the given products from the remaining
+        calculated calculators, e.g. after the calculator they came from was deleted.
+        """
+        if not products:
+            return
+
+        calculators = self.env['mrp.bom.cost.calculator'].search([
+            ('state', '=', 'calculated'),
+            '|',
+            ('product_id', 'in', products.ids),
+            ('product_line_ids.product_id', 'in', products.ids),
+        ], order='calculation_date asc, date asc, id asc')
+
+        self.sudo().search([
+            ('product_id', 'in', products.ids),
+            ('company_id', '=', self.env.company.id),
+        ]).unlink()
+        # Oldest first, so the most recent calculator wins
+        for calculator in calculators:
+            self._update_from_calculators(calculator, products=products)
+
+    @api.model
+    def _notify_unit_cost_changed(self, products):
+        """Hook called with the products whose latest unit cost changed"""
+        self.env['mrp.bom.cost.cache']._invalidate(products=products)
+
+        # Price levels on the product template are computed from the latest unit cost
+        Template = self.env['product.template']
+        if 'level1price' in Template._fields:
+            templates = products.product_tmpl_id
+            for fname in ('level1price', 'level2price', 'level3price', 'level4price'):
+                self.env.add_to_compute(Template._fields[fname], templates)
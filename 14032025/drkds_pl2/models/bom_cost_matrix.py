@@ -0,0 +1,223 @@
+from odoo import _
+from .bom_cost_kernel import CostKernel
+from collections import defaultdict, deque
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# NumPy/SciPy are optional (see the module description): without them the
+# matrix is solved by a DAG sweep
+try:
+    import numpy as np
+    from scipy import sparse
+    from scipy.sparse.linalg import spsolve
+except ImportError:
+    np = sparse = spsolve = None
+
+
+class BomCycleError(ValueError):
+    """Raised when the BOM graph cannot be ordered because it contains a cycle"""
+
+
+class BomCostMatrix:
+    """
+    Whole-catalogue cost solver over a sparse quantity matrix.
+
+    Every (bom, product variant) node of the graph gets a row. A[parent, child]
+    is the quantity ratio applied to the child BOM totals (UoM conversions
+    already applied), and D holds the costs a node adds by itself: raw materials
+    at standard_price, pre-calculated components and operations. The rolled-up
+    totals T then satisfy T = D + A.T, i.e. (I - A).T = D, which is solved with
+    one sparse solve, or one children-first sweep when SciPy is not installed.
+
+    The inputs come from a BomSnapshot and the node costs from the CostKernel,
+    so the formulas are those of the other calculation modes.
+    """
+
+    def __init__(self, keys, direct, edges, raw_lines):
+        self.keys = keys
+        self.index = {key: i for i, key in enumerate(keys)}
+        # direct[i] = [material, operation, duration] added by node i itself
+        self.direct = direct
+        # edges[i] = [(child index, quantity ratio)]
+        self.edges = edges
+        # raw_lines[i] = [(raw material product id, quantity in product UoM)]
+        self.raw_lines = raw_lines
+        self._order = None
+        # Solver used last, 'sparse' or 'sweep'
+        self.solver = None
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def load(cls, env, roots, include_operations, bom_index=None, rate_table=None, uom_table=None):
+        """Build the matrix for the (bom, product) roots of a calculation"""
+        snapshot = env['mrp.bom']._get_bom_cost_snapshot(
+            roots, include_operations=include_operations, bom_index=bom_index, rate_table=rate_table,
+            uom_table=uom_table)
+        return cls.from_snapshot(snapshot, [(bom.id, product.id) for bom, product in roots])
+
+    @classmethod
+    def from_snapshot(cls, snapshot, root_keys):
+        """Build the matrix of the (bom_id, product_id) roots of a BomSnapshot"""
+        kernel = CostKernel(snapshot)
+        keys = list(dict.fromkeys(root_keys))
+        index = {key: i for i, key in enumerate(keys)}
+        direct, edges, raw_lines = [], [], []
+
+        # keys grows while it is walked, breadth first
+        for key in keys:
+            node = kernel.node_costs(key)
+            children = []
+            for child_key, line in node.children:
+                if child_key not in index:
+                    index[child_key] = len(keys)
+                    keys.append(child_key)
+                children.append((index[child_key], kernel.child_ratio(line)))
+            direct.append([node.material, node.operation, node.duration])
+            edges.append(children)
+            raw_lines.append(node.raws)
+
+        _logger.info("BOM cost matrix loaded: %s nodes", len(keys))
+        return cls(keys, direct, edges, raw_lines)
+
+    # ------------------------------------------------------------------
+    # Solving
+    # ------------------------------------------------------------------
+
+    def topological_order(self):
+        """Node indexes children first, raises BomCycleError on cycles"""
+        if self._order is not None:
+            return self._order
+
+        size = len(self.keys)
+        pending_children = [len(children) for children in self.edges]
+        parents = defaultdict(list)
+        for parent, children in enumerate(self.edges):
+            for child, ratio in children:
+                parents[child].append(parent)
+
+        queue = deque(i for i in range(size) if not pending_children[i])
+        order = []
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for parent in parents[node]:
+                pending_children[parent] -= 1
+                if not pending_children[parent]:
+                    queue.append(parent)
+
+        if len(order) != size:
+            raise BomCycleError(_("The BOM graph contains a cycle."))
+        self._order = order
+        return order
+
+    def _select_solver(self, problem):
+        """Choose and log the solver of a problem: 'sparse' with SciPy, 'sweep' otherwise"""
+        self.solver = 'sparse' if sparse is not None and self.keys else 'sweep'
+        if self.solver == 'sparse':
+            _logger.info("BOM cost matrix %s: %s nodes, SciPy sparse solve", problem, len(self.keys))
+        elif sparse is None:
+            _logger.info("BOM cost matrix %s: %s nodes, children-first sweep (NumPy/SciPy are not installed)",
+                         problem, len(self.keys))
+        else:
+            _logger.info("BOM cost matrix %s: %s nodes, children-first sweep", problem, len(self.keys))
+        return self.solver
+
+    def solve(self):
+        """Return {(bom_id, product_id): (material_total, operation_total, total_duration)}"""
+        self.topological_order()
+        if self._select_solver('costs') == 'sparse':
+            totals = self._solve_sparse()
+        else:
+            totals = self._solve_sweep()
+        return {key: tuple(totals[i]) for i, key in enumerate(self.keys)}
+
+    def _solve_sweep(self):
+        totals = [None] * len(self.keys)
+        for node in self.topological_order():
+            material, operation, duration = self.direct[node]
+            for child, ratio in self.edges[node]:
+                child_material, child_operation, child_duration = totals[child]
+                material += child_material * ratio
+                operation += child_operation * ratio
+                duration += child_duration * ratio
+            totals[node] = (material, operation, duration)
+        return totals
+
+    def _quantity_matrix(self):
+        """Sparse I - A"""
+        size = len(self.keys)
+        rows, cols, data = [], [], []
+        for parent, children in enumerate(self.edges):
+            for child, ratio in children:
+                rows.append(parent)
+                cols.append(child)
+                data.append(ratio)
+        a = sparse.csr_matrix((data, (rows, cols)), shape=(size, size))
+        return (sparse.identity(size, format='csr') - a).tocsc()
+
+    def _solve_sparse(self):
+        result = spsolve(self._quantity_matrix(), np.array(self.direct, dtype=float))
+        return result.reshape(len(self.keys), 3).tolist()
+
+    def requirement_coefficients(self, keys):
+        """
+        Return {key: {raw_product_id: quantity}} with the flattened raw
+        material quantities (in product UoM) of one BOM batch of some nodes.
+
+        All raw materials are solved at once: with Q[node, raw] the quantities a
+        node uses directly, the flattened quantities R satisfy (I - A).R = Q,
+        one sparse solve with one column per raw material. Without SciPy the
+        requirements are swept children first.
+        """
+        self.topological_order()
+        if self._select_solver('requirements') == 'sweep':
+            requirements = self.raw_material_requirements()
+            return {key: requirements[key] for key in keys}
+
+        raw_ids = sorted({product_id for raws in self.raw_lines for product_id, qty in raws})
+        if not raw_ids or not self.keys:
+            return {key: {} for key in keys}
+        columns = {product_id: j for j, product_id in enumerate(raw_ids)}
+        rows, cols, data = [], [], []
+        for node, raws in enumerate(self.raw_lines):
+            for product_id, qty in raws:
+                rows.append(node)
+                cols.append(columns[product_id])
+                data.append(qty)
+        size = len(self.keys)
+        direct = sparse.csc_matrix((data, (rows, cols)), shape=(size, len(raw_ids)))
+        result = spsolve(self._quantity_matrix(), direct)
+        if sparse.issparse(result):
+            result = result.tocsr()
+        else:
+            # A single raw material is solved as a vector
+            result = sparse.csr_matrix(np.asarray(result).reshape(size, len(raw_ids)))
+
+        coefficients = {}
+        for key in keys:
+            row = result.getrow(self.index[key])
+            coefficients[key] = {
+                raw_ids[j]: float(qty) for j, qty in zip(row.indices, row.data) if qty
+            }
+        return coefficients
+
+    def raw_material_requirements(self):
+        """
+        Return {(bom_id, product_id): {raw_product_id: quantity}} with the total
+        raw material quantities (in product UoM) needed for one BOM batch.
+        """
+        order = self.topological_order()
+        requirements = [None] * len(self.keys)
+        for node in order:
+            required = defaultdict(float)
+            for product_id, qty in self.raw_lines[node]:
+                required[product_id] += qty
+            for child, ratio in self.edges[node]:
+                for product_id, qty in requirements[child].items():
+                    required[product_id] += qty * ratio
+            requirements[node] = required
+        return {key: dict(requirements[i]) for i, key in enumerate(self.keys)}
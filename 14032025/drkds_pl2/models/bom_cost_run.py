@@ -0,0 +1,136 @@
+from odoo import models, fields, api
+from contextlib import contextmanager
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
+
+PHASES = [
+    ('validation', 'Validation'),
+    ('resolution', 'BOM Resolution'),
+    ('traversal', 'Traversal'),
+    ('line_writes', 'Line Writes'),
+    ('aggregation', 'Total Aggregation'),
+]
+
+
+class CalculationRecorder:
+    """
+    Time and SQL query count of the phases of one calculation run.
+
+    Phases may be entered several times (e.g. once per chunk of a background
+    job), their measures add up. Nothing is written until save() is called.
+    """
+
+    def __init__(self, env, calculator, run_type):
+        self.env = env
+        self.calculator = calculator
+        self.run_type = run_type
+        self.phases = {}
+        self.line_count = 0
+        self.bom_ids = set()
+        self.node_count = 0
+        self.cache_hit_count = 0
+        self.precalculated_count = 0
+        self._start = time.perf_counter()
+        self._start_queries = env.cr.sql_log_count
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        start_queries = self.env.cr.sql_log_count
+        try:
+            yield
+        finally:
+            duration, query_count = self.phases.get(name, (0.0, 0))
+            self.phases[name] = (
+                duration + time.perf_counter() - start,
+                query_count + self.env.cr.sql_log_count - start_queries,
+            )
+
+    def add_kernel(self, kernel, root_keys):
+        """Count the BOMs, computed nodes and cache hits of a CostKernel walk"""
+        order, edges = kernel.walk(root_keys)
+        self.bom_ids.update(bom_id for bom_id, product_id in order)
+        self.node_count += len(order)
+        self.cache_hit_count += len(kernel.snapshot.cached)
+        self.precalculated_count += len(kernel.snapshot.precalculated)
+
+    def save(self):
+        """Store the run, returns the mrp.bom.cost.run record"""
+        nodes = self.node_count + self.cache_hit_count
+        run = self.env['mrp.bom.cost.run'].sudo().create({
+            'calculator_id': self.calculator.id,
+            'run_type': self.run_type,
+            'calculation_mode': self.calculator.calculation_mode,
+            'line_count': self.line_count,
+            'bom_count': len(self.bom_ids),
+            'node_count': self.node_count,
+            'cache_hit_count': self.cache_hit_count,
+            'cache_hit_rate': 100.0 * self.cache_hit_count / nodes if nodes else 0.0,
+            'precalculated_count': self.precalculated_count,
+            'duration': time.perf_counter() - self._start,
+            'query_count': self.env.cr.sql_log_count - self._start_queries,
+            'phase_ids': [(0, 0, {
+                'phase': phase,
+                'sequence': sequence,
+                'duration': self.phases[phase][0],
+                'query_count': self.phases[phase][1],
+            }) for sequence, (phase, label) in enumerate(PHASES) if phase in self.phases],
+        })
+        _logger.info("Calculation run of %s: %.3fs, %s queries, %s lines, %s BOMs",
+                     self.calculator.name, run.duration, run.query_count, run.line_count, run.bom_count)
+        return run
+
+
+class BOMCostRun(models.Model):
+    """Performance measures of one calculation of a BOM cost calculator"""
+    _name = 'mrp.bom.cost.run'
+    _description = 'BOM Cost Calculation Run'
+    _order = 'date desc, id desc'
+
+    calculator_id = fields.Many2one('mrp.bom.cost.calculator', 'Calculator', required=True,
+                                    index=True, ondelete='cascade')
+    date = fields.Datetime('Date', default=fields.Datetime.now, required=True)
+    user_id = fields.Many2one('res.users', 'User', default=lambda self: self.env.user)
+    company_id = fields.Many2one('res.company', 'Company', default=lambda self: self.env.company)
+    run_type = fields.Selection([
+        ('full', 'Full Calculation'),
+        ('incremental', 'Incremental Recalculation'),
+        ('background', 'Background Chunk'),
+    ], string='Run Type', required=True)
+    calculation_mode = fields.Selection(
+        selection=lambda self: self.env['mrp.bom.cost.calculator']._fields['calculation_mode'].selection,
+        string='Calculation Mode')
+    line_count = fields.Integer('Product Lines')
+    bom_count = fields.Integer('BOMs Visited')
+    node_count = fields.Integer('BOM Nodes Computed',
+        help="(BOM, variant) combinations rolled up by the run, each shared sub-assembly counting once.")
+    cache_hit_count = fields.Integer('Cache Hits',
+        help="Sub-assemblies whose totals were read from the BOM cost cache instead of being computed.")
+    cache_hit_rate = fields.Float('Cache Hit Rate (%)', group_operator='avg', digits=(16, 1))
+    precalculated_count = fields.Integer('Pre-calculated Components',
+        help="Components priced from their latest calculated unit cost instead of their BOM.")
+    duration = fields.Float('Duration (s)', digits=(16, 3))
+    query_count = fields.Integer('SQL Queries')
+    phase_ids = fields.One2many('mrp.bom.cost.run.phase', 'run_id', 'Phases')
+
+    @api.model
+    def _get_recorder(self, calculator, run_type):
+        """Return a new CalculationRecorder for a run of a calculator"""
+        return CalculationRecorder(self.env, calculator, run_type)
+
+
+class BOMCostRunPhase(models.Model):
+    _name = 'mrp.bom.cost.run.phase'
+    _description = 'BOM Cost Calculation Phase'
+    _order = 'run_id desc, sequence'
+
+    run_id = fields.Many2one('mrp.bom.cost.run', 'Run', required=True, index=True, ondelete='cascade')
+    calculator_id = fields.Many2one(related='run_id.calculator_id', store=True, index=True)
+    date = fields.Datetime(related='run_id.date', store=True)
+    run_type = fields.Selection(related='run_id.run_type', store=True)
+    sequence = fields.Integer('Sequence')
+    phase = fields.Selection(PHASES, string='Phase', required=True)
+    duration = fields.Float('Duration (s)', digits=(16, 3))
+    query_count = fields.Integer('SQL Queries')
@@ -0,0 +1,137 @@
+from odoo import api
+import odoo
+import multiprocessing
+import logging
+import os
+import psutil
+import signal
+import threading
+
+_logger = logging.getLogger(__name__)
+
+# Connection pool inherited from the parent process. It must stay referenced in
+# the workers: closing its connections would end the sessions of the parent.
+_inherited_pool = None
+
+
+def get_worker_count(env, requested=0):
+    """
+    Number of worker processes for a sharded calculation, 0 meaning all cores.
+
+    Each worker may grow up to limit_memory_soft like a server worker, so no
+    more workers are forked than the available memory holds.
+    """
+    count = requested or int(env['ir.config_parameter'].sudo().get_param(
+        'drkds_pl2.calculation_workers', 0) or 0)
+    count = max(count or os.cpu_count() or 1, 1)
+    memory_limit = odoo.tools.config['limit_memory_soft']
+    if memory_limit and memory_limit > 0:
+        memory_count = max(psutil.virtual_memory().available // memory_limit, 1)
+        if memory_count < count:
+            _logger.info("Limiting the calculation workers from %s to %s, the available memory "
+                         "holds %s workers at limit_memory_soft", count, memory_count, memory_count)
+            count = memory_count
+    return count
+
+
+def can_fork(env):
+    """
+    Whether the current process may fork calculation workers: a worker of the
+    multi-process server (--workers), running in its main thread. The threaded
+    and evented servers fork nothing, other threads or greenlets of theirs use
+    the connection pool the workers replace. Test cursors are not shared with
+    other processes either.
+    """
+    return (
+        not odoo.evented
+        and odoo.tools.config['workers'] > 0
+        and threading.current_thread() is threading.main_thread()
+        and not env.registry.in_test_mode()
+    )
+
+
+def split_shards(roots, shard_count):
+    """Split a list in shard_count chunks of (almost) equal size"""
+    shard_count = max(min(shard_count, len(roots)), 1)
+    size, extra = divmod(len(roots), shard_count)
+    shards, start = [], 0
+    for i in range(shard_count):
+        end = start + size + (1 if i < extra else 0)
+        shards.append(roots[start:end])
+        start = end
+    return shards
+
+
+def _init_worker():
+    """Give the forked worker its own connection pool and default signal handling"""
+    global _inherited_pool
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    _inherited_pool = odoo.sql_db._Pool
+    odoo.sql_db._Pool = None
+
+
+def _compute_shard(dbname, uid, context, calculator_id, root_ids):
+    """
+    Roll up the costs of one shard of (bom_id, product_id) roots in a worker
+    process, with a cursor of its own. Only plain values are returned.
+
+    The worker reads the cache but stores nothing: it only sees committed
+    data, entries computed from it could be outdated by the parent transaction.
+    """
+    with odoo.sql_db.db_connect(dbname).cursor() as cr:
+        env = api.Environment(cr, uid, context)
+        calculator = env['mrp.bom.cost.calculator'].browse(calculator_id)
+        roots = [
+            (env['mrp.bom'].browse(bom_id), env['product.product'].browse(product_id))
+            for bom_id, product_id in root_ids
+        ]
+        totals = calculator._rollup_bom_costs(roots, store_cache=False)
+        cr.rollback()
+    return totals
+
+
+class ShardPool:
+    """
+    Worker processes of a sharded background job, forked once and reused by
+    all its chunks. Used as a context manager, the workers are stopped when
+    the job ends or fails.
+
+    Workers only read committed data, which is all the rollup needs: the BOMs,
+    products and workcenters, never the calculator lines being written. Each
+    shard opens a new cursor, so the workers see the chunks committed since
+    they were forked. Only background jobs shard, from a process where
+    can_fork() holds.
+    """
+
+    def __init__(self, worker_count):
+        self.worker_count = worker_count
+        self._pool = multiprocessing.get_context('fork').Pool(worker_count, initializer=_init_worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self._pool.close()
+        else:
+            self._pool.terminate()
+        self._pool.join()
+
+    def compute_totals(self, calculator, roots):
+        """
+        Roll up the (bom, product) roots of a calculator over the workers and
+        merge the results, as returned by _rollup_bom_costs.
+        """
+        root_ids = [(bom.id, product.id) for bom, product in roots]
+        shards = split_shards(root_ids, self.worker_count)
+        args = [
+            (calculator.env.cr.dbname, calculator.env.uid, dict(calculator.env.context), calculator.id, shard)
+            for shard in shards
+        ]
+        _logger.info("Calculating %s in %s shards", calculator.name, len(shards))
+
+        totals = {}
+        for shard_totals in self._pool.starmap(_compute_shard, args):
+            totals.update(shard_totals)
+        return totals
@@ -0,0 +1,207 @@
+from .bom_cost_kernel import BomData, BomLineData, BomSnapshot, OperationData, ProductData
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class BomSnapshotLoader:
+    """
+    Reads the BomSnapshot of a calculation level by level.
+
+    Each BOM level costs one read of the BOM headers, one search_read of their
+    lines, one read of their operations, one read of the new products and one
+    read of the pre-calculated and cached costs of its sub-assemblies. The ORM
+    is only used again to evaluate the variant filters of lines restricted to
+    some variants.
+
+    price_overrides, {product_id: price}, replaces the standard price of some
+    products in the snapshot only, for what-if calculations.
+    """
+
+    def __init__(self, env, include_operations, bom_index, rate_table, uom_table,
+                 use_precalculated=True, use_cache=False, load_names=False, price_overrides=None):
+        self.env = env
+        self.price_overrides = price_overrides or {}
+        self.include_operations = include_operations
+        self.bom_index = bom_index
+        self.rate_table = rate_table
+        self.use_precalculated = use_precalculated
+        self.use_cache = use_cache
+        self.load_names = load_names
+        self.snapshot = BomSnapshot(include_operations, uom_table)
+        self._product_records = {}
+        self._loaded_structures = set()
+        self._checked_precalculated = set()
+
+    def _read_bom_headers(self, bom_ids):
+        snapshot = self.snapshot
+        bom_ids = [bom_id for bom_id in bom_ids if bom_id not in snapshot.boms]
+        if not bom_ids:
+            return
+        for values in self.env['mrp.bom'].browse(bom_ids).read(
+                ['product_qty', 'product_uom_id', 'company_id', 'product_tmpl_id']):
+            snapshot.boms[values['id']] = BomData(
+                values['id'],
+                values['product_qty'],
+                values['product_uom_id'][0],
+                company_id=values['company_id'] and values['company_id'][0],
+                name=values['product_tmpl_id'][1],
+            )
+
+    def _read_bom_structures(self, bom_ids):
+        """Read the lines and operations of BOMs"""
+        snapshot = self.snapshot
+        bom_ids = [bom_id for bom_id in bom_ids if bom_id not in self._loaded_structures]
+        if not bom_ids:
+            return
+        self._loaded_structures.update(bom_ids)
+        self._read_bom_headers(bom_ids)
+
+        for values in self.env['mrp.bom.line'].search_read(
+                [('bom_id', 'in', bom_ids)],
+                ['bom_id', 'product_id', 'product_qty', 'product_uom_id',
+                 'bom_product_template_attribute_value_ids'],
+                order='sequence, id'):
+            snapshot.lines[values['id']] = BomLineData(
+                values['id'],
+                values['product_id'][0],
+                values['product_qty'],
+                values['product_uom_id'][0],
+                child_bom_id=None,
+                variant_restricted=bool(values['bom_product_template_attribute_value_ids']),
+            )
+            snapshot.boms[values['bom_id'][0]].line_ids.append(values['id'])
+
+        if self.include_operations:
+            Operation = self.env['mrp.routing.workcenter']
+            fields_list = ['bom_id', 'name', 'workcenter_id', 'time_cycle', 'time_cycle_manual',
+                           'bom_product_template_attribute_value_ids']
+            if 'duration_expected' in Operation._fields:
+                fields_list.append('duration_expected')
+            operations = Operation.search([('bom_id', 'in', bom_ids)], order='sequence, id')
+            self.rate_table.add_operations(operations)
+            for operation, values in zip(operations, operations.read(fields_list)):
+                snapshot.operations[values['id']] = OperationData(
+                    values['id'],
+                    values['workcenter_id'][0],
+                    (
+                        values['time_cycle'] or
+                        values['time_cycle_manual'] or
+                        values.get('duration_expected') or
+                        0.0
+                    ),
+                    self.rate_table.get(operation),
+                    name=values['name'],
+                    workcenter_name=values['workcenter_id'][1],
+                    variant_restricted=bool(values['bom_product_template_attribute_value_ids']),
+                )
+                snapshot.boms[values['bom_id'][0]].operation_ids.append(values['id'])
+
+    def _read_products(self, product_ids):
+        snapshot = self.snapshot
+        product_ids = [product_id for product_id in product_ids if product_id and product_id not in snapshot.products]
+        if not product_ids:
+            return
+        fields_list = ['uom_id', 'standard_price']
+        if self.load_names:
+            fields_list.append('display_name')
+        records = self.env['product.product'].browse(product_ids)
+        for record, values in zip(records, records.read(fields_list)):
+            self._product_records[record.id] = record
+            snapshot.products[record.id] = ProductData(
+                record.id, values['uom_id'][0], self.price_overrides.get(record.id, values['standard_price']),
+                name=values.get('display_name', ''))
+
+    def _resolve_child_boms(self, bom_ids):
+        """Resolve the effective BOM of the components, for the company of their parent BOM"""
+        snapshot = self.snapshot
+        for bom_id in bom_ids:
+            bom = snapshot.boms[bom_id]
+            for line in map(snapshot.lines.__getitem__, bom.line_ids):
+                if line.child_bom_id is None:
+                    child_bom = self.bom_index.get(self._product_records[line.product_id], bom.company_id)
+                    line.child_bom_id = child_bom.id
+
+    def _evaluate_variant_filters(self, keys):
+        """Evaluate the variant filters of the restricted lines and operations of some nodes"""
+        snapshot = self.snapshot
+        BomLine = self.env['mrp.bom.line']
+        Operation = self.env['mrp.routing.workcenter']
+        for bom_id, product_id in keys:
+            if not product_id:
+                # Nothing is filtered out without a product, like _skip_bom_line
+                continue
+            bom = snapshot.boms[bom_id]
+            product = self._product_records[product_id]
+            for line_id in bom.line_ids:
+                if snapshot.lines[line_id].variant_restricted and BomLine.browse(line_id)._skip_bom_line(product):
+                    snapshot.skipped.add(('mrp.bom.line', line_id, product_id))
+            for operation_id in bom.operation_ids:
+                if (snapshot.operations[operation_id].variant_restricted
+                        and Operation.browse(operation_id)._skip_operation_line(product)):
+                    snapshot.skipped.add(('mrp.routing.workcenter', operation_id, product_id))
+
+    def _read_precalculated(self, product_ids):
+        product_ids = set(product_ids) - self._checked_precalculated
+        if not product_ids:
+            return
+        self._checked_precalculated |= product_ids
+        unit_costs = self.env['mrp.bom.cost.latest']._get_unit_costs(product_ids, manufacturing=True)
+        for product_id, (unit_cost, bom) in unit_costs.items():
+            self.snapshot.precalculated[product_id] = (unit_cost, bom.product_uom_id.id or False)
+
+    def _read_cached(self, keys):
+        if not keys:
+            return
+        self.snapshot.cached.update(
+            self.env['mrp.bom.cost.cache']._get_cached_totals(set(keys), self.include_operations))
+
+    def load(self, roots):
+        """Load the snapshot of the (bom, product) roots and of everything below them"""
+        snapshot = self.snapshot
+        seen = set()
+        frontier = []
+        for bom, product in roots:
+            key = (bom.id, product.id)
+            if key not in seen:
+                seen.add(key)
+                frontier.append(key)
+
+        if self.use_cache:
+            self._read_cached(frontier)
+            self._read_bom_headers({bom_id for bom_id, product_id in snapshot.cached})
+            self._read_products({product_id for bom_id, product_id in snapshot.cached})
+            frontier = [key for key in frontier if key not in snapshot.cached]
+
+        while frontier:
+            bom_ids = {bom_id for bom_id, product_id in frontier}
+            self._read_bom_structures(bom_ids)
+            self._read_products(
+                {product_id for bom_id, product_id in frontier} |
+                {snapshot.lines[line_id].product_id for bom_id in bom_ids
+                 for line_id in snapshot.boms[bom_id].line_ids}
+            )
+            self._resolve_child_boms(bom_ids)
+            self._evaluate_variant_filters(frontier)
+
+            # Sub-assemblies of this level, unless priced from their latest unit cost or cached
+            components = [
+                line for bom_id, product_id in frontier
+                for line in map(snapshot.lines.__getitem__, snapshot.boms[bom_id].line_ids)
+                if line.child_bom_id and ('mrp.bom.line', line.id, product_id) not in snapshot.skipped
+            ]
+            if self.use_precalculated:
+                self._read_precalculated({line.product_id for line in components})
+            child_keys = {
+                (line.child_bom_id, line.product_id) for line in components
+                if line.product_id not in snapshot.precalculated
+            } - seen
+            seen |= child_keys
+            self._read_bom_headers({bom_id for bom_id, product_id in child_keys})
+            if self.use_cache:
+                self._read_cached(child_keys)
+            frontier = sorted(key for key in child_keys if key not in snapshot.cached)
+
+        _logger.debug("BOM snapshot loaded: %s BOMs, %s lines, %s operations", len(snapshot.boms),
+                      len(snapshot.lines), len(snapshot.operations))
+        return snapshot
@@ -0,0 +1,95 @@
+from odoo import models, api
+from .bom_cost_snapshot import BomSnapshotLoader
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class BomResolutionIndex:
+    """
+    Product variant -> effective BOM resolution for one operation.
+
+    For each company, all active BOMs are prefetched with a single search and
+    mapped to the variants they apply to, using the same domain and ordering
+    as mrp.bom._bom_find. Lookups are then plain dictionary reads, so a
+    calculation resolves every component without issuing one search per BOM line.
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self._by_company = {}
+
+    def _build(self, company_id):
+        """
+        Prefetch the active BOMs of a company and map them to variants.
+        Returns (by_product, by_template, bom_ids).
+        """
+        Bom = self.env['mrp.bom']
+        domain = [('active', '=', True)]
+        if company_id:
+            domain += ['|', ('company_id', '=', False), ('company_id', '=', company_id)]
+
+        boms = Bom.search(domain, order='sequence, product_id, id')
+        # Prefetch the variants of every template in one read
+        boms.product_tmpl_id.product_variant_ids
+
+        by_product = {}
+        by_template = {}
+        for bom in boms:
+            if not bom.product_id:
+                by_template.setdefault(bom.product_tmpl_id.id, bom.id)
+            for product in (bom.product_id or bom.product_tmpl_id.product_variant_ids):
+                by_product.setdefault(product.id, bom.id)
+
+        _logger.debug("BOM resolution index built for company %s: %s BOMs", company_id, len(boms))
+        return by_product, by_template, tuple(boms.ids)
+
+    def get(self, product, company_id=False):
+        """
+        Return the effective BOM of a product variant, or an empty mrp.bom
+        recordset, like mrp.bom._bom_find(products=product, ...).get(product)
+        """
+        Bom = self.env['mrp.bom']
+        if not product or product.type == 'service':
+            return Bom
+
+        company_id = company_id or self.env.context.get('company_id') or False
+        if company_id not in self._by_company:
+            self._by_company[company_id] = self._build(company_id)
+        by_product, by_template, bom_ids = self._by_company[company_id]
+
+        bom_id = by_product.get(product.id) or by_template.get(product.product_tmpl_id.id)
+        # Resolved BOMs share one prefetch set, so walking their lines and
+        # operations level after level reads them in batches
+        return Bom.browse(bom_id).with_prefetch(bom_ids) if bom_id else Bom
+
+
+class MrpBom(models.Model):
+    _inherit = 'mrp.bom'
+
+    @api.model
+    def _get_bom_resolution_index(self):
+        """Return a new BOM resolution index to be shared by one operation"""
+        return BomResolutionIndex(self.env)
+
+    @api.model
+    def _get_bom_cost_snapshot(self, roots, include_operations=True, bom_index=None, rate_table=None,
+                               uom_table=None, use_precalculated=True, use_cache=False, load_names=False,
+                               price_overrides=None):
+        """
+        Load the BomSnapshot of some (bom, product) roots, to be costed by a
+        CostKernel (see bom_cost_kernel). The index and tables of the operation
+        are reused when given. price_overrides, {product_id: price}, replaces
+        standard prices in the snapshot only.
+        """
+        if bom_index is None:
+            bom_index = self._get_bom_resolution_index()
+        if rate_table is None:
+            rate_table = self.env['mrp.routing.workcenter']._get_workcenter_rate_table()
+        if uom_table is None:
+            uom_table = self.env['uom.uom']._get_uom_conversion_table()
+        loader = BomSnapshotLoader(
+            self.env, include_operations, bom_index, rate_table, uom_table,
+            use_precalculated=use_precalculated, use_cache=use_cache, load_names=load_names,
+            price_overrides=price_overrides)
+        return loader.load(roots)
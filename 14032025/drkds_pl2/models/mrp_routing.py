@@ -0,0 +1,51 @@
+from odoo import models, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class WorkcenterRateTable:
+    """
+    Cost per hour of the operations used by one calculation.
+
+    mrp.routing.workcenter._total_cost_per_hour() reads the workcenter (and
+    employee) cost data of a single operation. The table evaluates it once per
+    operation, for all operations of the BOMs of a run at once so their
+    workcenters are read in one batch, and the costing and validation passes
+    then read the rates from it.
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self._rates = {}
+
+    def add_operations(self, operations):
+        """Compute the rates of the given operations"""
+        operations = operations.filtered(lambda o: o.id not in self._rates)
+        if not operations:
+            return
+        # Read the workcenters of all operations in one go
+        operations.workcenter_id.mapped('costs_hour')
+        for operation in operations:
+            self._rates[operation.id] = operation._total_cost_per_hour()
+        _logger.debug("Workcenter rates loaded for %s operations", len(operations))
+
+    def preload(self, boms):
+        """Compute the rates of every operation of the given BOMs"""
+        self.add_operations(boms.operation_ids)
+
+    def get(self, operation):
+        """Return the cost per hour of an operation"""
+        if operation.id not in self._rates:
+            # Load the sibling operations of the BOM together
+            self.add_operations(operation.bom_id.operation_ids | operation)
+        return self._rates[operation.id]
+
+
+class MrpRoutingWorkcenter(models.Model):
+    _inherit = 'mrp.routing.workcenter'
+
+    @api.model
+    def _get_workcenter_rate_table(self):
+        """Return a new workcenter rate table to be shared by one calculation"""
+        return WorkcenterRateTable(self.env)
@@ -0,0 +1,92 @@
+from odoo import models, api, _
+from odoo.tools import float_compare, float_round
+from collections import defaultdict
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class ProductProduct(models.Model):
+    _inherit = 'product.product'
+
+    @api.model
+    def _update_standard_prices(self, prices):
+        """
+        Bulk update of the standard prices of products in the current company,
+        {product_id: price}.
+
+        standard_price is company dependent: writing it product by product
+        upserts one ir.property each time. Here all the properties are set
+        with one ir.property._set_multi, and what product.product.write does
+        on a price change is done once for the whole batch: the stock
+        valuation (stock_account), the BOM cost cache invalidation and the
+        write date used by the incremental recalculation. The stored fields
+        depending on the prices (e.g. the BOM line costs) are recomputed once,
+        at the next flush.
+
+        Returns {'success', 'message', 'updated', 'unchanged', 'errors'}: the
+        ids of the products whose price changed and of those already at their
+        price, and {product_id: reason} for the prices that were not applied.
+        """
+        prices = {int(product_id): price for product_id, price in prices.items()}
+        products = self.browse(list(prices)).exists()
+        products.check_access_rights('write')
+        products.check_access_rule('write')
+
+        errors = {product_id: _("Product not found.") for product_id in set(prices) - set(products.ids)}
+        digits = self.env['decimal.precision'].precision_get('Product Price')
+        new_prices = {}
+        unchanged = []
+        for product in products:
+            price = prices[product.id]
+            if not isinstance(price, (int, float)) or price < 0:
+                errors[product.id] = _("Invalid price: %s", price)
+                continue
+            price = float_round(price, precision_digits=digits)
+            if not float_compare(price, product.standard_price, precision_digits=digits):
+                unchanged.append(product.id)
+                continue
+            new_prices[product.id] = price
+
+        updated = self.browse(list(new_prices))
+        if updated:
+            # The valuation reads the old prices
+            updated._update_price_valuation(new_prices)
+            self.env['ir.property']._set_multi('standard_price', self._name, new_prices)
+            updated.invalidate_recordset(['standard_price'])
+            updated.modified(['standard_price'])
+            Cache = self.env['mrp.bom.cost.cache']
+            Cache._invalidate(products=updated)
+            Cache._touch_inputs(updated)
+
+        message = _("%(updated)s product prices updated, %(unchanged)s unchanged.",
+                    updated=len(updated), unchanged=len(unchanged))
+        if errors:
+            failed = self.browse(list(errors)).exists()
+            names = dict(zip(failed.ids, failed.mapped('display_name')))
+            message += '\n' + _("Not applied:") + '\n' + '\n'.join(
+                '%s: %s' % (names.get(product_id, product_id), reason) for product_id, reason in errors.items())
+        _logger.info("Standard price update: %s updated, %s unchanged, %s errors",
+                     len(updated), len(unchanged), len(errors))
+        return {
+            'success': not errors,
+            'message': message,
+            'updated': updated.ids,
+            'unchanged': unchanged,
+            'errors': errors,
+        }
+
+    def _update_price_valuation(self, new_prices):
+        """
+        Revalue the stock of the products for their new prices, {product_id: price},
+        as stock_account does when standard_price is written. Only products
+        with valued stock get a valuation layer; _change_standard_price takes
+        one price, so it is called once per distinct price among them.
+        """
+        if not hasattr(self, '_change_standard_price') or self.env.context.get('disable_auto_svl'):
+            return
+        product_ids_by_price = defaultdict(list)
+        for product in self.filtered(lambda p: p.cost_method != 'fifo' and p.quantity_svl):
+            product_ids_by_price[new_prices[product.id]].append(product.id)
+        for price, product_ids in product_ids_by_price.items():
+            self.browse(product_ids)._change_standard_price(price)
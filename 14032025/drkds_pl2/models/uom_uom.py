@@ -0,0 +1,82 @@
+from odoo import models, api, _
+from odoo.exceptions import UserError
+from odoo.tools import float_round
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class UomConversionTable:
+    """
+    Unit of measure conversions for one calculation.
+
+    Every unit is read once with a single search_read, then each (from, to) pair
+    used by the run is resolved to its factors and a compatibility flag the
+    first time it is met. Conversions are then plain arithmetic with the same
+    operations and rounding as uom.uom._compute_quantity / _compute_price, and
+    checking a pair of units is a dictionary lookup.
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self._uoms = {
+            uom['id']: uom for uom in env['uom.uom'].with_context(active_test=False).search_read(
+                [], ['factor', 'rounding', 'category_id', 'name'])
+        }
+        # (from_uom_id, to_uom_id) -> (from factor, to factor, to rounding, compatible)
+        self._pairs = {}
+        _logger.debug("UoM conversion table loaded with %s units", len(self._uoms))
+
+    @staticmethod
+    def _id(uom):
+        return uom if isinstance(uom, int) else uom.id
+
+    def _pair(self, from_uom_id, to_uom_id):
+        pair = self._pairs.get((from_uom_id, to_uom_id))
+        if pair is None:
+            from_uom, to_uom = self._uoms[from_uom_id], self._uoms[to_uom_id]
+            compatible = from_uom_id == to_uom_id or from_uom['category_id'] == to_uom['category_id']
+            pair = (from_uom['factor'], to_uom['factor'], to_uom['rounding'], compatible)
+            self._pairs[(from_uom_id, to_uom_id)] = pair
+        return pair
+
+    def is_compatible(self, from_uom, to_uom):
+        """Whether quantities can be converted between two units"""
+        from_uom_id, to_uom_id = self._id(from_uom), self._id(to_uom)
+        if not from_uom_id or not to_uom_id:
+            return True
+        return self._pair(from_uom_id, to_uom_id)[3]
+
+    def compute_quantity(self, qty, from_uom, to_uom):
+        """Same as from_uom._compute_quantity(qty, to_uom)"""
+        from_uom_id, to_uom_id = self._id(from_uom), self._id(to_uom)
+        if not from_uom_id or not qty:
+            return qty
+        if not to_uom_id:
+            return qty / self._uoms[from_uom_id]['factor']
+        from_factor, to_factor, rounding, compatible = self._pair(from_uom_id, to_uom_id)
+        if not compatible:
+            raise UserError(_(
+                'The unit of measure %s cannot be converted to %s, they belong to different categories.'
+            ) % (self._uoms[from_uom_id]['name'], self._uoms[to_uom_id]['name']))
+        amount = qty if from_uom_id == to_uom_id else qty / from_factor * to_factor
+        return float_round(amount, precision_rounding=rounding, rounding_method='UP')
+
+    def compute_price(self, price, from_uom, to_uom):
+        """Same as from_uom._compute_price(price, to_uom)"""
+        from_uom_id, to_uom_id = self._id(from_uom), self._id(to_uom)
+        if not from_uom_id or not price or not to_uom_id or from_uom_id == to_uom_id:
+            return price
+        from_factor, to_factor, rounding, compatible = self._pair(from_uom_id, to_uom_id)
+        if not compatible:
+            return price
+        return price * from_factor / to_factor
+
+
+class UomUom(models.Model):
+    _inherit = 'uom.uom'
+
+    @api.model
+    def _get_uom_conversion_table(self):
+        """Return a new UoM conversion table to be shared by one calculation"""
+        return UomConversionTable(self.env)
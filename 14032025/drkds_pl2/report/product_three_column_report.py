@@ -149,8 +149,27 @@ class ProductThreeColumnReport(models.AbstractModel):
             if not data.get('form'):
                 _logger.warning("Report called with missing form data")
                 return {}
-            
-        # Rest of the code stays the same...
+
+            form = data['form']
+            doc = self._validate_and_get_document(form.get('doc_id'))
+            partners = self._get_partner_details(
+                form.get('customer_id'), form.get('contact_id'), form.get('salesman_id'))
+            return {
+                'doc_ids': doc.ids,
+                'doc_model': 'mrp.bom.cost.calculator',
+                'docs': doc,
+                'data': form,
+                'currency': self._get_currency_info(doc),
+                'customer': partners['customer'],
+                'contact': partners['contact'],
+                'salesman': partners['salesman'],
+                'customer_name': form.get('customer_name', ''),
+                'contact_name': form.get('contact_name', ''),
+                'salesman_name': form.get('salesman_name', ''),
+                'salesman_email': partners['salesman_email'] or form.get('salesman_email', ''),
+                'salesman_mobile': partners['salesman_mobile'] or form.get('salesman_mobile', ''),
+                'price_level': form.get('price_level', 'all'),
+            }
             
         except Exception as e:
             _logger.error("Error generating report from wizard: %s", str(e))
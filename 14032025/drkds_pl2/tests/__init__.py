@@ -0,0 +1,10 @@
+from . import test_product_three_column_report
+from . import test_bom_cost_benchmark
+from . import test_query_counts
+from . import test_price_overrides
+from . import test_price_sensitivity
+from . import test_price_update
+from . import test_incremental_recalculation
+from . import test_bom_cost_calculator
+from . import test_bom_cost_sharding
+from . import test_concurrency
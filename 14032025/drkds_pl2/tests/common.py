@@ -0,0 +1,132 @@
+import random
+import unittest
+
+from odoo import Command
+from odoo.tests.common import TransactionCase
+
+
+class BomCatalogueCase(TransactionCase):
+    """
+    Builds synthetic BOM catalogues for the cost calculator tests.
+
+    A catalogue has `roots` finished products, each made of `fanout` components
+    per BOM level down to `depth` levels, the last level being raw materials.
+    With probability `sharing`, a component reuses one of the products already
+    created for its level instead of a new one, so sub-assemblies are shared
+    between parents. Finished products get `variants` variants, each with a BOM
+    line restricted to it, and every BOM gets `operations` operations.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if 'total_jobwork_cost' not in cls.env['product.product']._fields:
+            raise unittest.SkipTest("The product costs of drkds_pl_product are required by the calculator")
+        cls.uom_unit = cls.env.ref('uom.product_uom_unit')
+        cls.workcenter = cls.env['mrp.workcenter'].create({
+            'name': 'Synthetic Workcenter',
+            'costs_hour': 60.0,
+        })
+        cls.customer = cls.env['res.partner'].create({
+            'name': 'Synthetic Customer',
+            'customer_rank': 1,
+        })
+
+    @classmethod
+    def _create_products(cls, names, rng, manufactured=False):
+        return cls.env['product.product'].create([{
+            'name': name,
+            'type': 'product' if manufactured else 'consu',
+            'standard_price': 0.0 if manufactured else rng.randint(1, 100),
+            'uom_id': cls.uom_unit.id,
+            'uom_po_id': cls.uom_unit.id,
+        } for name in names])
+
+    @classmethod
+    def _create_finished_templates(cls, count, variants, prefix):
+        values = {'name': f'{prefix} Finished', 'type': 'product'}
+        if variants > 1:
+            attribute = cls.env['product.attribute'].create({
+                'name': f'{prefix} Variant',
+                'create_variant': 'always',
+                'value_ids': [Command.create({'name': f'V{i}'}) for i in range(variants)],
+            })
+            values['attribute_line_ids'] = [Command.create({
+                'attribute_id': attribute.id,
+                'value_ids': [Command.set(attribute.value_ids.ids)],
+            })]
+        return cls.env['product.template'].create([
+            dict(values, name=f'{prefix} Finished {i}') for i in range(count)
+        ])
+
+    @classmethod
+    def _bom_values(cls, template, components, rng, operations):
+        return {
+            'product_tmpl_id': template.id,
+            'product_qty': 1.0,
+            'product_uom_id': cls.uom_unit.id,
+            'bom_line_ids': [Command.create({
+                'product_id': component.id,
+                'product_qty': rng.randint(1, 5),
+                'product_uom_id': cls.uom_unit.id,
+            }) for component in components],
+            'operation_ids': [Command.create({
+                'name': f'Operation {i}',
+                'workcenter_id': cls.workcenter.id,
+                'time_mode': 'manual',
+                'time_cycle_manual': 10.0,
+            }) for i in range(operations)],
+        }
+
+    @classmethod
+    def _create_catalogue(cls, depth=3, fanout=3, sharing=0.5, variants=1, operations=1, roots=5, seed=0,
+                          prefix='Synthetic'):
+        """
+        Create a synthetic catalogue, returns (finished products, their BOMs).
+        The catalogue only depends on its parameters and seed.
+        """
+        rng = random.Random(seed)
+        templates = cls._create_finished_templates(roots, variants, prefix)
+
+        bom_vals = []
+        parents = [(template, []) for template in templates]
+        for level in range(1, depth + 1):
+            raw_level = level == depth
+            pool = cls.env['product.product']
+            children = []
+            for template, components in parents:
+                for position in range(fanout):
+                    if pool and rng.random() < sharing:
+                        component = rng.choice(pool)
+                    else:
+                        component = cls._create_products(
+                            [f'{prefix} L{level} C{len(pool)}'], rng, manufactured=not raw_level)
+                        pool |= component
+                        if not raw_level:
+                            children.append((component.product_tmpl_id, []))
+                    components.append(component)
+                bom_vals.append(cls._bom_values(template, components, rng, operations))
+            parents = children
+
+        boms = cls.env['mrp.bom'].create(bom_vals)
+
+        # One extra raw material per variant, only used by that variant
+        if variants > 1:
+            extras = cls._create_products([f'{prefix} Variant Part {i}' for i in range(variants)], rng)
+            for bom in boms.filtered(lambda b: b.product_tmpl_id in templates):
+                ptavs = bom.product_tmpl_id.attribute_line_ids.product_template_value_ids
+                bom.write({'bom_line_ids': [Command.create({
+                    'product_id': extra.id,
+                    'product_qty': 1.0,
+                    'product_uom_id': cls.uom_unit.id,
+                    'bom_product_template_attribute_value_ids': [Command.set(ptav.ids)],
+                }) for extra, ptav in zip(extras, ptavs)]})
+
+        return templates.product_variant_ids, boms
+
+    @classmethod
+    def _create_calculator(cls, products, **values):
+        Calculator = cls.env['mrp.bom.cost.calculator']
+        values['product_line_ids'] = [
+            Command.create(vals) for vals in Calculator._get_product_line_values(products.ids)]
+        return Calculator.create(values)
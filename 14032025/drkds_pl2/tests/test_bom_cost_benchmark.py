@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import time
+import tracemalloc
+
+from odoo.tests import tagged
+
+from .common import BomCatalogueCase
+
+_logger = logging.getLogger(__name__)
+
+# Catalogue shapes timed by default, BOM_BENCHMARK_SCENARIOS may hold a JSON
+# list of scenarios (see BomCatalogueCase._create_catalogue for the keys)
+DEFAULT_SCENARIOS = [
+    {'name': 'shallow', 'depth': 2, 'fanout': 5, 'sharing': 0.3, 'variants': 1, 'operations': 1, 'roots': 20},
+    {'name': 'deep', 'depth': 5, 'fanout': 3, 'sharing': 0.5, 'variants': 1, 'operations': 2, 'roots': 10},
+    {'name': 'shared', 'depth': 4, 'fanout': 4, 'sharing': 0.9, 'variants': 1, 'operations': 1, 'roots': 30},
+    {'name': 'variants', 'depth': 3, 'fanout': 3, 'sharing': 0.5, 'variants': 4, 'operations': 1, 'roots': 10},
+]
+
+
+@tagged('post_install', '-at_install', '-standard', 'bom_benchmark')
+class TestBomCostBenchmark(BomCatalogueCase):
+    """
+    Benchmark of the calculator, the breakdown lines, the editors and the
+    three-column report on synthetic catalogues.
+
+    Not part of the standard test run, use --test-tags bom_benchmark. Wall time,
+    SQL query count and peak Python memory of each step are logged, and written
+    as JSON to the file named by BOM_BENCHMARK_OUTPUT when set, so the numbers
+    of two versions of the module can be compared.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = []
+
+    @classmethod
+    def tearDownClass(cls):
+        output = os.environ.get('BOM_BENCHMARK_OUTPUT')
+        if output and cls.results:
+            with open(output, 'w') as f:
+                json.dump(cls.results, f, indent=2)
+        super().tearDownClass()
+
+    def _get_scenarios(self):
+        scenarios = os.environ.get('BOM_BENCHMARK_SCENARIOS')
+        return json.loads(scenarios) if scenarios else DEFAULT_SCENARIOS
+
+    def _measure(self, scenario, step, func):
+        """Run func with a cold cache, record its wall time, query count and peak memory"""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        query_count = self.cr.sql_log_count
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            result = func()
+            self.env.flush_all()
+            wall_time = time.perf_counter() - start
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        measure = {
+            'scenario': scenario['name'],
+            'step': step,
+            'wall_time': round(wall_time, 4),
+            'queries': self.cr.sql_log_count - query_count,
+            'peak_memory_kb': round(peak_memory / 1024),
+        }
+        self.results.append(measure)
+        _logger.info("BOM benchmark %(scenario)s / %(step)s: %(wall_time)ss, %(queries)s queries, "
+                     "%(peak_memory_kb)s KiB peak", measure)
+        return result
+
+    def _run_scenario(self, scenario):
+        parameters = {key: value for key, value in scenario.items() if key != 'name'}
+        products, boms = self._create_catalogue(prefix=scenario['name'], **parameters)
+        calculator = self._create_calculator(products)
+        lines = calculator.product_line_ids
+        sample = lines[:scenario.get('sample', 5)]
+        _logger.info("BOM benchmark %s: %s products, %s BOMs", scenario['name'], len(products), len(boms))
+
+        self._measure(scenario, 'calculate_all_costs', calculator.action_calculate_all_costs)
+        self.assertEqual(calculator.state, 'calculated')
+
+        def create_lines():
+            for line in sample:
+                calculator._calculate_bom_cost(line.bom_id, create_lines=True, product=line.product_id)
+        self._measure(scenario, 'create_lines', create_lines)
+
+        Editor = self.env['raw.materials.editor.wizard']
+
+        def editor_default_get():
+            for line in sample:
+                Editor.with_context(active_id=line.id).default_get(['line_id', 'material_line_ids'])
+        self._measure(scenario, 'raw_materials_editor_default_get', editor_default_get)
+
+        # Provided by drkds_pl_product_details
+        if 'product.cost.details.wizard' in self.env:
+            Details = self.env['product.cost.details.wizard']
+
+            def details_create():
+                for line in sample:
+                    Details.create({'calculator_id': calculator.id, 'product_line_id': line.id})
+            self._measure(scenario, 'cost_details_wizard_create', details_create)
+
+        def report_render():
+            wizard = self.env['drkds_pl2.product_three_column_wizard'].create({
+                'customer_id': self.customer.id,
+                'salesman_id': self.env.user.id,
+                'doc_id': calculator.id,
+            })
+            action = wizard.action_print_report()
+            return self.env['ir.actions.report']._render_qweb_html(
+                'drkds_pl2.report_product_three_column', calculator.ids, data=action['data'])
+        self._measure(scenario, 'three_column_report_render', report_render)
+
+    def test_benchmark(self):
+        for scenario in self._get_scenarios():
+            with self.subTest(scenario=scenario['name']):
+                self._run_scenario(scenario)
@@ -0,0 +1,312 @@
+import base64
+import json
+import zlib
+from unittest.mock import patch
+
+from odoo import Command
+from odoo.exceptions import ValidationError
+from odoo.tests import tagged
+
+from .common import BomCatalogueCase
+from ..models import bom_cost_breakdown, bom_cost_matrix
+
+
+@tagged('post_install', '-at_install')
+class TestBomCostCalculator(BomCatalogueCase):
+    """Consistency of the calculator records and of its calculation paths"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.products, cls.boms = cls._create_catalogue(
+            depth=3, fanout=2, sharing=0.3, roots=2, prefix='Calculator')
+
+    def test_required_product_lines(self):
+        with self.assertRaises(ValidationError):
+            self.env['mrp.bom.cost.calculator'].create({'is_multi_product': True})
+        calculator = self._create_calculator(self.products)
+        with self.assertRaises(ValidationError):
+            calculator.write({'product_line_ids': [Command.clear()]})
+
+    def _create_bom(self, product, lines, product_qty=1.0, uom=None, operations=0):
+        """Create a BOM of lines [(component, quantity)] or [(component, quantity, uom)]"""
+        uom = uom or self.uom_unit
+        return self.env['mrp.bom'].create({
+            'product_tmpl_id': product.product_tmpl_id.id,
+            'product_qty': product_qty,
+            'product_uom_id': uom.id,
+            'bom_line_ids': [Command.create({
+                'product_id': line[0].id,
+                'product_qty': line[1],
+                'product_uom_id': (line[2] if len(line) > 2 else self.uom_unit).id,
+            }) for line in lines],
+            'operation_ids': [Command.create({
+                'name': f'Operation {i}',
+                'workcenter_id': self.workcenter.id,
+                'time_mode': 'manual',
+                'time_cycle_manual': 10.0,
+            }) for i in range(operations)],
+        })
+
+    def _reference_costs(self, bom, product, unit_costs):
+        """
+        (material, operation, duration) of a BOM batch, computed level by level
+        with the ORM only, as the costs were calculated before the CostKernel
+        """
+        material = operation = duration = 0.0
+        for routing in bom.operation_ids:
+            if routing._skip_operation_line(product):
+                continue
+            duration += routing.time_cycle
+            operation += routing.time_cycle * routing._total_cost_per_hour() / 60
+        for line in bom.bom_line_ids:
+            if line._skip_bom_line(product):
+                continue
+            component = line.product_id
+            child_bom = self.env['mrp.bom']._bom_find(component, company_id=bom.company_id.id)[component]
+            if not child_bom:
+                material += component.standard_price * line.product_uom_id._compute_quantity(
+                    line.product_qty, component.uom_id)
+            elif component.id in unit_costs:
+                unit_cost, priced_bom = unit_costs[component.id]
+                material += priced_bom.product_uom_id._compute_price(
+                    unit_cost, line.product_uom_id) * line.product_qty
+            else:
+                child_material, child_operation, child_duration = self._reference_costs(
+                    child_bom, component, unit_costs)
+                ratio = line.product_qty / child_bom.product_uom_id._compute_quantity(
+                    child_bom.product_qty, line.product_uom_id)
+                material += child_material * ratio
+                operation += child_operation * ratio
+                duration += child_duration * ratio
+        return material, operation, duration
+
+    def test_hand_computed_costs(self):
+        uom_kg = self.env.ref('uom.product_uom_kgm')
+        uom_gram = self.env.ref('uom.product_uom_gram')
+        uom_dozen = self.env.ref('uom.product_uom_dozen')
+        Product = self.env['product.product']
+        steel = Product.create({
+            'name': 'Hand Steel', 'type': 'consu', 'standard_price': 5.0,
+            'uom_id': uom_kg.id, 'uom_po_id': uom_kg.id,
+        })
+        bolt = Product.create({'name': 'Hand Bolt', 'type': 'consu', 'standard_price': 0.5})
+        table, frame = Product.create([
+            {'name': 'Hand Table', 'type': 'product'},
+            {'name': 'Hand Frame', 'type': 'product'},
+        ])
+        # A frame batch of 2 units: 1500 g of steel, 8 bolts and one 10 minutes operation
+        self._create_bom(frame, [(steel, 1500.0, uom_gram), (bolt, 8.0)], product_qty=2.0, operations=1)
+        # A table: 3 frames, a dozen bolts, 250 g of steel and two 10 minutes operations
+        self._create_bom(table, [(frame, 3.0), (bolt, 1.0, uom_dozen), (steel, 250.0, uom_gram)], operations=2)
+        calculator = self._create_calculator(table)
+        calculator.action_calculate_all_costs()
+
+        # Frame batch: 1.5 kg * 5 + 8 * 0.5 = 11.5 of material, 10 minutes at 60 / hour.
+        # Table: 1.5 frame batches, 12 * 0.5 of bolts and 0.25 kg * 5 of steel,
+        # 20 minutes of its own operations.
+        line = calculator.product_line_ids
+        self.assertEqual(line.state, 'calculated')
+        self.assertAlmostEqual(line.material_cost, 11.5 * 1.5 + 6.0 + 1.25)
+        self.assertAlmostEqual(line.operation_cost, 20.0 + 10.0 * 1.5)
+        self.assertAlmostEqual(calculator.total_material_cost, 24.5)
+        self.assertAlmostEqual(calculator.total_operation_cost, 35.0)
+
+    def test_kernel_matches_recursive_costs(self):
+        uom_dozen = self.env.ref('uom.product_uom_dozen')
+        Product = self.env['product.product']
+        raw, other_raw = Product.create([
+            {'name': 'Equivalent Raw', 'type': 'consu', 'standard_price': 2.0},
+            {'name': 'Equivalent Other Raw', 'type': 'consu', 'standard_price': 3.0},
+        ])
+        finished, sub_assembly, precalculated = Product.create([
+            {'name': 'Equivalent Finished', 'type': 'product'},
+            {'name': 'Equivalent Sub-assembly', 'type': 'product'},
+            {'name': 'Equivalent Pre-calculated', 'type': 'product'},
+        ])
+        # The sub-assembly BOM makes half a dozen, the pre-calculated one is priced per dozen
+        self._create_bom(sub_assembly, [(other_raw, 4.0), (raw, 1.0, uom_dozen)],
+                         product_qty=0.5, uom=uom_dozen, operations=1)
+        precalculated_bom = self._create_bom(precalculated, [(raw, 1.0)], uom=uom_dozen)
+        finished_bom = self._create_bom(
+            finished, [(raw, 1.0, uom_dozen), (sub_assembly, 3.0), (precalculated, 6.0)], operations=2)
+        self.env['mrp.bom.cost.latest'].create({
+            'product_id': precalculated.id,
+            'company_id': self.env.company.id,
+            'unit_cost': 30.0,
+            'manufacturing_cost': 24.0,
+            'bom_id': precalculated_bom.id,
+            'calculator_id': self._create_calculator(precalculated).id,
+        })
+        variant_products, variant_boms = self._create_catalogue(
+            depth=2, fanout=2, sharing=0.5, variants=2, roots=1, prefix='Equivalent')
+
+        roots = [(finished_bom, finished)] + [
+            (self.env['mrp.bom']._bom_find(product)[product], product)
+            for product in self.products | variant_products
+        ]
+        calculator = self._create_calculator(finished | self.products | variant_products)
+        unit_costs = self.env['mrp.bom.cost.latest']._get_unit_costs(
+            Product.search([]).ids, manufacturing=True)
+        self.assertIn(precalculated.id, unit_costs)
+
+        totals = calculator._rollup_bom_costs(roots)
+        for bom, product in roots:
+            expected = self._reference_costs(bom, product, unit_costs)
+            recursive = calculator._calculate_bom_cost(bom, create_lines=False, product=product)
+            for value, kernel_value, recursive_value in zip(expected, totals[(bom.id, product.id)], recursive):
+                self.assertAlmostEqual(kernel_value, value, msg=product.display_name)
+                self.assertAlmostEqual(recursive_value, value, msg=product.display_name)
+
+        # 12 raw units, 3 / 6 of the sub-assembly batch and 6 / 12 of a pre-calculated dozen
+        material, operation, duration = totals[(finished_bom.id, finished.id)]
+        self.assertAlmostEqual(material, 24.0 + (12.0 + 24.0) / 2 + 12.0)
+        self.assertAlmostEqual(operation, 20.0 + 10.0 / 2)
+        self.assertAlmostEqual(duration, 20.0 + 10.0 / 2)
+
+    def test_matrix_solver_fallback(self):
+        calculator = self._create_calculator(self.products)
+        roots = [(line.bom_id, line.product_id) for line in calculator.product_line_ids if line.bom_id]
+        root_keys = [(bom.id, product.id) for bom, product in roots]
+        expected = calculator._rollup_bom_costs(roots, store_cache=False)
+        solved = bom_cost_matrix.BomCostMatrix.load(self.env, roots, True).solve()
+        requirements = bom_cost_matrix.BomCostMatrix.load(self.env, roots, True).requirement_coefficients(root_keys)
+
+        # Without NumPy/SciPy, the matrix is swept children first with the same results
+        with patch.object(bom_cost_matrix, 'sparse', None), \
+                self.assertLogs(bom_cost_matrix.__name__, 'INFO') as logs:
+            matrix = bom_cost_matrix.BomCostMatrix.load(self.env, roots, True)
+            swept = matrix.solve()
+            self.assertEqual(matrix.solver, 'sweep')
+            swept_requirements = matrix.requirement_coefficients(root_keys)
+        self.assertTrue(any('not installed' in output for output in logs.output))
+        for key in root_keys:
+            for value, solved_value, swept_value in zip(expected[key], solved[key], swept[key]):
+                self.assertAlmostEqual(solved_value, value)
+                self.assertAlmostEqual(swept_value, value)
+            self.assertEqual(set(swept_requirements[key]), set(requirements[key]))
+            for product_id, quantity in requirements[key].items():
+                self.assertAlmostEqual(swept_requirements[key][product_id], quantity)
+
+    def test_uom_changes_invalidate_cache(self):
+        Cache = self.env['mrp.bom.cost.cache']
+        Product = self.env['product.product']
+        pack = self.env['uom.uom'].create({
+            'name': 'Cached Pack',
+            'category_id': self.uom_unit.category_id.id,
+            'uom_type': 'bigger',
+            'factor_inv': 6.0,
+        })
+        raw, other_raw = Product.create([
+            {'name': 'Cached Raw', 'type': 'consu', 'standard_price': 2.0,
+             'uom_id': pack.id, 'uom_po_id': pack.id},
+            {'name': 'Cached Other Raw', 'type': 'consu', 'standard_price': 3.0},
+        ])
+        finished, packed, unpacked = Product.create([
+            {'name': 'Cached Finished', 'type': 'product'},
+            {'name': 'Cached Packed', 'type': 'product'},
+            {'name': 'Cached Unpacked', 'type': 'product'},
+        ])
+        packed_bom = self._create_bom(packed, [(raw, 12.0)])
+        unpacked_bom = self._create_bom(unpacked, [(other_raw, 2.0)])
+        finished_bom = self._create_bom(finished, [(packed, 1.0), (unpacked, 1.0)])
+        calculator = self._create_calculator(finished)
+
+        def cached_keys():
+            self.env.flush_all()
+            return {(entry.bom_id, entry.product_id) for entry in Cache.search([
+                ('bom_id', 'in', (packed_bom | unpacked_bom | finished_bom).ids)])}
+
+        totals = calculator._rollup_bom_costs([(finished_bom, finished)])
+        # 12 units are 2 packs
+        self.assertAlmostEqual(totals[(packed_bom.id, packed.id)][0], 4.0)
+        self.assertEqual(cached_keys(), {
+            (packed_bom, packed), (unpacked_bom, unpacked), (finished_bom, finished)})
+
+        pack.factor_inv = 10.0
+        self.assertEqual(cached_keys(), {(unpacked_bom, unpacked)})
+        totals = calculator._rollup_bom_costs([(finished_bom, finished)])
+        self.assertAlmostEqual(totals[(packed_bom.id, packed.id)][0], 2.4)
+
+        other_raw.product_tmpl_id.write({'uom_id': pack.id, 'uom_po_id': pack.id})
+        self.assertEqual(cached_keys(), {(packed_bom, packed)})
+
+    def test_compare_components(self):
+        Product = self.env['product.product']
+        raw, other_raw = Product.create([
+            {'name': 'Compared Raw', 'type': 'consu', 'standard_price': 2.0},
+            {'name': 'Compared Other Raw', 'type': 'consu', 'standard_price': 3.0},
+        ])
+        finished, sub_assembly, simple = Product.create([
+            {'name': 'Compared Finished', 'type': 'product'},
+            {'name': 'Compared Sub-assembly', 'type': 'product'},
+            {'name': 'Compared Simple', 'type': 'product'},
+        ])
+        # The raw material is used at two levels, the sub-assembly BOM makes 2 units
+        self._create_bom(sub_assembly, [(raw, 2.0), (other_raw, 4.0)], product_qty=2.0)
+        self._create_bom(finished, [(raw, 2.0), (sub_assembly, 3.0)])
+        self._create_bom(simple, [(raw, 1.0)])
+        base = self._create_calculator(simple)
+        calculator = self._create_calculator(finished | simple)
+
+        components = {values['product_id']: values for values in calculator._compare_components(base)}
+        self.assertEqual(set(components), {raw.id, other_raw.id})
+        # 1 for the simple product, 2 + 3 * 2 / 2 for the finished one
+        self.assertAlmostEqual(components[raw.id]['base_quantity'], 1.0)
+        self.assertAlmostEqual(components[raw.id]['quantity'], 6.0)
+        self.assertAlmostEqual(components[raw.id]['cost'], 12.0)
+        self.assertAlmostEqual(components[raw.id]['unit_cost'], 2.0)
+        self.assertIsNone(components[other_raw.id]['base_quantity'])
+        self.assertAlmostEqual(components[other_raw.id]['quantity'], 6.0)
+        self.assertAlmostEqual(components[other_raw.id]['cost'], 18.0)
+
+    def test_breakdown_lines(self):
+        calculator = self._create_calculator(self.products)
+        lines = calculator.product_line_ids.filtered(lambda l: l.is_manufacture and l.bom_id)
+        first, second = lines[:2]
+        with patch('odoo.addons.drkds_pl2.models.bom_cost_calculator.encode_breakdown',
+                   wraps=bom_cost_breakdown.encode_breakdown) as encode:
+            for line in (first, second):
+                calculator._calculate_bom_cost(line.bom_id, create_lines=True, product=line.product_id)
+            rows = calculator._get_breakdown_rows()
+        # The rows of both BOMs are encoded at once
+        self.assertEqual(encode.call_count, 1)
+        self.assertTrue(rows)
+
+        # The lines of an unchanged snapshot are reused, and recreated once it changes
+        Breakdown = self.env['mrp.bom.cost.breakdown.line']
+        breakdown_lines = Breakdown._create_from_calculator(calculator)
+        self.assertEqual(breakdown_lines.mapped('name'), [row['name'] for row in rows])
+        self.assertEqual(Breakdown._create_from_calculator(calculator), breakdown_lines)
+        calculator._calculate_bom_cost(first.bom_id, create_lines=True, product=first.product_id)
+        new_lines = Breakdown._create_from_calculator(calculator)
+        self.assertFalse(breakdown_lines.exists())
+        self.assertGreater(len(new_lines), len(breakdown_lines))
+
+    def test_decode_breakdown_versions(self):
+        def snapshot(payload):
+            return base64.b64encode(zlib.compress(json.dumps(payload).encode()))
+
+        # A version 1 snapshot missing some fields and with a field since removed
+        old = snapshot({
+            'version': 1,
+            'fields': ['name', 'cost', 'quantity_uom'],
+            'rows': [['Old Row', 5.0, 'Units']],
+        })
+        rows = bom_cost_breakdown.decode_breakdown(old)
+        self.assertEqual(rows, [dict(bom_cost_breakdown.BREAKDOWN_FIELDS, name='Old Row', cost=5.0)])
+
+        # Upgrades run from the version of the snapshot up to the current one
+        def upgrade(payload):
+            return dict(payload, rows=[[name, cost * 2, uom] for name, cost, uom in payload['rows']])
+
+        with patch.object(bom_cost_breakdown, 'BREAKDOWN_VERSION', 2), \
+                patch.dict(bom_cost_breakdown.BREAKDOWN_UPGRADES, {1: upgrade}):
+            rows = bom_cost_breakdown.decode_breakdown(old)
+            self.assertEqual(rows[0]['cost'], 10.0)
+            self.assertEqual(bom_cost_breakdown.decode_breakdown(snapshot({
+                'version': 2, 'fields': ['cost'], 'rows': [[3.0]],
+            }))[0]['cost'], 3.0)
+
+        with self.assertRaises(ValueError):
+            bom_cost_breakdown.decode_breakdown(snapshot({'version': 2, 'fields': [], 'rows': []}))
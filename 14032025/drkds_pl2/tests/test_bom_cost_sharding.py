@@ -0,0 +1,75 @@
+from collections import namedtuple
+from unittest.mock import patch
+
+from odoo.tests import tagged
+from odoo.tools import config
+
+from .common import BomCatalogueCase
+from ..models import bom_cost_sharding
+
+VirtualMemory = namedtuple('VirtualMemory', ['available'])
+
+
+@tagged('post_install', '-at_install')
+class TestBomCostSharding(BomCatalogueCase):
+    """Splitting of the sharded calculations and rollup of one shard"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.products, cls.boms = cls._create_catalogue(
+            depth=3, fanout=2, sharing=0.3, roots=4, prefix='Sharding')
+
+    def test_split_shards(self):
+        self.assertEqual(bom_cost_sharding.split_shards(list(range(7)), 3), [[0, 1, 2], [3, 4], [5, 6]])
+        self.assertEqual(bom_cost_sharding.split_shards(list(range(2)), 4), [[0], [1]])
+        self.assertEqual(bom_cost_sharding.split_shards(list(range(3)), 0), [[0, 1, 2]])
+        self.assertEqual(bom_cost_sharding.split_shards([], 4), [[]])
+
+    def test_worker_count_memory_limit(self):
+        gigabyte = 1024 ** 3
+        with patch.dict(config.options, {'limit_memory_soft': 2 * gigabyte}), \
+                patch.object(bom_cost_sharding.psutil, 'virtual_memory',
+                             return_value=VirtualMemory(available=7 * gigabyte)):
+            self.assertEqual(bom_cost_sharding.get_worker_count(self.env, 2), 2)
+            self.assertEqual(bom_cost_sharding.get_worker_count(self.env, 8), 3)
+        with patch.dict(config.options, {'limit_memory_soft': 2 * gigabyte}), \
+                patch.object(bom_cost_sharding.psutil, 'virtual_memory',
+                             return_value=VirtualMemory(available=gigabyte)):
+            self.assertEqual(bom_cost_sharding.get_worker_count(self.env, 8), 1)
+
+    def test_compute_shard(self):
+        calculator = self._create_calculator(self.products)
+        lines = calculator.product_line_ids.filtered(lambda l: l.is_manufacture and l.bom_id)
+        roots = [(line.bom_id, line.product_id) for line in lines]
+        expected = calculator._rollup_bom_costs(roots, store_cache=False)
+        self.env.flush_all()
+
+        # The shard runs in this process, on a test cursor of the test transaction
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+        Cache = self.env['mrp.bom.cost.cache']
+        cache_count = Cache.search_count([])
+        with patch('odoo.sql_db.db_connect', return_value=self.registry):
+            totals = bom_cost_sharding._compute_shard(
+                self.env.cr.dbname, self.env.uid, dict(self.env.context), calculator.id,
+                [(bom.id, product.id) for bom, product in roots])
+
+        self.assertEqual(set(totals), set(expected))
+        for key, values in expected.items():
+            for value, expected_value in zip(totals[key], values):
+                self.assertAlmostEqual(value, expected_value)
+        # Nothing is stored in the cache by the workers
+        self.assertEqual(Cache.search_count([]), cache_count)
+
+    def test_interactive_sharded_calculation(self):
+        calculator = self._create_calculator(self.products, calculation_mode='sharded', worker_count=2)
+        action = calculator.action_calculate_all_costs()
+        self.assertEqual(action['tag'], 'display_notification')
+        self.assertEqual(calculator.job_state, 'queued')
+        self.assertEqual(calculator.state, 'draft')
+
+        # Test cursors cannot be shared with forked workers
+        context = calculator._get_calculation_context('background')
+        with self.assertLogs('odoo.addons.drkds_pl2.models.bom_cost_calculator', 'WARNING'):
+            self.assertIsNone(calculator._get_shard_pool(context))
@@ -0,0 +1,68 @@
+from datetime import datetime
+
+from odoo import api, Command, SUPERUSER_ID
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('post_install', '-at_install')
+class TestConcurrentCalculations(TransactionCase):
+    """
+    Calculations of overlapping catalogues committing concurrently.
+
+    The records are created and committed with cursors of their own, so that
+    two transactions can see them, and removed afterwards.
+    """
+
+    def setUp(self):
+        super().setUp()
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            product = env['product.product'].create({'name': 'Concurrent Product', 'type': 'consu'})
+            calculators = env['mrp.bom.cost.calculator'].create([{
+                'state': 'calculated',
+                'calculation_date': calculation_date,
+                'product_line_ids': [Command.create({
+                    'product_id': product.id,
+                    'base_cost': cost,
+                    'state': 'calculated',
+                })],
+            } for cost, calculation_date in ((10.0, datetime(2026, 1, 1)), (20.0, datetime(2026, 2, 1)))])
+            self.product_id = product.id
+            self.calculator_ids = calculators.ids
+        self.addCleanup(self._remove_records)
+
+    def _remove_records(self):
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env['mrp.bom.cost.latest'].search([('product_id', '=', self.product_id)]).unlink()
+            env['mrp.bom.cost.calculator'].browse(self.calculator_ids).unlink()
+            env['product.product'].browse(self.product_id).product_tmpl_id.unlink()
+
+    def _new_env(self):
+        cr = self.registry.cursor()
+        self.addCleanup(cr.close)
+        return api.Environment(cr, SUPERUSER_ID, {})
+
+    def _publish(self, env, calculator_id):
+        env['mrp.bom.cost.latest']._update_from_calculators(env['mrp.bom.cost.calculator'].browse(calculator_id))
+
+    def test_overlapping_publication(self):
+        older, newer = self.calculator_ids
+        env_older, env_newer = self._new_env(), self._new_env()
+        # Both transactions take their snapshot before either publishes
+        env_older.cr.execute("SELECT 1")
+        env_newer.cr.execute("SELECT 1")
+
+        self._publish(env_newer, newer)
+        env_newer.cr.commit()
+        # Publishing the same product no longer fails with a serialization
+        # error, and the older calculation committed last does not win
+        self._publish(env_older, older)
+        env_older.cr.commit()
+
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            entry = env['mrp.bom.cost.latest'].search([('product_id', '=', self.product_id)])
+            self.assertEqual(entry.calculator_id.id, newer)
+            self.assertEqual(entry.unit_cost, 20.0)
@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import BomCatalogueCase
+
+
+@tagged('post_install', '-at_install')
+class TestIncrementalRecalculation(BomCatalogueCase):
+    """Recalculation of the lines whose costing inputs changed since the last calculation"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.products, cls.boms = cls._create_catalogue(
+            depth=2, fanout=3, sharing=0.0, roots=2, prefix='Incremental')
+
+    def _backdate_inputs(self):
+        """Move the write dates of all the costing inputs an hour back"""
+        for table in ('product_product', 'product_template', 'mrp_bom', 'mrp_bom_line',
+                      'mrp_routing_workcenter', 'mrp_workcenter', 'mrp_bom_cost_latest'):
+            self.env.cr.execute(f"UPDATE {table} SET write_date = now() at time zone 'UTC' - interval '1 hour'")
+        self.env.invalidate_all()
+
+    def _create_calculated_calculator(self):
+        calculator = self._create_calculator(self.products)
+        calculator.action_calculate_all_costs()
+        self.env.flush_all()
+        self._backdate_inputs()
+        calculator.calculation_date = self.env.cr.now() - timedelta(minutes=30)
+        return calculator
+
+    def _get_sub_boms(self):
+        return self.boms.filtered(lambda b: b.product_tmpl_id not in self.products.product_tmpl_id)
+
+    def test_incremental_recalculation(self):
+        calculator = self._create_calculated_calculator()
+        # A raw material of a sub-assembly, whose totals are cached
+        material = self._get_sub_boms().bom_line_ids.product_id[0]
+        Cache = self.env['mrp.bom.cost.cache']
+        self.assertTrue(Cache.search_count([('dependency_product_ids', 'in', material.ids)]))
+
+        new_price = material.standard_price + 10.0
+        expected = calculator._simulate_costs({material.id: new_price})
+        self.env.flush_all()
+        self._backdate_inputs()
+
+        result = self.env['product.product']._update_standard_prices({material.id: new_price})
+        self.assertTrue(result['success'])
+        self.env.flush_all()
+        self.assertFalse(Cache.search_count([('dependency_product_ids', 'in', material.ids)]))
+        products, boms = calculator._get_changed_inputs(calculator.calculation_date)
+        self.assertIn(material, products)
+
+        calculator.action_incremental_recalculate()
+        for line, values in expected.items():
+            self.assertAlmostEqual(line.material_cost, values['material_cost'])
+            self.assertAlmostEqual(line.unit_cost, values['unit_cost'])
+
+    def test_incremental_recalculation_removed_inputs(self):
+        calculator = self._create_calculated_calculator()
+
+        # One sub-assembly loses a line, another one its BOM
+        removed_line_bom, archived_bom = self._get_sub_boms()[::5]
+        removed_line_bom.bom_line_ids[0].unlink()
+        archived_bom.action_archive()
+        self.env.flush_all()
+        products, boms = calculator._get_changed_inputs(calculator.calculation_date)
+        self.assertIn(removed_line_bom, boms)
+        self.assertIn(archived_bom, boms)
+
+        expected = calculator._simulate_costs({})
+        calculator.action_incremental_recalculate()
+        for line, values in expected.items():
+            self.assertAlmostEqual(line.material_cost, values['material_cost'])
+            self.assertAlmostEqual(line.unit_cost, values['unit_cost'])
+        self.assertAlmostEqual(calculator.total_material_cost,
+                               sum(calculator.product_line_ids.mapped('material_cost')))
+
+    def test_incremental_recalculation_validates_lines(self):
+        calculator = self._create_calculated_calculator()
+        material = self._get_sub_boms().bom_line_ids.product_id[0]
+        unit_costs = calculator.product_line_ids.mapped('unit_cost')
+
+        # The affected lines are validated like in a full calculation
+        material.standard_price = 0.0
+        self.env.flush_all()
+        with self.assertRaises(UserError):
+            calculator.action_incremental_recalculate()
+        self.assertEqual(calculator.product_line_ids.mapped('unit_cost'), unit_costs)
@@ -0,0 +1,43 @@
+from odoo.tests import tagged
+
+from .common import BomCatalogueCase
+
+
+@tagged('post_install', '-at_install')
+class TestPriceOverrides(BomCatalogueCase):
+    """What-if calculations with overridden raw material prices"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.products, cls.boms = cls._create_catalogue(
+            depth=3, fanout=2, sharing=0.3, roots=2, prefix='What-if')
+        cls.raw_materials = cls.boms.bom_line_ids.product_id.filtered(lambda p: not p.bom_ids)
+        cls.calculator = cls._create_calculator(cls.products)
+        cls.calculator.action_calculate_all_costs()
+
+    def test_current_prices(self):
+        overrides = {product.id: product.standard_price for product in self.raw_materials}
+        for line, values in self.calculator._simulate_costs(overrides).items():
+            self.assertAlmostEqual(values['material_cost'], line.material_cost)
+            self.assertAlmostEqual(values['unit_cost'], line.unit_cost)
+
+    def test_overridden_prices(self):
+        prices = {product.id: product.standard_price for product in self.raw_materials}
+        lines = {line: (line.material_cost, line.operation_cost) for line in self.calculator.product_line_ids}
+        cache_count = self.env['mrp.bom.cost.cache'].search_count([])
+
+        simulation = self.calculator._simulate_costs({
+            product_id: price * 2 for product_id, price in prices.items()})
+
+        # Material costs are linear in the raw material prices
+        for line, (material_cost, operation_cost) in lines.items():
+            self.assertAlmostEqual(simulation[line]['material_cost'], material_cost * 2)
+            self.assertAlmostEqual(simulation[line]['operation_cost'], operation_cost)
+        # Nothing was written
+        self.env.invalidate_all()
+        for product in self.raw_materials:
+            self.assertEqual(product.standard_price, prices[product.id])
+        for line, (material_cost, operation_cost) in lines.items():
+            self.assertEqual(line.material_cost, material_cost)
+        self.assertEqual(self.env['mrp.bom.cost.cache'].search_count([]), cache_count)
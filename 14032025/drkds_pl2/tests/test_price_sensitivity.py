@@ -0,0 +1,42 @@
+from odoo.tests import tagged
+
+from .common import BomCatalogueCase
+
+
+@tagged('post_install', '-at_install')
+class TestPriceSensitivity(BomCatalogueCase):
+    """Raw material price sensitivity of the product lines"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.products, cls.boms = cls._create_catalogue(
+            depth=3, fanout=2, sharing=0.3, roots=2, prefix='Sensitivity')
+        cls.calculator = cls._create_calculator(cls.products)
+        cls.calculator.action_calculate_all_costs()
+
+    def test_coefficients(self):
+        sensitivity = self.calculator._get_price_sensitivity()
+        self.assertTrue(sensitivity)
+        for line, coefficients in sensitivity.items():
+            # Material costs are linear in the raw material prices
+            material_cost = sum(coefficient * self.env['product.product'].browse(product_id).standard_price
+                                for product_id, coefficient in coefficients.items())
+            self.assertAlmostEqual(material_cost * line.bom_id.product_qty, line.material_cost)
+
+            # A coefficient is the unit cost change per unit change of the price
+            product_id, coefficient = next(iter(coefficients.items()))
+            price = self.env['product.product'].browse(product_id).standard_price
+            simulation = self.calculator._simulate_costs({product_id: price + 1.0}, lines=line)
+            self.assertAlmostEqual(simulation[line]['unit_cost'] - line.unit_cost, coefficient)
+
+    def test_wizard(self):
+        wizard = self.env['mrp.bom.cost.sensitivity.wizard'].create({
+            'calculator_id': self.calculator.id,
+            'top_count': 2,
+        })
+        wizard.action_compute()
+        self.assertTrue(wizard.line_ids)
+        for line in wizard.line_ids:
+            self.assertIn(line.rank, (1, 2))
+            self.assertAlmostEqual(line.contribution, line.coefficient * line.price)
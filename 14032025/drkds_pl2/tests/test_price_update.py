@@ -0,0 +1,34 @@
+from odoo.tests import tagged
+
+from .common import BomCatalogueCase
+
+
+@tagged('post_install', '-at_install')
+class TestPriceUpdate(BomCatalogueCase):
+    """Bulk update of the raw material standard prices"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.products, cls.boms = cls._create_catalogue(
+            depth=2, fanout=3, sharing=0.0, roots=2, prefix='Price update')
+        cls.raw_materials = cls.boms.bom_line_ids.product_id.filtered(lambda p: not p.bom_ids)
+
+    def test_update_standard_prices(self):
+        changed, unchanged, invalid = self.raw_materials[:3]
+        prices = {product.id: product.standard_price for product in self.raw_materials[:3]}
+        result = self.env['product.product']._update_standard_prices({
+            changed.id: changed.standard_price + 10.0,
+            str(unchanged.id): unchanged.standard_price,
+            invalid.id: -1.0,
+        })
+
+        self.assertFalse(result['success'])
+        self.assertEqual(result['updated'], changed.ids)
+        self.assertEqual(result['unchanged'], unchanged.ids)
+        self.assertEqual(list(result['errors']), invalid.ids)
+
+        self.env.invalidate_all()
+        self.assertEqual(changed.standard_price, prices[changed.id] + 10.0)
+        self.assertEqual(unchanged.standard_price, prices[unchanged.id])
+        self.assertEqual(invalid.standard_price, prices[invalid.id])
@@ -0,0 +1,47 @@
+import unittest
+
+from odoo import Command
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('post_install', '-at_install')
+class TestProductThreeColumnReport(TransactionCase):
+    """Values of the three-column report printed from its wizard"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if 'total_jobwork_cost' not in cls.env['product.product']._fields:
+            raise unittest.SkipTest("The product costs of drkds_pl_product are required by the calculator")
+        cls.product = cls.env['product.product'].create({
+            'name': 'Report Product',
+            'type': 'consu',
+            'standard_price': 5.0,
+        })
+        cls.calculator = cls.env['mrp.bom.cost.calculator'].create({
+            'product_line_ids': [Command.create({'product_id': cls.product.id})],
+        })
+        cls.customer = cls.env['res.partner'].create({
+            'name': 'Report Customer',
+            'customer_rank': 1,
+        })
+
+    def test_report_values_from_wizard(self):
+        wizard = self.env['drkds_pl2.product_three_column_wizard'].create({
+            'customer_id': self.customer.id,
+            'salesman_id': self.env.user.id,
+            'doc_id': self.calculator.id,
+        })
+        action = wizard.action_print_report()
+        values = self.env['report.drkds_pl2.report_product_three_column']._get_report_values(
+            self.calculator.ids, data=action['data'])
+
+        self.assertEqual(values['docs'], self.calculator)
+        self.assertEqual(values['doc_ids'], self.calculator.ids)
+        self.assertEqual(values['doc_model'], 'mrp.bom.cost.calculator')
+        self.assertEqual(values['customer'], self.customer)
+        self.assertEqual(values['customer_name'], self.customer.name)
+        self.assertEqual(values['salesman'], self.env.user)
+        self.assertEqual(values['price_level'], wizard.price_level)
+        self.assertEqual(values['currency'], self.env.company.currency_id)
@@ -0,0 +1,130 @@
+from odoo.tests import tagged
+
+from .common import BomCatalogueCase
+
+
+@tagged('post_install', '-at_install')
+class TestQueryCounts(BomCatalogueCase):
+    """
+    Query count regression tests of the main cost and report paths.
+
+    Each path is run on a small and on a large fixture, and the large one may
+    not issue more queries than the small one: the number of queries must not
+    grow with the size of the catalogue or the number of records processed.
+    The query count of the small fixture is the upper bound of the large one.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Same depth, so the same number of BOM levels, but 4 times the width
+        cls.small_products, cls.small_boms = cls._create_catalogue(
+            depth=3, fanout=2, sharing=0.0, roots=3, prefix='Small')
+        cls.large_products, cls.large_boms = cls._create_catalogue(
+            depth=3, fanout=8, sharing=0.3, roots=3, prefix='Large')
+        cls.large_components = cls.large_boms.bom_line_ids.product_id
+        # Same BOM shape as the small catalogue, but 10 times the finished products
+        cls.many_products, cls.many_boms = cls._create_catalogue(
+            depth=3, fanout=2, sharing=0.3, roots=30, prefix='Many')
+
+    def assertQueryCountIndependent(self, small, large, slack=0):
+        """Run small() then large() under assertQueryCount with the query count of small()"""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        query_count = self.cr.sql_log_count
+        small()
+        self.env.flush_all()
+        query_count = self.cr.sql_log_count - query_count
+
+        self.env.invalidate_all()
+        with self.assertQueryCount(query_count + slack):
+            large()
+
+    def test_calculate_all_costs(self):
+        small = self._create_calculator(self.small_products)
+        large = self._create_calculator(self.large_products)
+        self.assertQueryCountIndependent(small.action_calculate_all_costs, large.action_calculate_all_costs,
+                                         slack=2)
+        self.assertEqual(large.state, 'calculated')
+
+    def test_calculate_all_costs_product_lines(self):
+        small = self._create_calculator(self.many_products[:3])
+        large = self._create_calculator(self.many_products)
+        self.assertEqual(len(large.product_line_ids), 30)
+        self.assertQueryCountIndependent(small.action_calculate_all_costs, large.action_calculate_all_costs,
+                                         slack=2)
+        self.assertEqual(large.state, 'calculated')
+        self.assertTrue(all(large.product_line_ids.mapped('total_cost')))
+
+    def test_update_standard_prices(self):
+        # Every product gets a price of its own
+        raw_materials = self.large_components.filtered(lambda p: not p.bom_ids)
+        small_prices = {product.id: 1000.0 + index for index, product in enumerate(raw_materials[:3])}
+        large_prices = {product.id: 2000.0 + index for index, product in enumerate(raw_materials[3:33])}
+        Product = self.env['product.product']
+        self.assertQueryCountIndependent(
+            lambda: Product._update_standard_prices(small_prices),
+            lambda: Product._update_standard_prices(large_prices),
+        )
+        self.assertEqual(len(large_prices), 30)
+        self.assertEqual(dict(zip(raw_materials[3:33].ids, raw_materials[3:33].mapped('standard_price'))),
+                         large_prices)
+
+    def test_add_product_lines(self):
+        # A calculator has at least one product line
+        small = self._create_calculator(self.small_products[:1])
+        large = self._create_calculator(self.small_products[:1])
+        self.assertQueryCountIndependent(
+            lambda: small.add_product_lines(self.large_components[:3].ids),
+            lambda: large.add_product_lines(self.large_components[:30].ids),
+        )
+        self.assertEqual(len(large.product_line_ids), 31)
+
+    def test_product_selection_wizard(self):
+        Wizard = self.env['product.selection.wizard']
+        small = Wizard.create({
+            'calculator_id': self._create_calculator(self.small_products[:1]).id,
+            'product_ids': [(6, 0, self.large_components[:3].ids)],
+        })
+        large = Wizard.create({
+            'calculator_id': self._create_calculator(self.small_products[:1]).id,
+            'product_ids': [(6, 0, self.large_components[:30].ids)],
+        })
+        self.assertQueryCountIndependent(small.action_add_products, large.action_add_products)
+        self.assertEqual(len(large.calculator_id.product_line_ids), 31)
+
+    def test_raw_materials_editor_default_get(self):
+        small = self._create_calculator(self.small_products[:1]).product_line_ids
+        large = self._create_calculator(self.large_products[:1]).product_line_ids
+        Editor = self.env['raw.materials.editor.wizard']
+        fields_list = ['line_id', 'material_line_ids']
+        self.assertQueryCountIndependent(
+            lambda: Editor.with_context(active_id=small.id).default_get(fields_list),
+            lambda: Editor.with_context(active_id=large.id).default_get(fields_list),
+        )
+
+    def test_print_report(self):
+        Wizard = self.env['drkds_pl2.product_three_column_wizard']
+        wizards = [
+            Wizard.create({
+                'customer_id': self.customer.id,
+                'salesman_id': self.env.user.id,
+                'doc_id': self._create_calculator(products).id,
+            })
+            for products in (self.small_products[:1], self.large_components[:30])
+        ]
+        self.assertQueryCountIndependent(wizards[0].action_print_report, wizards[1].action_print_report)
+
+    def test_print_report_calculated(self):
+        Wizard = self.env['drkds_pl2.product_three_column_wizard']
+        wizards = []
+        for products in (self.many_products[:3], self.many_products):
+            calculator = self._create_calculator(products)
+            calculator.action_calculate_all_costs()
+            wizards.append(Wizard.create({
+                'customer_id': self.customer.id,
+                'salesman_id': self.env.user.id,
+                'doc_id': calculator.id,
+            }))
+        self.assertEqual(len(wizards[1].doc_id.product_line_ids), 30)
+        self.assertQueryCountIndependent(wizards[0].action_print_report, wizards[1].action_print_report)
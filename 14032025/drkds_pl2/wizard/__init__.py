@@ -1,3 +1,6 @@
 from . import product_additional_cost_wizard
 from . import product_three_column_wizard
 from . import raw_materials_editor_wizard
+from . import bom_cost_breakdown_line
+from . import bom_cost_compare_wizard
+from . import bom_cost_sensitivity_wizard
@@ -0,0 +1,59 @@
+from odoo import models, fields, api, _
+from ..models.bom_cost_breakdown import breakdown_checksum, decode_breakdown
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class BOMCostBreakdownLine(models.TransientModel):
+    """Cost breakdown row of a calculator, materialized from its breakdown snapshot for display"""
+    _name = 'mrp.bom.cost.breakdown.line'
+    _description = 'BOM Cost Breakdown Line'
+    _order = 'sequence, id'
+
+    calculator_id = fields.Many2one('mrp.bom.cost.calculator', 'Calculator', required=True, ondelete='cascade')
+    sequence = fields.Integer('Sequence')
+    name = fields.Char('Description', required=True)
+    cost_type = fields.Selection([
+        ('material', 'Material'),
+        ('operation', 'Operation')
+    ], string='Cost Type', required=True)
+    product_id = fields.Many2one('product.product', 'Component')
+    operation_id = fields.Many2one('mrp.routing.workcenter', 'Operation')
+    quantity = fields.Float('Quantity', digits='Product Unit of Measure')
+    duration = fields.Float('Duration (minutes)')
+    unit_cost = fields.Float('Unit Cost', digits='Product Price')
+    cost = fields.Float('Cost', digits='Product Price')
+    bom_level = fields.Integer('BOM Level', default=0)
+    bom_qty = fields.Float('BOM Production Qty', digits='Product Unit of Measure')
+    snapshot_checksum = fields.Char('Snapshot Checksum', readonly=True)
+
+    @api.model
+    def _create_from_calculator(self, calculator):
+        """
+        Return the breakdown lines of a calculator, created from its snapshot at
+        once. The lines of the user are reused while the snapshot is unchanged.
+        """
+        snapshot = calculator._get_breakdown_snapshot()
+        checksum = breakdown_checksum(snapshot)
+        lines = self.search([('calculator_id', '=', calculator.id), ('create_uid', '=', self.env.uid)])
+        if lines and set(lines.mapped('snapshot_checksum')) == {checksum}:
+            return lines
+        lines.unlink()
+        rows = decode_breakdown(snapshot)
+        # Components or operations deleted since the calculation are left empty
+        product_ids = set(self.env['product.product'].browse(
+            {row['product_id'] for row in rows if row['product_id']}).exists().ids)
+        operation_ids = set(self.env['mrp.routing.workcenter'].browse(
+            {row['operation_id'] for row in rows if row['operation_id']}).exists().ids)
+        return self.create([
+            dict(
+                row,
+                calculator_id=calculator.id,
+                sequence=sequence,
+                snapshot_checksum=checksum,
+                product_id=row['product_id'] if row['product_id'] in product_ids else False,
+                operation_id=row['operation_id'] if row['operation_id'] in operation_ids else False,
+            )
+            for sequence, row in enumerate(rows)
+        ])
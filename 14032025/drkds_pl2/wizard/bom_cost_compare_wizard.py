@@ -0,0 +1,135 @@
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools import float_compare
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Compared amounts: (product line field, comparison line fields prefix)
+PRODUCT_AMOUNTS = [
+    ('material_cost', 'material'),
+    ('operation_cost', 'operation'),
+    ('other_cost', 'other'),
+    ('unit_cost', 'unit'),
+]
+
+
+class BOMCostCompareWizard(models.TransientModel):
+    _name = 'mrp.bom.cost.compare.wizard'
+    _description = 'Compare BOM Cost Calculators'
+
+    calculator_id = fields.Many2one('mrp.bom.cost.calculator', 'Calculator', required=True, ondelete='cascade')
+    base_calculator_id = fields.Many2one('mrp.bom.cost.calculator', 'Compare with', required=True,
+        ondelete='cascade', domain="[('id', '!=', calculator_id)]",
+        help="Calculator the costs are compared against, e.g. the one of the previous quarter.")
+    only_changes = fields.Boolean('Only Changes', default=True,
+        help="Leave out the products and components whose costs did not change.")
+    line_ids = fields.One2many('mrp.bom.cost.compare.line', 'wizard_id', 'Differences')
+
+    def action_compare(self):
+        """Compute the differences between the calculators, by product line and by component"""
+        self.ensure_one()
+        if self.base_calculator_id == self.calculator_id:
+            raise UserError(_("Please select another calculator to compare with."))
+        self.line_ids.unlink()
+
+        Line = self.env['mrp.bom.cost.compare.line']
+        vals_list = []
+        for values in self.calculator_id._compare_product_lines(self.base_calculator_id):
+            vals = {'diff_type': 'product', 'product_id': values['product_id']}
+            for fname, prefix in PRODUCT_AMOUNTS:
+                vals.update(Line._get_amount_values(prefix, values['base_' + fname], values[fname]))
+            vals['status'] = Line._get_status(vals, values['added'], values['removed'])
+            vals_list.append(vals)
+        for values in self.calculator_id._compare_components(self.base_calculator_id):
+            vals = {
+                'diff_type': 'component',
+                'product_id': values['product_id'],
+                'base_quantity': values['base_quantity'] or 0.0,
+                'quantity': values['quantity'] or 0.0,
+            }
+            vals.update(Line._get_amount_values('material', values['base_cost'], values['cost']))
+            vals.update(Line._get_amount_values('unit', values['base_unit_cost'], values['unit_cost']))
+            vals['status'] = Line._get_status(vals, values['base_quantity'] is None, values['quantity'] is None)
+            vals_list.append(vals)
+
+        for vals in vals_list:
+            vals['wizard_id'] = self.id
+        if self.only_changes:
+            vals_list = [vals for vals in vals_list if vals['status'] != 'unchanged']
+        # Products and components deleted since the calculations are left out
+        existing = set(self.env['product.product'].browse({vals['product_id'] for vals in vals_list}).exists().ids)
+        lines = Line.create([vals for vals in vals_list if vals['product_id'] in existing])
+
+        _logger.info("Compared %s with %s: %s differences", self.calculator_id.name,
+                     self.base_calculator_id.name, len(lines))
+        return {
+            'name': _('%s compared with %s') % (self.calculator_id.name, self.base_calculator_id.name),
+            'type': 'ir.actions.act_window',
+            'res_model': 'mrp.bom.cost.compare.line',
+            'view_mode': 'tree,pivot',
+            'domain': [('wizard_id', '=', self.id)],
+            'context': {'search_default_group_by_diff_type': 1},
+            'target': 'current',
+        }
+
+
+class BOMCostCompareLine(models.TransientModel):
+    _name = 'mrp.bom.cost.compare.line'
+    _description = 'BOM Cost Calculator Difference'
+    _order = 'diff_type desc, unit_delta_abs desc, id'
+
+    wizard_id = fields.Many2one('mrp.bom.cost.compare.wizard', 'Comparison', required=True, ondelete='cascade')
+    diff_type = fields.Selection([
+        ('product', 'Product Line'),
+        ('component', 'Component'),
+    ], string='Compared', required=True)
+    product_id = fields.Many2one('product.product', 'Product', required=True)
+    status = fields.Selection([
+        ('added', 'Added'),
+        ('removed', 'Removed'),
+        ('changed', 'Changed'),
+        ('unchanged', 'Unchanged'),
+    ], string='Status', required=True)
+    base_quantity = fields.Float('Previous Quantity', digits='Product Unit of Measure')
+    quantity = fields.Float('Quantity', digits='Product Unit of Measure')
+    base_material_cost = fields.Float('Previous Material Cost', digits='Product Price')
+    material_cost = fields.Float('Material Cost', digits='Product Price')
+    material_delta = fields.Float('Material Change', digits='Product Price')
+    base_operation_cost = fields.Float('Previous Operation Cost', digits='Product Price')
+    operation_cost = fields.Float('Operation Cost', digits='Product Price')
+    operation_delta = fields.Float('Operation Change', digits='Product Price')
+    base_other_cost = fields.Float('Previous Other Cost', digits='Product Price')
+    other_cost = fields.Float('Other Cost', digits='Product Price')
+    other_delta = fields.Float('Other Change', digits='Product Price')
+    base_unit_cost = fields.Float('Previous Unit Cost', digits='Product Price')
+    unit_cost = fields.Float('Unit Cost', digits='Product Price')
+    unit_delta = fields.Float('Unit Cost Change', digits='Product Price')
+    unit_delta_abs = fields.Float('Absolute Unit Cost Change', digits='Product Price')
+    unit_delta_percent = fields.Float('Unit Cost Change (%)', digits=(16, 2), group_operator='avg')
+
+    @api.model
+    def _get_amount_values(self, prefix, base_amount, amount):
+        """Return the previous, current and change values of one compared amount, None meaning missing"""
+        values = {
+            'base_%s_cost' % prefix: base_amount or 0.0,
+            '%s_cost' % prefix: amount or 0.0,
+            '%s_delta' % prefix: (amount or 0.0) - (base_amount or 0.0),
+        }
+        if prefix == 'unit':
+            values['unit_delta_abs'] = abs(values['unit_delta'])
+            values['unit_delta_percent'] = 100.0 * values['unit_delta'] / base_amount if base_amount else 0.0
+        return values
+
+    @api.model
+    def _get_status(self, vals, added=False, removed=False):
+        """Return the status of comparison line values, added / removed when missing on one side"""
+        if added:
+            return 'added'
+        if removed:
+            return 'removed'
+        digits = self.env['decimal.precision'].precision_get('Product Price')
+        if any(float_compare(vals.get(fname, 0.0), 0.0, precision_digits=digits)
+               for fname in ('material_delta', 'operation_delta', 'other_delta', 'unit_delta')):
+            return 'changed'
+        return 'unchanged'
@@ -0,0 +1,83 @@
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class BOMCostSensitivityWizard(models.TransientModel):
+    _name = 'mrp.bom.cost.sensitivity.wizard'
+    _description = 'Raw Material Price Sensitivity'
+
+    calculator_id = fields.Many2one('mrp.bom.cost.calculator', 'Calculator', required=True, ondelete='cascade')
+    top_count = fields.Integer('Top Drivers per Product', default=0,
+        help="Only keep the raw materials weighing the most in the unit cost of each product, "
+             "0 keeps all of them.")
+    line_ids = fields.One2many('mrp.bom.cost.sensitivity.line', 'wizard_id', 'Sensitivities')
+
+    def action_compute(self):
+        """Compute the raw material price sensitivity of every manufactured product line"""
+        self.ensure_one()
+        if self.top_count < 0:
+            raise UserError(_("The number of top drivers cannot be negative."))
+        if self.calculator_id.state != 'calculated':
+            raise UserError(_("Please calculate the costs of the calculator first."))
+        self.line_ids.unlink()
+
+        sensitivity = self.calculator_id._get_price_sensitivity()
+        material_ids = {product_id for coefficients in sensitivity.values() for product_id in coefficients}
+        prices = {product.id: product.standard_price
+                  for product in self.env['product.product'].browse(material_ids)}
+        vals_list = []
+        for line, coefficients in sensitivity.items():
+            drivers = sorted(
+                ((coefficient * prices[product_id], product_id, coefficient)
+                 for product_id, coefficient in coefficients.items()),
+                key=lambda driver: (-abs(driver[0]), driver[1]))
+            if self.top_count:
+                drivers = drivers[:self.top_count]
+            for rank, (contribution, product_id, coefficient) in enumerate(drivers, 1):
+                vals_list.append({
+                    'wizard_id': self.id,
+                    'product_line_id': line.id,
+                    'product_id': line.product_id.id,
+                    'material_id': product_id,
+                    'rank': rank,
+                    'coefficient': coefficient,
+                    'price': prices[product_id],
+                    'contribution': contribution,
+                    'share_percent': 100.0 * contribution / line.unit_cost if line.unit_cost else 0.0,
+                })
+        lines = self.env['mrp.bom.cost.sensitivity.line'].create(vals_list)
+
+        _logger.info("Price sensitivity of %s: %s products, %s raw materials, %s coefficients",
+                     self.calculator_id.name, len(sensitivity), len(material_ids), len(lines))
+        return {
+            'name': _('Price Sensitivity of %s') % self.calculator_id.name,
+            'type': 'ir.actions.act_window',
+            'res_model': 'mrp.bom.cost.sensitivity.line',
+            'view_mode': 'tree,pivot',
+            'domain': [('wizard_id', '=', self.id)],
+            'target': 'current',
+        }
+
+
+class BOMCostSensitivityLine(models.TransientModel):
+    _name = 'mrp.bom.cost.sensitivity.line'
+    _description = 'Raw Material Price Sensitivity Line'
+    _order = 'product_line_id, rank, id'
+
+    wizard_id = fields.Many2one('mrp.bom.cost.sensitivity.wizard', 'Analysis', required=True, ondelete='cascade')
+    product_line_id = fields.Many2one('mrp.bom.cost.calculator.product.line', 'Product Line',
+        required=True, ondelete='cascade')
+    product_id = fields.Many2one('product.product', 'Product', required=True)
+    material_id = fields.Many2one('product.product', 'Raw Material', required=True)
+    rank = fields.Integer('Rank', group_operator='min',
+        help="Rank of the raw material among the cost drivers of the product, 1 weighing the most.")
+    coefficient = fields.Float('Sensitivity', digits=(16, 6), group_operator='sum',
+        help="Change of the unit cost of the product per unit change of the raw material price, "
+             "i.e. the quantity of raw material in one unit of product.")
+    price = fields.Float('Raw Material Price', digits='Product Price', group_operator='avg')
+    contribution = fields.Float('Cost Contribution', digits='Product Price',
+        help="Part of the unit cost of the product coming from the raw material at its current price.")
+    share_percent = fields.Float('Share of Unit Cost (%)', digits=(16, 2), group_operator='avg')
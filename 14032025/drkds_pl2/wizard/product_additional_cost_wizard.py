@@ -123,33 +123,29 @@ class ProductAdditionalCostWizard(models.TransientModel):
         for record in self:
             record.is_calculated = record.line_id.state != 'draft'
     
-    def _get_safe_calculator(self, product_id):
+    def _get_latest_unit_costs(self, product_ids):
         """
-        Safely retrieve the most recent cost calculator
+        Safely retrieve the latest calculated unit costs of several products
         """
         try:
-            calculator = self.env['mrp.bom.cost.calculator'].search([
-                ('product_id', '=', product_id),
-                ('state', 'in', ['calculated', 'applied'])
-            ], limit=1, order='create_date desc')
+            unit_costs = self.env['mrp.bom.cost.latest']._get_unit_costs(product_ids)
             
-            return calculator
+            return {product_id: unit_cost for product_id, (unit_cost, bom) in unit_costs.items()}
         except Exception as e:
-            _logger.error(f"Error retrieving calculator: {str(e)}")
-            return None
+            _logger.error(f"Error retrieving latest unit costs: {str(e)}")
+            return {}
     
     @api.depends('product_id', 'level1Add', 'level2Add', 'level3Add', 'level4Add')
     def _compute_level_prices(self):
         """Calculate price levels"""
+        unit_costs = self._get_latest_unit_costs(set(self.product_id.ids))
         for record in self:
             if not record.product_id:
                 record.level1price = record.level2price = record.level3price = record.level4price = 0.0
                 continue
             
-            calculator = self._get_safe_calculator(record.product_id.id)
-            
-            if calculator and hasattr(calculator, 'unit_cost'):
-                base_cost = calculator.unit_cost
+            if record.product_id.id in unit_costs:
+                base_cost = unit_costs[record.product_id.id]
                 record.level1price = base_cost + record.level1Add
                 record.level2price = record.level1price + record.level2Add
                 record.level3price = record.level2price + record.level3Add
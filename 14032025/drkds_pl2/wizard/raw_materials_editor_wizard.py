@@ -1,5 +1,6 @@
 from odoo import models, fields, api, _, tools
 from odoo.exceptions import UserError, ValidationError
+from ..models.bom_cost_kernel import CostKernel
 import logging
 import json
 import uuid
@@ -81,7 +82,7 @@ class RawMaterialsEditorWizard(models.TransientModel):
             return res
         
         # Advanced raw materials extraction
-        raw_materials = self._get_comprehensive_raw_materials(line.bom_id)
+        raw_materials = self._get_comprehensive_raw_materials(line.bom_id, line.product_id)
         
         if not raw_materials:
             return res
@@ -104,83 +105,20 @@ class RawMaterialsEditorWizard(models.TransientModel):
         res['material_line_ids'] = [(0, 0, line) for line in material_lines]
         return res
     
-    def _get_comprehensive_raw_materials(self, bom, depth=5, processed_boms=None):
+    def _get_comprehensive_raw_materials(self, bom, product=None, uom_table=None):
         """
-        Advanced raw materials extraction with multi-level support
+        Raw materials of a BOM built for a product, exploded over all its BOM
+        levels with the costing kernel of the calculator.
+        Returns {product: {'quantity', 'bom_levels', 'is_raw_material'}}
         """
-        if processed_boms is None:
-            processed_boms = set()
-        
-        if depth <= 0 or bom.id in processed_boms:
-            return {}
-        
-        processed_boms.add(bom.id)
-        raw_materials = {}
-        
-        for line in bom.bom_line_ids:
-            # Precise quantity computation
-            line_qty = line.product_uom_id._compute_quantity(
-                line.product_qty, line.product_id.uom_id
-            )
-            
-            # Advanced BOM finding
-            child_boms = self.env['mrp.bom'].search([
-                ('product_tmpl_id', '=', line.product_id.product_tmpl_id.id),
-                ('company_id', '=', bom.company_id.id)
-            ])
-            
-            # Select most appropriate BOM
-            child_bom = self._select_most_appropriate_bom(child_boms, line.product_id)
-            
-            if child_bom:
-                # Recursive extraction
-                child_materials = self._get_comprehensive_raw_materials(
-                    child_bom, 
-                    depth=depth-1, 
-                    processed_boms=processed_boms.copy()
-                )
-                
-                # Merge child materials
-                for child_product, child_details in child_materials.items():
-                    existing = raw_materials.get(child_product, {})
-                    raw_materials[child_product] = {
-                        'quantity': (existing.get('quantity', 0) + 
-                                     child_details['quantity'] * line_qty),
-                        'bom_levels': list(set(
-                            existing.get('bom_levels', []) + 
-                            child_details.get('bom_levels', [])
-                        )),
-                        'is_raw_material': child_details.get('is_raw_material', False)
-                    }
-            else:
-                # Raw material handling
-                if line.product_id in raw_materials:
-                    raw_materials[line.product_id]['quantity'] += line_qty
-                else:
-                    raw_materials[line.product_id] = {
-                        'quantity': line_qty,
-                        'bom_levels': [len(processed_boms)],
-                        'is_raw_material': True
-                    }
-        
-        return raw_materials
-    
-    def _select_most_appropriate_bom(self, boms, product):
-        """
-        Intelligent BOM selection strategy
-        """
-        priority_boms = boms.filtered(lambda b: 
-            b.active and 
-            b.product_tmpl_id == product.product_tmpl_id
-        )
-        
-        if not priority_boms:
-            return False
-        
-        return priority_boms.sorted(
-            key=lambda b: (b.create_date, b.product_qty), 
-            reverse=True
-        )[0]
+        product = product or bom.product_id or bom.product_tmpl_id.product_variant_id
+        snapshot = self.env['mrp.bom']._get_bom_cost_snapshot(
+            [(bom, product)], include_operations=False, uom_table=uom_table, use_precalculated=False)
+        raw_materials = CostKernel(snapshot).explode((bom.id, product.id))
+        return {
+            material: raw_materials[material.id]
+            for material in self.env['product.product'].browse(raw_materials)
+        }
     
     def action_recalculate_values(self):
         """Recalculate total values based on new prices"""
@@ -190,53 +128,49 @@ class RawMaterialsEditorWizard(models.TransientModel):
     
     def action_update_calculation_only(self):
         """
-        Update prices for current calculation only
-        Supports temporary price modifications
+        Calculate the product line with the new prices, without writing them:
+        the prices only override the standard prices for this calculation
+        (see BOMCostCalculator._simulate_costs).
         """
         self.ensure_one()
         
         if self.line_id.state != 'draft':
             raise UserError(_("Cannot modify material prices after calculation. Reset to draft first."))
         
-        # Prepare detailed price updates
-        temp_updates = {}
-        modified_products = []
-        
-        for line in self.material_line_ids:
-            if line.current_price != line.new_price:
-                temp_updates[str(line.product_id.id)] = {
-                    'old_price': line.current_price,
-                    'new_price': line.new_price,
-                    'quantity': line.quantity
-                }
-                modified_products.append(line.product_id.display_name)
-        
-        # Store updates with additional metadata
-        update_log = {
-            'batch_id': self.batch_id,
-            'timestamp': fields.Datetime.now(),
-            'modified_products': modified_products,
-            'updates': json.dumps(temp_updates)
+        changed_lines = self.material_line_ids.filtered(lambda l: l.current_price != l.new_price)
+        if not changed_lines:
+            raise UserError(_("No material price was changed."))
+
+        # Both calculations are made the same way, only the prices differ
+        line = self.line_id
+        calculator = line.calculator_id
+        before = calculator._simulate_costs(
+            {l.product_id.id: l.current_price for l in changed_lines}, line)[line]
+        after = calculator._simulate_costs(
+            {l.product_id.id: l.new_price for l in changed_lines}, line)[line]
+        change = after['unit_cost'] - before['unit_cost']
+        message = _("%(product)s: unit cost %(old).2f → %(new).2f (%(change)+.2f) with %(count)s changed prices") % {
+            'product': line.product_id.display_name,
+            'old': before['unit_cost'],
+            'new': after['unit_cost'],
+            'change': change,
+            'count': len(changed_lines),
         }
         
-        self.line_id.write({
-            'temp_material_price_updates': json.dumps(update_log)
-        })
-        
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
             'params': {
-                'title': _('Temporary Price Updates'),
-                'message': _("%s products updated for this calculation") % len(modified_products),
-                'sticky': False,
-                'type': 'success'
+                'title': _('What-if Calculation'),
+                'message': message,
+                'sticky': True,
+                'type': 'info'
             }
         }
     
     def action_update_product_master(self):
         """
-        Comprehensive product master price update
+        Write the new prices to the product master, all at once
         """
         self.ensure_one()
         
@@ -244,16 +178,15 @@ class RawMaterialsEditorWizard(models.TransientModel):
             raise UserError(_("Cannot modify material prices after calculation. Reset to draft first."))
         
         # Prepare price changes
-        price_changes = {}
-        for line in self.material_line_ids:
-            if line.current_price != line.new_price:
-                price_changes[str(line.product_id.id)] = {
-                    'new_price': line.new_price
-                }
+        price_changes = {
+            line.product_id.id: line.new_price
+            for line in self.material_line_ids
+            if line.current_price != line.new_price
+        }
+        if not price_changes:
+            raise UserError(_("No material price was changed."))
         
-        # Use new update method
-        update_wizard = self.env['product.price.update.wizard']
-        result = update_wizard.update_product_master_prices(price_changes)
+        result = self.env['product.product']._update_standard_prices(price_changes)
         
         # Return notification based on update result
         return {
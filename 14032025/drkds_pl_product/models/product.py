@@ -23,32 +23,28 @@ class ProductTemplate(models.Model):
     level4price = fields.Float("Level 4 Price", compute="_compute_level_prices", store=True)
     include_in_pricelist = fields.Boolean("Include in Pricelist", default=False)
     
-    def _get_calculator(self, product_id):
-        """Safely get the calculator model and search for a calculator"""
+    def _get_latest_unit_costs(self, product_ids):
+        """Safely read the latest calculated unit costs of several products at once"""
         try:
-            # Try to get the model - this will only work if it's loaded
-            model = self.env.registry.get('mrp.bom.cost.calculator')
+            # Try to get the model - this will only work if the calculator is loaded
+            model = self.env.registry.get('mrp.bom.cost.latest')
             if not model:
-                return None
+                return {}
                 
-            # Now use the model to search for calculators
-            calculator = self.env['mrp.bom.cost.calculator'].search([
-                ('product_id', '=', product_id),
-                ('state', 'in', ['calculated', 'applied'])
-            ], limit=1, order='date desc')
+            # One read for all products
+            unit_costs = self.env['mrp.bom.cost.latest']._get_unit_costs(product_ids)
             
-            return calculator
+            return {product_id: unit_cost for product_id, (unit_cost, bom) in unit_costs.items()}
         except Exception:
-            return None
+            return {}
     
     @api.depends('standard_price', 'level1Add', 'level2Add', 'level3Add', 'level4Add')
     def _compute_level_prices(self):
+        unit_costs = self._get_latest_unit_costs(set(self.product_variant_id.ids))
         for product in self:
-            calculator = self._get_calculator(product.product_variant_id.id)
-            
-            # If a calculator is found, use its unit_cost; otherwise, set prices to 0
-            if calculator and hasattr(calculator, 'unit_cost'):
-                base_cost = calculator.unit_cost
+            # If a calculated unit cost is found, use it; otherwise, set prices to 0
+            if product.product_variant_id.id in unit_costs:
+                base_cost = unit_costs[product.product_variant_id.id]
                 product.level1price = base_cost + product.level1Add
                 product.level2price = product.level1price + product.level2Add
                 product.level3price = product.level2price + product.level3Add